@@ -0,0 +1,160 @@
+"""
+Benchmark WorkflowEngine on synthetic workflows against an in-memory SQLite database.
+
+Each workflow shape from workflow_generators runs at every requested size
+using the engine's mock node types. For every case the benchmark reports
+throughput, per-node overhead, peak traced memory and the number of SQL
+statements issued. With --check it compares the results to the limits in
+engine_thresholds.json and exits with status 1 if any limit is exceeded.
+
+Usage: python benchmarks/bench_engine.py [--sizes 50,200] [--shapes chain,tree] [--repeat 3] [--check]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+from workflow_generators import GENERATORS
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'engine_thresholds.json')
+
+
+def make_app():
+    """Create the app on a fresh in-memory SQLite database with a benchmark user."""
+    from src.main import create_app
+    from src.models.all_models import User, db
+    
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password_hash='-')
+        db.session.add(user)
+        db.session.commit()
+        app.config['BENCH_USER_ID'] = user.id
+    return app
+
+
+def run_case(app, definition, trace_memory=False):
+    """Run one definition through a new execution; return (ok, seconds, statements, peak bytes)."""
+    from src.models.all_models import Execution, Workflow, WorkflowVersion, db
+    from src.routes.engine import WorkflowEngine
+    
+    user_id = app.config['BENCH_USER_ID']
+    with app.app_context():
+        workflow = Workflow(name='bench', created_by=user_id)
+        db.session.add(workflow)
+        db.session.flush()
+        version = WorkflowVersion(workflow_id=workflow.id, version=1, created_by=user_id)
+        version.set_definition(definition)
+        db.session.add(version)
+        db.session.flush()
+        execution = Execution(workflow_id=workflow.id, workflow_version_id=version.id, status='pending',
+                              triggered_by=user_id, trigger_type='manual')
+        db.session.add(execution)
+        db.session.commit()
+        
+        statements = []
+        
+        def count_statement(*args):
+            statements.append(None)
+        
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            ok = WorkflowEngine(version, execution.id).execute()
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+            db.session.remove()
+    return ok, elapsed, len(statements), peak
+
+
+def benchmark(app, shape, size, repeat):
+    """Time a shape at one size (median of repeat runs) and measure its memory in a separate traced run."""
+    definition = GENERATORS[shape](size)
+    nodes = len(definition['nodes'])
+    run_case(app, definition)  # warm up imports and caches
+    
+    timings = []
+    for _ in range(repeat):
+        ok, elapsed, statements, _ = run_case(app, definition)
+        if not ok:
+            raise SystemExit(f"{shape} with {nodes} nodes failed to execute")
+        timings.append(elapsed)
+    _, _, _, peak = run_case(app, definition, trace_memory=True)
+    
+    elapsed = statistics.median(timings)
+    return {
+        'shape': shape,
+        'nodes': nodes,
+        'edges': len(definition['edges']),
+        'ms': elapsed * 1000,
+        'nodes_per_second': nodes / elapsed,
+        'us_per_node': elapsed * 1000000 / nodes,
+        'statements': statements,
+        'statements_per_node': statements / nodes,
+        'peak_kb': peak / 1024,
+        'peak_kb_per_node': peak / 1024 / nodes
+    }
+
+
+def check(results, thresholds):
+    """Return a message for every result that exceeds its limits."""
+    failures = []
+    for result in results:
+        limits = dict(thresholds.get('default', {}), **thresholds.get(result['shape'], {}))
+        for metric, limit in limits.items():
+            if result[metric] > limit:
+                failures.append(f"{result['shape']} ({result['nodes']} nodes): {metric} {result[metric]:.2f} > {limit}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='50,200', help='Comma-separated node counts.')
+    parser.add_argument('--shapes', default=','.join(GENERATORS), help='Comma-separated workflow shapes.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if a threshold is exceeded.')
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+    args = parser.parse_args()
+    
+    app = make_app()
+    results = [
+        benchmark(app, shape, int(size), args.repeat)
+        for shape in args.shapes.split(',')
+        for size in args.sizes.split(',')
+    ]
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'shape':<12}{'nodes':>7}{'edges':>7}{'ms':>10}{'nodes/s':>10}{'us/node':>10}"
+              f"{'stmts':>8}{'stmts/node':>12}{'peak KB':>10}")
+        for r in results:
+            print(f"{r['shape']:<12}{r['nodes']:>7}{r['edges']:>7}{r['ms']:>10.1f}{r['nodes_per_second']:>10.0f}"
+                  f"{r['us_per_node']:>10.0f}{r['statements']:>8}{r['statements_per_node']:>12.2f}{r['peak_kb']:>10.0f}")
+    
+    if args.check:
+        with open(args.thresholds) as f:
+            failures = check(results, json.load(f))
+        for failure in failures:
+            print(f"THRESHOLD EXCEEDED: {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
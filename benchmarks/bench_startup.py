@@ -0,0 +1,69 @@
+"""
+Benchmark API worker start-up: time to import src.main and build the app, with per-module import times.
+
+Each run happens in a fresh interpreter started with -X importtime, in both
+lazy mode (the default) and eager mode (APP_LAZY_IMPORTS=false).
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(lazy):
+    """Start a fresh interpreter that imports src.main; return (wall ms, [(module, self us, cumulative us)])."""
+    env = dict(os.environ, APP_LAZY_IMPORTS='true' if lazy else 'false', PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import src.main'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return wall, modules
+
+
+def print_modules(title, rows, top):
+    """Print the modules with the largest cumulative import time."""
+    print(title)
+    print(f"  {'module':<44}{'self ms':>10}{'cumul. ms':>12}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"  {name:<44}{self_us / 1000:>10.1f}{cumulative_us / 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    for lazy in (True, False):
+        walls = []
+        for _ in range(args.repeat):
+            wall, modules = run_once(lazy)
+            walls.append(wall)
+
+        total_us = sum(self_us for _, self_us, _ in modules)
+        print(f"== {'lazy' if lazy else 'eager'} mode: median start-up {statistics.median(walls):.0f} ms "
+              f"over {args.repeat} runs, {total_us / 1000:.0f} ms importing {len(modules)} modules")
+        print_modules('project modules', [row for row in modules if row[0].split('.')[0] == 'src'], args.top)
+        print_modules('top-level packages', [row for row in modules if '.' not in row[0] and row[0] != 'src'], args.top)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark prompt rendering: per-key str.replace loop vs. precompiled templates.
+
+Usage: python benchmarks/bench_templating.py [--prompt-kb 64] [--inputs 500] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.templating import compile_template, render_template
+
+
+def legacy_render(prompt, input_data):
+    """The original handler loop: one full rescan and copy of the prompt per input key."""
+    for key, value in input_data.items():
+        if isinstance(value, dict) and 'result' in value:
+            prompt = prompt.replace(f"{{{{{key}}}}}", str(value['result']))
+        else:
+            prompt = prompt.replace(f"{{{{{key}}}}}", str(value))
+    return prompt
+
+
+def build_case(prompt_kb, input_count):
+    """Build a large prompt referencing every input once, plus the inputs themselves."""
+    input_data = {f"node_{i}": {"result": f"value {i}"} for i in range(input_count)}
+    filler = "lorem ipsum dolor sit amet " * 8
+    pieces = []
+    size = 0
+    i = 0
+    while size < prompt_kb * 1024:
+        piece = f"{filler}{{{{node_{i % input_count}}}}} "
+        pieces.append(piece)
+        size += len(piece)
+        i += 1
+    return ''.join(pieces), input_data
+
+
+def time_it(fn, repeat):
+    """Return the best wall time in milliseconds over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompt-kb', type=int, default=64)
+    parser.add_argument('--inputs', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    prompt, input_data = build_case(args.prompt_kb, args.inputs)
+    assert legacy_render(prompt, input_data) == render_template(prompt, input_data)
+    
+    compile_template.cache_clear()
+    cold = time_it(lambda: (compile_template.cache_clear(), render_template(prompt, input_data)), args.repeat)
+    warm = time_it(lambda: render_template(prompt, input_data), args.repeat)
+    legacy = time_it(lambda: legacy_render(prompt, input_data), args.repeat)
+    
+    print(f"prompt: {len(prompt) / 1024:.0f} KB, inputs: {len(input_data)}, best of {args.repeat}")
+    print(f"{'legacy str.replace loop':<28}{legacy:>10.2f} ms")
+    print(f"{'compile + render':<28}{cold:>10.2f} ms  ({legacy / cold:.1f}x)")
+    print(f"{'cached render':<28}{warm:>10.2f} ms  ({legacy / warm:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
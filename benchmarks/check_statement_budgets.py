@@ -0,0 +1,85 @@
+"""
+Check that API endpoints stay within their SQL statement budgets, whatever the data size.
+
+Seeds a small and then a ten times larger data set (see load_test.py) and
+requests every endpoint in statement_budgets.json through the Flask test
+client with assert_statement_budget. An endpoint fails if it runs more
+statements than its budget, or more statements on the large data set than
+on the small one (an N+1 query). Exits with status 1 on any failure.
+
+Usage: python benchmarks/check_statement_budgets.py [--budgets benchmarks/statement_budgets.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import make_app, make_token, seed
+from src.testing import StatementBudgetExceeded, assert_statement_budget
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'statement_budgets.json')
+
+# (users, workflows per user, executions per workflow, logs per execution)
+DATA_SETS = {
+    'small': (2, 2, 2, 5),
+    'large': (2, 20, 20, 50)
+}
+
+
+def measure(budgets, data_set):
+    """Return {endpoint: (statement count or None, failure message or None)} for one data set."""
+    users, workflows, executions, logs = DATA_SETS[data_set]
+    app = make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'budgets.db')}", pool_size=5)
+    _, executions_by_user, _ = seed(app, users, workflows, 1, executions, logs, pending=0)
+    
+    # Placeholders resolve to the first user's objects
+    values = {'workflow_id': 1, 'execution_id': executions_by_user[1][0]}
+    headers = {'Authorization': f"Bearer {make_token(1)}"}
+    client = app.test_client()
+    
+    results = {}
+    for endpoint, budget in budgets.items():
+        method, path = endpoint.split(' ', 1)
+        try:
+            response, count = assert_statement_budget(client, method, path.format(**values), budget, headers=headers)
+            failure = None if response.status_code < 400 else f"HTTP {response.status_code}"
+        except StatementBudgetExceeded as e:
+            count, failure = None, str(e)
+        results[endpoint] = (count, failure)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', default=BUDGETS_PATH)
+    args = parser.parse_args()
+    
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    
+    small = measure(budgets, 'small')
+    large = measure(budgets, 'large')
+    
+    failures = []
+    print(f"{'endpoint':<48}{'budget':>8}{'small':>8}{'large':>8}")
+    for endpoint, budget in budgets.items():
+        (small_count, small_failure), (large_count, large_failure) = small[endpoint], large[endpoint]
+        print(f"{endpoint:<48}{budget:>8}{small_count if small_count is not None else '-':>8}"
+              f"{large_count if large_count is not None else '-':>8}")
+        failures += [f"{endpoint} ({name}): {failure}" for name, failure in
+                     (('small', small_failure), ('large', large_failure)) if failure]
+        if small_count is not None and large_count is not None and large_count > small_count:
+            failures.append(f"{endpoint}: {large_count} statements on the large data set vs {small_count} on the small one")
+    
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+Load-test the REST API against a local database.
+
+Seeds a dedicated database with users, workflows, versions, executions and
+execution logs, then runs concurrent virtual users against a local WSGI
+server (or the Flask test client) hitting:
+
+  GET  /api/workflows/
+  GET  /api/executions/
+  GET  /api/executions/<id>/logs
+  POST /api/engine/execute/<id>
+
+For each endpoint it reports p50/p95/p99 latency, the error rate and the
+SQL statements issued per request. The database is dropped and recreated,
+so never point --database-url at one holding real data.
+
+Usage: python benchmarks/load_test.py [--concurrency 500] [--requests 20] [--users 100] [--client http|flask]
+"""
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import math
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert
+from src.metrics import SQL_STATEMENTS_HEADER as STATEMENTS_HEADER
+from workflow_generators import chain
+
+# Relative share of each endpoint in the request mix
+DEFAULT_MIX = 'workflows=3,executions=3,logs=3,execute=1'
+
+
+def make_app(database_url, pool_size):
+    """Create the app on the load-test database, reporting SQL statements per request in a header."""
+    from src.main import create_app
+    
+    config = {'SQLALCHEMY_DATABASE_URI': database_url, 'SQL_STATS_HEADER': True}
+    if database_url.startswith('sqlite'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60, 'check_same_thread': False},
+                                               'pool_size': pool_size, 'max_overflow': pool_size}
+    else:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': pool_size, 'max_overflow': pool_size, 'pool_timeout': 60}
+    return create_app(config)
+
+
+def seed(app, users, workflows_per_user, versions, executions, logs, pending):
+    """
+    Recreate the schema and bulk-insert the data set.
+    
+    Returns (user ids, {user id: [execution ids]}, [pending execution ids]).
+    """
+    from src.models.all_models import Execution, ExecutionLog, User, Workflow, WorkflowVersion, db
+    
+    definition = chain(5)
+    definition_json = json.dumps(definition)
+    node_ids = [node['id'] for node in definition['nodes']]
+    now = datetime.datetime.utcnow()
+    rng = random.Random(0)
+    
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        
+        user_rows = [
+            {'id': i, 'username': f"load{i}", 'email': f"load{i}@example.com", 'password_hash': '-'}
+            for i in range(1, users + 1)
+        ]
+        workflow_rows, version_rows, execution_rows, log_rows = [], [], [], []
+        executions_by_user = {}
+        pending_ids = []
+        for user_id in range(1, users + 1):
+            for _ in range(workflows_per_user):
+                workflow_id = len(workflow_rows) + 1
+                workflow_rows.append({'id': workflow_id, 'name': f"Workflow {workflow_id}", 'created_by': user_id,
+                                      'tags': '["load-test"]', 'version': versions})
+                for number in range(1, versions + 1):
+                    version_rows.append({'id': len(version_rows) + 1, 'workflow_id': workflow_id, 'version': number,
+                                         'definition': definition_json, 'created_by': user_id})
+                version_id = len(version_rows)
+                
+                for _ in range(executions):
+                    execution_id = len(execution_rows) + 1
+                    started_at = now - datetime.timedelta(minutes=rng.randrange(30 * 24 * 60))
+                    execution_rows.append({'id': execution_id, 'workflow_id': workflow_id,
+                                           'workflow_version_id': version_id, 'status': 'completed',
+                                           'started_at': started_at, 'finished_at': started_at,
+                                           'triggered_by': user_id, 'trigger_type': 'manual'})
+                    executions_by_user.setdefault(user_id, []).append(execution_id)
+                    for node_id in node_ids[:logs] + [f"extra{i}" for i in range(logs - len(node_ids))]:
+                        log_rows.append({'execution_id': execution_id, 'node_id': node_id, 'status': 'completed',
+                                         'started_at': started_at, 'finished_at': started_at,
+                                         'input_data': '{}', 'output_data': '{"processed": true}'})
+        
+        # Pending executions are consumed by the execute endpoint, one per request
+        for i in range(pending):
+            workflow = workflow_rows[i % len(workflow_rows)]
+            execution_id = len(execution_rows) + 1
+            execution_rows.append({'id': execution_id, 'workflow_id': workflow['id'],
+                                   'workflow_version_id': workflow['id'] * versions, 'status': 'pending',
+                                   'triggered_by': workflow['created_by'], 'trigger_type': 'manual'})
+            pending_ids.append(execution_id)
+        
+        for model, rows in ((User, user_rows), (Workflow, workflow_rows), (WorkflowVersion, version_rows),
+                            (Execution, execution_rows), (ExecutionLog, log_rows)):
+            for start in range(0, len(rows), 5000):
+                db.session.execute(insert(model), rows[start:start + 5000])
+        db.session.commit()
+    
+    return list(range(1, users + 1)), executions_by_user, pending_ids
+
+
+def make_token(user_id):
+    """Return a bearer token for a seeded user."""
+    from src.routes.auth import generate_token
+    
+    # PyJWT requires the subject claim to be a string
+    token = generate_token(str(user_id))
+    return token if isinstance(token, str) else token.decode()
+
+
+class HTTPClient:
+    """Sends requests to a running server, one connection per request like browsers behind a proxy."""
+    
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+    
+    def request(self, method, path, headers):
+        """Return (status, SQL statements or None)."""
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            statements = response.getheader(STATEMENTS_HEADER)
+            return response.status, int(statements) if statements is not None else None
+        finally:
+            connection.close()
+
+
+class FlaskClient:
+    """Calls the app in-process through the Flask test client, without sockets."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def request(self, method, path, headers):
+        """Return (status, SQL statements or None)."""
+        response = self.app.test_client().open(path, method=method, headers=headers)
+        statements = response.headers.get(STATEMENTS_HEADER)
+        return response.status_code, int(statements) if statements is not None else None
+
+
+def start_server(app):
+    """Serve the app from a threaded local WSGI server; return (host, port)."""
+    from werkzeug.serving import make_server
+    
+    # One access log line per request would dominate the run
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    # Let hundreds of clients connect at once instead of the default backlog of 128
+    server.socket.listen(1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address
+
+
+def virtual_user(client, user_id, executions, pending, mix, requests, results, rng):
+    """Send a user's share of requests, choosing endpoints from the mix."""
+    headers = {'Authorization': f"Bearer {make_token(user_id)}"}
+    endpoints, weights = zip(*mix.items())
+    for _ in range(requests):
+        endpoint = rng.choices(endpoints, weights)[0]
+        if endpoint == 'execute':
+            try:
+                method, path = 'POST', f"/api/engine/execute/{pending.get_nowait()}"
+            except queue.Empty:
+                endpoint, method, path = 'workflows', 'GET', '/api/workflows/'
+        elif endpoint == 'workflows':
+            method, path = 'GET', '/api/workflows/'
+        elif endpoint == 'executions':
+            method, path = 'GET', '/api/executions/'
+        else:
+            method, path = 'GET', f"/api/executions/{rng.choice(executions)}/logs"
+        
+        started = time.perf_counter()
+        try:
+            status, statements = client.request(method, path, headers)
+        except Exception:
+            status, statements = None, None
+        results.append((endpoint, (time.perf_counter() - started) * 1000, status, statements))
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def report(results, elapsed):
+    """Print latency percentiles, error rate and statements per request for every endpoint."""
+    print(f"{len(results)} requests in {elapsed:.1f} s ({len(results) / elapsed:.0f} req/s)")
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'stmts/req':>11}{'max stmts':>11}")
+    for endpoint in sorted({row[0] for row in results}):
+        rows = [row for row in results if row[0] == endpoint]
+        latencies = sorted(row[1] for row in rows)
+        errors = sum(1 for row in rows if row[2] is None or row[2] >= 400)
+        statements = [row[3] for row in rows if row[3] is not None]
+        mean_statements = f"{sum(statements) / len(statements):.1f}" if statements else '-'
+        print(f"{endpoint:<12}{len(rows):>10}{errors / len(rows):>9.1%}{percentile(latencies, 0.5):>10.1f}"
+              f"{percentile(latencies, 0.95):>10.1f}{percentile(latencies, 0.99):>10.1f}"
+              f"{mean_statements:>11}{max(statements, default=0):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None,
+                        help='Dedicated database to seed (defaults to a temporary SQLite file).')
+    parser.add_argument('--client', choices=('http', 'flask'), default='http',
+                        help='Drive a local WSGI server over HTTP, or the app in-process.')
+    parser.add_argument('--concurrency', type=int, default=500, help='Number of virtual users.')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per virtual user.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint weights.')
+    parser.add_argument('--pool-size', type=int, default=20, help='Database connection pool size.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--workflows-per-user', type=int, default=10)
+    parser.add_argument('--versions', type=int, default=3, help='Versions per workflow.')
+    parser.add_argument('--executions', type=int, default=20, help='Executions per workflow.')
+    parser.add_argument('--logs', type=int, default=8, help='Log entries per execution.')
+    args = parser.parse_args()
+    
+    mix = {name: float(weight) for name, weight in (part.split('=') for part in args.mix.split(','))}
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+    pending_count = math.ceil(args.concurrency * args.requests * mix.get('execute', 0) / sum(mix.values()) * 1.2)
+    
+    app = make_app(database_url, args.pool_size)
+    started = time.perf_counter()
+    user_ids, executions_by_user, pending_ids = seed(
+        app, args.users, args.workflows_per_user, args.versions, args.executions, args.logs, pending_count)
+    print(f"Seeded {database_url} in {time.perf_counter() - started:.1f} s: {args.users} users, "
+          f"{args.users * args.workflows_per_user} workflows, {sum(map(len, executions_by_user.values()))} executions")
+    
+    client = FlaskClient(app) if args.client == 'flask' else HTTPClient(*start_server(app))
+    pending = queue.Queue()
+    for execution_id in pending_ids:
+        pending.put(execution_id)
+    
+    results = []
+    threads = []
+    for i in range(args.concurrency):
+        user_id = user_ids[i % len(user_ids)]
+        threads.append(threading.Thread(target=virtual_user, args=(
+            client, user_id, executions_by_user[user_id], pending, mix, args.requests, results, random.Random(i))))
+    
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report(results, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
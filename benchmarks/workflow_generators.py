@@ -0,0 +1,88 @@
+"""
+Synthetic workflow definitions for benchmarks, in the {"nodes": [...], "edges": [...]} format WorkflowEngine runs.
+
+Every generator takes the number of nodes to create and cycles node types
+through ``node_types`` (mock engine types by default, so no provider is
+involved). Node IDs are ``n0``, ``n1``, ... in creation order, and edges
+always point from a lower to a higher index.
+"""
+import random
+
+# Engine node types that return mock results without external calls
+MOCK_NODE_TYPES = ('function', 'action', 'condition')
+
+
+def _definition(size, edges, node_types):
+    """Build a definition with size nodes laid out in a grid and the given (source, target) index pairs."""
+    nodes = [
+        {
+            'id': f"n{i}",
+            'type': node_types[i % len(node_types)],
+            'position': {'x': 100 + 200 * (i % 20), 'y': 100 + 150 * (i // 20)},
+            'data': {'name': f"Node {i}"}
+        }
+        for i in range(size)
+    ]
+    return {
+        'nodes': nodes,
+        'edges': [
+            {'id': f"edge_n{source}_n{target}", 'source': f"n{source}", 'target': f"n{target}"}
+            for source, target in edges
+        ]
+    }
+
+
+def chain(size, node_types=MOCK_NODE_TYPES):
+    """A single path n0 -> n1 -> ... -> n(size-1)."""
+    return _definition(size, [(i - 1, i) for i in range(1, size)], node_types)
+
+
+def fan_out(size, node_types=MOCK_NODE_TYPES):
+    """One root feeding size - 2 parallel nodes that all join into a final node."""
+    size = max(size, 3)
+    sink = size - 1
+    edges = [(0, i) for i in range(1, sink)] + [(i, sink) for i in range(1, sink)]
+    return _definition(size, edges, node_types)
+
+
+def diamonds(size, node_types=MOCK_NODE_TYPES):
+    """Diamonds stacked end to end: each top node splits into two that join again."""
+    edges = []
+    top = 0
+    while top + 3 < size:
+        left, right, bottom = top + 1, top + 2, top + 3
+        edges += [(top, left), (top, right), (left, bottom), (right, bottom)]
+        top = bottom
+    return _definition(top + 1, edges, node_types)
+
+
+def random_dag(size, degree=2, seed=0, node_types=MOCK_NODE_TYPES):
+    """
+    A connected random DAG where each node has up to degree parents.
+    
+    Every node after the first gets one parent chosen among all earlier
+    nodes, plus further parents drawn from a nearby window so the graph
+    has both long and local dependencies.
+    """
+    rng = random.Random(seed)
+    edges = set()
+    for target in range(1, size):
+        edges.add((rng.randrange(target), target))
+        for _ in range(degree - 1):
+            source = rng.randrange(max(0, target - 10), target)
+            edges.add((source, target))
+    return _definition(size, sorted(edges), node_types)
+
+
+def tree(size, branching=3, node_types=MOCK_NODE_TYPES):
+    """A tree filled breadth first, each node having up to branching children."""
+    return _definition(size, [((i - 1) // branching, i) for i in range(1, size)], node_types)
+
+
+GENERATORS = {
+    'chain': chain,
+    'fan_out': fan_out,
+    'diamonds': diamonds,
+    'random_dag': random_dag,
+    'tree': tree
+}
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+
+def _search_tool(arguments):
+    """Mock web search returning a few result snippets."""
+    query = arguments.get('query', '')
+    return {"results": [f"Result {i + 1} for '{query}'" for i in range(3)]}
+
+
+def _fetch_tool(arguments):
+    """Mock page fetch returning the page content."""
+    url = arguments.get('url', '')
+    return {"url": url, "content": f"Mock content of {url}"}
+
+
+def _summarize_tool(arguments):
+    """Mock summarizer returning the start of the text."""
+    text = arguments.get('text', '')
+    return {"summary": text[:200]}
+
+
+# Tools available to agents, by name. Each takes an arguments dict and returns a JSON-serializable result.
+AGENT_TOOLS = {
+    'search': _search_tool,
+    'fetch': _fetch_tool,
+    'summarize': _summarize_tool
+}
+
+
+class AgentRuntime:
+    """
+    Runs an agent loop: plan a step, execute its tool calls, observe, repeat.
+    
+    Tool calls proposed in the same step are independent and run concurrently
+    on a bounded pool. Every tool call, every step and the whole run have
+    deadlines; a tool that misses its deadline is reported as timed out and
+    the loop moves on without waiting for it. ``on_step`` is called with the
+    steps taken so far after each step completes.
+    """
+    
+    def __init__(self, goal, tools=None, max_steps=5, max_parallel_tools=4,
+                 tool_timeout=10, step_timeout=30, time_budget=60, on_step=None):
+        """Initialize the runtime with its goal, tools, limits and step callback."""
+        self.goal = goal
+        self.tools = {name: AGENT_TOOLS[name] for name in (tools or AGENT_TOOLS) if name in AGENT_TOOLS}
+        self.max_steps = max_steps
+        self.max_parallel_tools = max_parallel_tools
+        self.tool_timeout = tool_timeout
+        self.step_timeout = step_timeout
+        self.time_budget = time_budget
+        self.on_step = on_step
+        self.steps = []
+    
+    def run(self):
+        """Run the loop until the plan is finished, steps run out or the budget is spent."""
+        deadline = time.monotonic() + self.time_budget
+        executor = ThreadPoolExecutor(max_workers=self.max_parallel_tools, thread_name_prefix='agent-tool')
+        stopped_reason = 'max_steps'
+        
+        try:
+            for step_number in range(1, self.max_steps + 1):
+                if time.monotonic() >= deadline:
+                    stopped_reason = 'time_budget_exhausted'
+                    break
+                
+                tool_calls = self._plan(step_number)
+                if not tool_calls:
+                    stopped_reason = 'completed'
+                    break
+                
+                step_deadline = min(deadline, time.monotonic() + self.step_timeout)
+                observations = self._execute_tools(executor, tool_calls, step_deadline)
+                self.steps.append({
+                    "step": step_number,
+                    "thought": f"Thinking about how to achieve the goal: {self.goal}",
+                    "action": ", ".join(call["tool"] for call in tool_calls),
+                    "result": f"{sum(1 for o in observations if 'error' not in o)} of {len(observations)} tool calls succeeded",
+                    "tool_calls": observations
+                })
+                
+                if self.on_step:
+                    self.on_step(list(self.steps))
+        finally:
+            # Tools that overran their deadline are abandoned rather than awaited
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return stopped_reason
+    
+    def _plan(self, step_number):
+        """Propose the tool calls for the next step; an empty list means the goal is met."""
+        # In a real implementation, the model would propose tool calls from the goal
+        # and previous observations. For now, search and fetch in parallel, then
+        # summarize what was found.
+        if step_number == 1:
+            calls = [
+                {"tool": "search", "arguments": {"query": self.goal}},
+                {"tool": "fetch", "arguments": {"url": f"https://example.com/search?q={self.goal[:50]}"}}
+            ]
+        elif step_number == 2:
+            observed = [call.get("output") for call in self.steps[-1]["tool_calls"]] if self.steps else []
+            calls = [{"tool": "summarize", "arguments": {"text": json.dumps(observed)}}]
+        else:
+            calls = []
+        
+        return [call for call in calls if call["tool"] in self.tools]
+    
+    def _execute_tools(self, executor, tool_calls, step_deadline):
+        """Run one step's tool calls concurrently and collect their outputs in call order."""
+        started = time.monotonic()
+        futures = [executor.submit(self._call_tool, call) for call in tool_calls]
+        
+        observations = []
+        for call, future in zip(tool_calls, futures):
+            tool_deadline = min(step_deadline, started + self.tool_timeout)
+            observation = {"tool": call["tool"], "arguments": call["arguments"]}
+            try:
+                output, duration = future.result(timeout=max(tool_deadline - time.monotonic(), 0))
+                observation.update(output=output, duration_ms=round(duration * 1000, 2))
+            except TimeoutError:
+                future.cancel()
+                observation["error"] = "Tool call timed out"
+            except Exception as e:
+                observation["error"] = str(e)
+            observations.append(observation)
+        
+        return observations
+    
+    def _call_tool(self, call):
+        """Invoke a tool, returning its output and how long it took."""
+        started = time.monotonic()
+        output = self.tools[call["tool"]](call["arguments"])
+        return output, time.monotonic() - started
@@ -0,0 +1,136 @@
+from src.ai.handlers import LLMNodeHandler
+from src.ai.tokens import estimate_cost, usage_tokens
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+import time
+
+# Providers whose handler accepts many prompts in a single request
+MULTI_PROMPT_PROVIDERS = ('openai', 'anthropic')
+
+
+class LLMRequestBatcher:
+    """
+    Groups compatible LLM prompts into provider batches.
+    
+    Prompts are compatible when they share provider, model, temperature and
+    max_tokens. The first prompt of a group opens a short window; the group is
+    sent when the window closes or it reaches ``max_batch_size``. Batches run on
+    a bounded pool so at most ``max_connections`` provider requests are in flight.
+    """
+    
+    def __init__(self, window_seconds=0.02, max_batch_size=20, max_connections=4):
+        """Initialize the batcher with its window, batch size and connection limit."""
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='llm-batch')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timers = {}
+        self._metrics = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'estimated_cost': 0.0
+        }
+        self._first_request_at = None
+        self._last_completed_at = None
+    
+    @classmethod
+    def from_environment(cls):
+        """Create a batcher configured from environment variables."""
+        return cls(
+            window_seconds=int(os.getenv('LLM_BATCH_WINDOW_MS', '20')) / 1000,
+            max_batch_size=int(os.getenv('LLM_BATCH_MAX_SIZE', '20')),
+            max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', '4'))
+        )
+    
+    def submit(self, model, provider, prompt, max_tokens, temperature):
+        """Queue a rendered prompt and return a Future for its result."""
+        key = (provider, model, temperature, max_tokens)
+        future = Future()
+        
+        with self._lock:
+            self._metrics['requests'] += 1
+            if self._first_request_at is None:
+                self._first_request_at = time.monotonic()
+            batch = self._pending.setdefault(key, [])
+            batch.append((prompt, future))
+            
+            if len(batch) >= self.max_batch_size:
+                self._dispatch_locked(key)
+            elif len(batch) == 1:
+                timer = threading.Timer(self.window_seconds, self._flush, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        
+        return future
+    
+    def _flush(self, key):
+        """Send whatever is pending for a key when its window closes."""
+        with self._lock:
+            if self._pending.get(key):
+                self._dispatch_locked(key)
+    
+    def _dispatch_locked(self, key):
+        """Hand the pending batch for a key to the pool. Caller holds the lock."""
+        batch = self._pending.pop(key)
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        
+        provider = key[0]
+        if provider in MULTI_PROMPT_PROVIDERS:
+            self._metrics['batches'] += 1
+            self._executor.submit(self._send, key, batch)
+        else:
+            # No multi-prompt interface, so spread the prompts over the bounded pool
+            self._metrics['batches'] += len(batch)
+            for item in batch:
+                self._executor.submit(self._send, key, [item])
+    
+    def _send(self, key, batch):
+        """Send one batch to the provider and resolve each caller's future."""
+        provider, model, temperature, max_tokens = key
+        prompts = [prompt for prompt, _ in batch]
+        
+        try:
+            results = LLMNodeHandler.generate_batch(model, provider, prompts, max_tokens, temperature)
+        except Exception as e:
+            with self._lock:
+                self._metrics['errors'] += len(batch)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        prompt_tokens = completion_tokens = 0
+        for result in results:
+            used_prompt, used_completion = usage_tokens(result.get('usage'))
+            prompt_tokens += used_prompt
+            completion_tokens += used_completion
+        
+        with self._lock:
+            self._metrics['prompt_tokens'] += prompt_tokens
+            self._metrics['completion_tokens'] += completion_tokens
+            self._metrics['estimated_cost'] += estimate_cost(model, prompt_tokens, completion_tokens)
+            self._last_completed_at = time.monotonic()
+        
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def stats(self):
+        """Return throughput and cost metrics for all batches sent so far."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            elapsed = 0
+            if self._last_completed_at is not None:
+                elapsed = self._last_completed_at - self._first_request_at
+        
+        completed = metrics['requests'] - metrics['errors']
+        metrics['average_batch_size'] = metrics['requests'] / metrics['batches'] if metrics['batches'] else 0
+        metrics['requests_per_second'] = completed / elapsed if elapsed else 0
+        metrics['estimated_cost'] = round(metrics['estimated_cost'], 6)
+        return metrics
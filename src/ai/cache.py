@@ -0,0 +1,327 @@
+from src.ai.tokens import usage_tokens
+from collections import OrderedDict
+import atexit
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide LLM response cache, or None when it is disabled."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None and os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true':
+            _response_cache = LLMResponseCache.from_environment()
+        return _response_cache
+
+
+def hashed_embedding(text, dimensions=256):
+    """
+    Embed text as a normalized vector of hashed word unigrams and bigrams.
+    
+    This keeps the semantic tier dependency-free; prompts that differ only in
+    whitespace, casing or a few words land close together.
+    """
+    vector = [0.0] * dimensions
+    words = _WORD_PATTERN.findall(text.lower())
+    for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little')
+        vector[digest % dimensions] += -1.0 if digest >> 63 else 1.0
+    
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm:
+        vector = [value / norm for value in vector]
+    return vector
+
+
+class SemanticIndex:
+    """
+    Locality-sensitive hash index of embedding vectors, for finding near neighbours without a full scan.
+    
+    Each of ``tables`` hash tables buckets a vector by the signs of its dot
+    products with ``bits`` random hyperplanes, so similar vectors usually
+    share a bucket in at least one table. Lookups only score the vectors in
+    the query's buckets. Signatures can be computed without a lock; callers
+    synchronize the other methods.
+    """
+    
+    def __init__(self, tables=8, bits=8, seed=0):
+        """Initialize an empty index; the hyperplanes are drawn from seed once the dimension is known."""
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self._planes = None
+        self._buckets = {}
+        self._signatures = {}
+    
+    def signature(self, vector):
+        """Return the bucket of a vector in every table."""
+        if self._planes is None:
+            # Threads racing here draw the same planes from the same seed
+            rng = random.Random(self.seed)
+            self._planes = [[rng.gauss(0, 1) for _ in vector] for _ in range(self.tables * self.bits)]
+        
+        # Hashed embeddings are sparse, so only their non-zero dimensions are multiplied
+        nonzero = [(index, value) for index, value in enumerate(vector) if value]
+        signs = [sum(plane[index] * value for index, value in nonzero) >= 0 for plane in self._planes]
+        return [
+            (table, sum(1 << bit for bit in range(self.bits) if signs[table * self.bits + bit]))
+            for table in range(self.tables)
+        ]
+    
+    def add(self, group, key, vector, signature):
+        """Index a vector and its signature under a key within a group (a cache partition)."""
+        self.remove(key)
+        buckets = [(group,) + bucket for bucket in signature]
+        for bucket in buckets:
+            self._buckets.setdefault(bucket, {})[key] = vector
+        self._signatures[key] = buckets
+    
+    def remove(self, key):
+        """Drop a key from the index, if present."""
+        for bucket in self._signatures.pop(key, ()):
+            vectors = self._buckets.get(bucket)
+            if vectors is not None:
+                vectors.pop(key, None)
+                if not vectors:
+                    del self._buckets[bucket]
+    
+    def candidates(self, group, signature, limit):
+        """Return up to limit (key, vector) pairs sharing a bucket with a signature in the group."""
+        found = {}
+        for bucket in signature:
+            for key, candidate in self._buckets.get((group,) + bucket, {}).items():
+                found[key] = candidate
+                if len(found) >= limit:
+                    return list(found.items())
+        return list(found.items())
+    
+    def clear(self):
+        self._buckets.clear()
+        self._signatures.clear()
+
+
+class LLMResponseCache:
+    """
+    Cache of LLM provider responses for deterministic (temperature 0) calls.
+    
+    The exact tier is keyed by (provider, model, prompt, temperature,
+    max_tokens) with LRU and TTL eviction. The optional semantic tier keeps a
+    local LSH vector index per (provider, model, temperature, max_tokens) and
+    serves a stored response when a new prompt is similar enough to a cached
+    one. Only up to max_semantic_candidates vectors from the prompt's
+    buckets are scored, outside the lock. With a path, entries are loaded at start-up and written back
+    periodically and at exit.
+    """
+    
+    def __init__(self, max_entries=10000, ttl_seconds=3600, path=None, semantic=False,
+                 similarity_threshold=0.95, embed=hashed_embedding, save_every=100, max_semantic_candidates=256):
+        """Initialize the cache with its limits, persistence path and semantic tier options."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.save_every = save_every
+        self.max_semantic_candidates = max_semantic_candidates
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._index = SemanticIndex()
+        self._unsaved = 0
+        self._stats = {
+            'hits': 0,
+            'semantic_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'tokens_saved': 0
+        }
+        
+        if path:
+            self._load()
+            atexit.register(self.save)
+    
+    @classmethod
+    def from_environment(cls):
+        """Create a cache configured from environment variables."""
+        return cls(
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+            ttl_seconds=int(os.getenv('LLM_CACHE_TTL_SECONDS', '3600')),
+            path=os.getenv('LLM_CACHE_PATH') or None,
+            semantic=os.getenv('LLM_CACHE_SEMANTIC', 'false').lower() == 'true',
+            similarity_threshold=float(os.getenv('LLM_CACHE_SEMANTIC_THRESHOLD', '0.95')),
+            max_semantic_candidates=int(os.getenv('LLM_CACHE_SEMANTIC_CANDIDATES', '256'))
+        )
+    
+    @staticmethod
+    def is_cacheable(temperature):
+        """Only deterministic settings produce responses worth replaying."""
+        return temperature == 0
+    
+    @staticmethod
+    def make_key(provider, model, prompt, temperature, max_tokens):
+        """Build the exact-match key for a provider call."""
+        raw = json.dumps([provider, model, prompt, temperature, max_tokens])
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def get(self, provider, model, prompt, temperature, max_tokens):
+        """Return a copy of the cached response for a call, or None."""
+        if not self.is_cacheable(temperature):
+            return None
+        
+        key = self.make_key(provider, model, prompt, temperature, max_tokens)
+        partition = (provider, model, temperature, max_tokens)
+        
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                self._stats['hits'] += 1
+        
+        if entry is None and self.semantic:
+            # Embedding and scoring happen outside the lock so concurrent lookups don't queue behind them
+            vector = self.embed(prompt)
+            signature = self._index.signature(vector)
+            with self._lock:
+                candidates = self._index.candidates(partition, signature, self.max_semantic_candidates)
+            best_key = self._nearest_key(vector, candidates)
+            if best_key is not None:
+                with self._lock:
+                    entry = self._live_entry(best_key)
+                    if entry is not None:
+                        self._stats['semantic_hits'] += 1
+        
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            
+            if entry['key'] in self._entries:
+                self._entries.move_to_end(entry['key'])
+            self._stats['tokens_saved'] += entry['tokens']
+        
+        result = json.loads(entry['result'])
+        result['cached'] = True
+        return result
+    
+    def put(self, provider, model, prompt, temperature, max_tokens, result):
+        """Store a provider response for a deterministic call."""
+        if not self.is_cacheable(temperature):
+            return
+        
+        key = self.make_key(provider, model, prompt, temperature, max_tokens)
+        entry = {
+            'key': key,
+            'partition': [provider, model, temperature, max_tokens],
+            'prompt': prompt,
+            'result': json.dumps(result),
+            'tokens': sum(usage_tokens(result.get('usage'))),
+            'expires_at': time.time() + self.ttl_seconds
+        }
+        vector, signature = self._embedding(prompt)
+        
+        with self._lock:
+            self._store(entry, vector, signature)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        
+        if should_save:
+            self.save()
+    
+    def _embedding(self, prompt):
+        """Return the vector and index signature of a prompt, or (None, None) without the semantic tier."""
+        if not self.semantic:
+            return None, None
+        vector = self.embed(prompt)
+        return vector, self._index.signature(vector)
+    
+    def _store(self, entry, vector, signature):
+        """Insert an entry, evicting the least recently used ones. Caller holds the lock."""
+        if entry['key'] in self._entries:
+            self._remove(entry['key'])
+        
+        self._entries[entry['key']] = entry
+        if vector is not None:
+            self._index.add(tuple(entry['partition']), entry['key'], vector, signature)
+        
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+    
+    def _remove(self, key):
+        """Drop an entry from both tiers. Caller holds the lock."""
+        self._entries.pop(key)
+        self._index.remove(key)
+    
+    def _live_entry(self, key):
+        """Return an unexpired entry for the key, dropping it if expired. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None and entry['expires_at'] < time.time():
+            self._remove(key)
+            self._stats['evictions'] += 1
+            return None
+        return entry
+    
+    def _nearest_key(self, vector, candidates):
+        """Return the key of the candidate most similar to vector, if any reaches the threshold."""
+        nonzero = [(index, value) for index, value in enumerate(vector) if value]
+        best_key, best_score = None, self.similarity_threshold
+        for key, candidate in candidates:
+            score = sum(value * candidate[index] for index, value in nonzero)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+    
+    def save(self):
+        """Write live entries to the persistence file, replacing it atomically."""
+        if not self.path:
+            return
+        
+        with self._lock:
+            now = time.time()
+            entries = [entry for entry in self._entries.values() if entry['expires_at'] >= now]
+            self._unsaved = 0
+        
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self.path)
+    
+    def _load(self):
+        """Load unexpired entries from the persistence file, if it exists."""
+        if not os.path.exists(self.path):
+            return
+        
+        with open(self.path) as f:
+            entries = json.load(f)
+        
+        now = time.time()
+        with self._lock:
+            for entry in entries:
+                if entry['expires_at'] >= now:
+                    self._store(entry, *self._embedding(entry['prompt']))
+    
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+    
+    def stats(self):
+        """Return hit rates, tokens saved and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        
+        lookups = stats['hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['semantic_hits']) / lookups if lookups else 0
+        return stats
@@ -0,0 +1,220 @@
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Served when no AI models have been configured in the database
+DEFAULT_MODELS = [
+    {
+        "id": "gpt-4",
+        "name": "GPT-4",
+        "provider": "openai",
+        "type": "llm",
+        "description": "Advanced language model from OpenAI"
+    },
+    {
+        "id": "gpt-3.5-turbo",
+        "name": "GPT-3.5 Turbo",
+        "provider": "openai",
+        "type": "llm",
+        "description": "Efficient language model from OpenAI"
+    },
+    {
+        "id": "claude-3-opus",
+        "name": "Claude 3 Opus",
+        "provider": "anthropic",
+        "type": "llm",
+        "description": "Advanced language model from Anthropic"
+    },
+    {
+        "id": "claude-3-sonnet",
+        "name": "Claude 3 Sonnet",
+        "provider": "anthropic",
+        "type": "llm",
+        "description": "Balanced language model from Anthropic"
+    },
+    {
+        "id": "gemini-pro",
+        "name": "Gemini Pro",
+        "provider": "google",
+        "type": "llm",
+        "description": "Advanced language model from Google"
+    },
+    {
+        "id": "agent-basic",
+        "name": "Basic Agent",
+        "provider": "internal",
+        "type": "agent",
+        "description": "Basic autonomous agent for simple tasks"
+    },
+    {
+        "id": "agent-advanced",
+        "name": "Advanced Agent",
+        "provider": "internal",
+        "type": "agent",
+        "description": "Advanced autonomous agent for complex tasks"
+    },
+    {
+        "id": "dalle-3",
+        "name": "DALL-E 3",
+        "provider": "openai",
+        "type": "image",
+        "description": "Image generation model from OpenAI"
+    }
+]
+
+_model_catalog = None
+_model_catalog_lock = threading.Lock()
+
+
+def get_model_catalog():
+    """Return the process-wide AI model catalog, subscribing it to model changes on first use."""
+    global _model_catalog
+    with _model_catalog_lock:
+        if _model_catalog is None:
+            _model_catalog = ModelCatalog(check_interval=float(os.getenv('MODEL_CATALOG_CHECK_SECONDS', '30')))
+            _model_catalog.listen()
+        return _model_catalog
+
+
+class ModelCatalogSnapshot:
+    """
+    An immutable view of the AI model table.
+    
+    Each model is serialized once, with its configuration already decoded,
+    and indexed by ID, type and provider. Filtered views are built on first
+    request and kept with their encoded JSON body and ETag.
+    """
+    
+    def __init__(self, models, stamp, fallback=False):
+        """Index the serialized models."""
+        self.stamp = stamp
+        self.fallback = fallback
+        self.by_id = {model['id']: model for model in models}
+        self.active = [model for model in models if model.get('is_active', True)]
+        self.by_type = {}
+        self.by_provider = {}
+        for model in self.active:
+            self.by_type.setdefault(model['type'], []).append(model)
+            self.by_provider.setdefault(model['provider'], []).append(model)
+        self._views = {}
+        self._lock = threading.Lock()
+    
+    def models(self, model_type=None, provider=None):
+        """Return the active models, optionally filtered by type and provider."""
+        if model_type and provider:
+            return [model for model in self.by_type.get(model_type, []) if model['provider'] == provider]
+        if model_type:
+            return self.by_type.get(model_type, [])
+        if provider:
+            return self.by_provider.get(provider, [])
+        return self.active
+    
+    def view(self, model_type=None, provider=None):
+        """Return (json_body, etag) for a filtered listing, encoding it once per snapshot."""
+        key = (model_type, provider)
+        with self._lock:
+            cached = self._views.get(key)
+        if cached is not None:
+            return cached
+        
+        body = json.dumps({'models': self.models(model_type, provider)})
+        cached = (body, hashlib.sha256(body.encode()).hexdigest()[:32])
+        with self._lock:
+            self._views[key] = cached
+        return cached
+
+
+class ModelCatalog:
+    """
+    Serves AI model listings from memory instead of querying on every request.
+    
+    Rows are loaded once into a snapshot. Commits that touch ``AIModel`` in
+    this process invalidate it immediately; changes made by other processes
+    are picked up through a cheap version stamp (row count and latest
+    ``updated_at``) checked at most every ``check_interval`` seconds. When
+    the table has no rows the built-in ``DEFAULT_MODELS`` are served.
+    """
+    
+    def __init__(self, check_interval=30):
+        """Initialize an empty catalog."""
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+    
+    def listen(self):
+        """Invalidate the catalog whenever a session commits changes to AI models."""
+        from src.models.all_models import AIModel, db
+        
+        def mark_changed(mapper, connection, target):
+            session = db.inspect(target).session
+            if session is not None:
+                session.info['ai_models_changed'] = True
+        
+        def invalidate_on_commit(session):
+            if session.info.pop('ai_models_changed', False):
+                self.invalidate()
+        
+        def forget_on_rollback(session, previous_transaction):
+            session.info.pop('ai_models_changed', None)
+        
+        for mapper_event in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(AIModel, mapper_event, mark_changed)
+        event.listen(Session, 'after_commit', invalidate_on_commit)
+        event.listen(Session, 'after_soft_rollback', forget_on_rollback)
+    
+    def invalidate(self):
+        """Drop the current snapshot so the next request reloads it."""
+        with self._lock:
+            self._snapshot = None
+    
+    def snapshot(self):
+        """Return the current snapshot, reloading it if it was invalidated or the stamp moved."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._checked_at < self.check_interval:
+                return snapshot
+            
+            stamp = self._version_stamp()
+            if snapshot is None or snapshot.stamp != stamp:
+                snapshot = self._load(stamp)
+                self._snapshot = snapshot
+            self._checked_at = now
+            return snapshot
+    
+    def models(self, model_type=None, provider=None):
+        """Return the active models, optionally filtered by type and provider. Treat them as read-only."""
+        return self.snapshot().models(model_type, provider)
+    
+    def get(self, model_id):
+        """Return a model by ID, active or not, or None."""
+        return self.snapshot().by_id.get(model_id)
+    
+    def view(self, model_type=None, provider=None):
+        """Return (json_body, etag) for a filtered listing."""
+        return self.snapshot().view(model_type, provider)
+    
+    def _version_stamp(self):
+        """Return a value that changes whenever a model is added, updated or removed."""
+        from src.models.all_models import AIModel, db
+        
+        count, updated_at = db.session.query(func.count(AIModel.id), func.max(AIModel.updated_at)).one()
+        return count, updated_at.isoformat() if updated_at else None
+    
+    def _load(self, stamp):
+        """Load every model row into a new snapshot, falling back to the built-in list."""
+        from src.models.all_models import AIModel
+        
+        models = [model.to_dict() for model in AIModel.query.order_by(AIModel.id).all()]
+        if not models:
+            return ModelCatalogSnapshot(DEFAULT_MODELS, stamp, fallback=True)
+        return ModelCatalogSnapshot(models, stamp)
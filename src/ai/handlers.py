@@ -1,24 +1,63 @@
 from src.models import db
+from src.ai.agent import AgentRuntime
+from src.ai.cache import get_response_cache
+from src.ai.suggestion_cache import get_suggestion_cache, hash_prompt
+from src.ai.suggestion_rules import DEFAULT_STAGE_NODES, STAGES, SUGGESTION_RULES, match_rules
+from src.ai.templating import render_template
+from src.ai.tokens import count_tokens, prompt_token_budget, truncate_to_tokens
+from src.metrics import provider_call
 from datetime import datetime
 import json
-import requests
 import os
+import re
+
+_TOKEN_PATTERN = re.compile(r'\S+\s*|\s+')
+
+
+def _split_tokens(text):
+    """Yield text as word-sized deltas that concatenate back to the original."""
+    for match in _TOKEN_PATTERN.finditer(text):
+        yield match.group()
+
 
 class AINodeHandler:
     """
     Base class for AI node handlers that process AI-related operations in workflows.
     """
     
-    def __init__(self, node_data, input_data=None):
-        """Initialize the AI node handler with node configuration and input data."""
+    def __init__(self, node_data, input_data=None, variables=None):
+        """Initialize the AI node handler with node configuration, input data and workflow variables."""
         self.node_data = node_data
         self.input_data = input_data or {}
+        self.variables = variables or {}
         self.result = {}
     
     def process(self):
         """Process the AI node and return the result."""
         raise NotImplementedError("Subclasses must implement this method")
     
+    def stream(self):
+        """
+        Process the AI node incrementally.
+        
+        Yields ``{"delta": text}`` events while output is produced and finishes
+        with ``{"done": True, "result": result}``. Handlers that cannot stream
+        emit only the final event.
+        """
+        result = self.process()
+        yield {"done": True, "result": result}
+    
+    def _render_prompt(self, prompt):
+        """Fill {{key}}, {{node.field}} and {{vars.name}} placeholders in the prompt."""
+        return render_template(prompt, self.input_data, self.variables)
+    
+    def _stream_text(self, result, text_field):
+        """Replay the text field of a finished result (e.g. a cached one) as token deltas, then yield the result."""
+        for delta in _split_tokens(result.get(text_field) or ''):
+            yield {"delta": delta}
+        self.result = result
+        yield {"done": True, "result": result}
+    
     def _get_api_key(self, provider):
         """Get API key for the specified provider."""
         # In a real implementation, this would retrieve from secure storage
@@ -38,63 +77,158 @@ class LLMNodeHandler(AINodeHandler):
     Handler for LLM (Large Language Model) nodes that generate text using AI models.
     """
     
+    prompt_truncated = False
+    
     def process(self):
         """Process the LLM node and return the generated text."""
+        result = self._annotate(self._generate_cached(*self._get_settings()))
+        self.result = result
+        return result
+    
+    def stream(self):
+        """
+        Process the LLM node, yielding the generated text as the provider produces it.
+        
+        Cached responses are replayed. Otherwise the completion is assembled
+        from the provider's deltas and cached only once the stream finishes.
+        """
+        model, provider, prompt, max_tokens, temperature = self._get_settings()
+        cache = self.get_cache()
+        result = cache.get(provider, model, prompt, temperature, max_tokens) if cache is not None else None
+        if result is not None:
+            yield from self._stream_text(self._annotate(result), 'generated_text')
+            return
+        
+        parts = []
+        with provider_call(provider, 'completion'):
+            for delta in self._generate_stream(model, provider, prompt, max_tokens, temperature):
+                parts.append(delta)
+                yield {"delta": delta}
+        
+        result = self._provider_result(model, provider, prompt, ''.join(parts))
+        if cache is not None:
+            cache.put(provider, model, prompt, temperature, max_tokens, result)
+        result = self._annotate(result)
+        self.result = result
+        yield {"done": True, "result": result}
+    
+    def _annotate(self, result):
+        """Flag results whose prompt was cut down to fit the token budget."""
+        if self.prompt_truncated:
+            result = dict(result, prompt_truncated=True)
+        return result
+    
+    def get_cache(self):
+        """Return the response cache for this node, or None if it opted out."""
+        if self.node_data.get('cache', True) is False:
+            return None
+        return get_response_cache()
+    
+    def _generate_cached(self, model, provider, prompt, max_tokens, temperature):
+        """Serve a deterministic call from the response cache, calling the provider on a miss."""
+        cache = self.get_cache()
+        if cache is None:
+            return self._generate(model, provider, prompt, max_tokens, temperature)
+        
+        result = cache.get(provider, model, prompt, temperature, max_tokens)
+        if result is None:
+            result = self._generate(model, provider, prompt, max_tokens, temperature)
+            cache.put(provider, model, prompt, temperature, max_tokens, result)
+        return result
+    
+    @classmethod
+    def generate_batch(cls, model, provider, prompts, max_tokens, temperature):
+        """Generate completions for several rendered prompts in one provider request."""
+        # In a real implementation, this would send every prompt in a single
+        # multi-prompt request; the mock providers answer them one by one
+        handler = cls({})
+        return [handler._generate(model, provider, prompt, max_tokens, temperature) for prompt in prompts]
+    
+    def _get_settings(self):
+        """Return the (model, provider, prompt, max_tokens, temperature) for this node."""
         model = self.node_data.get('model', 'gpt-4')
         provider = self.node_data.get('provider', 'openai')
-        prompt = self.node_data.get('prompt', '')
+        prompt = self._render_prompt(self.node_data.get('prompt', ''))
         max_tokens = self.node_data.get('max_tokens', 1000)
         temperature = self.node_data.get('temperature', 0.7)
         
-        # Replace variables in prompt with input data
-        if prompt:
-            for key, value in self.input_data.items():
-                if isinstance(value, dict) and 'result' in value:
-                    prompt = prompt.replace(f"{{{{{key}}}}}", str(value['result']))
-                else:
-                    prompt = prompt.replace(f"{{{{{key}}}}}", str(value))
-        
-        # In a real implementation, this would call the actual API
-        # For now, we'll simulate a response
+        # Trim the prompt before the call so it fits next to the completion budget
+        budget = prompt_token_budget(model, max_tokens, self.node_data.get('max_prompt_tokens'))
+        truncated = truncate_to_tokens(prompt, model, budget)
+        if len(truncated) < len(prompt):
+            prompt = truncated
+            self.prompt_truncated = True
+        
+        return model, provider, prompt, max_tokens, temperature
+    
+    def _uses_live_api(self, provider):
+        """Whether calls to a provider go to its real API rather than the mock: OpenAI once a key is configured."""
+        return provider == 'openai' and bool(os.environ.get('OPENAI_API_KEY'))
+    
+    def _generate(self, model, provider, prompt, max_tokens, temperature):
+        """Call the configured provider for a fully rendered prompt."""
+        # Providers without a live integration are simulated
+        with provider_call(provider, 'completion'):
+            if self._uses_live_api(provider):
+                return self._real_openai_call(model, prompt, max_tokens, temperature)
+            elif provider == 'openai':
+                return self._mock_openai_call(model, prompt, max_tokens, temperature)
+            elif provider == 'anthropic':
+                return self._mock_anthropic_call(model, prompt, max_tokens, temperature)
+            else:
+                return self._provider_result(model, provider, prompt, self._mock_text(model, provider, prompt))
+    
+    def _generate_stream(self, model, provider, prompt, max_tokens, temperature):
+        """Yield text deltas from the configured provider as they are produced, choosing it like _generate does."""
+        if self._uses_live_api(provider):
+            yield from self._real_openai_stream(model, prompt, max_tokens, temperature)
+        else:
+            yield from _split_tokens(self._mock_text(model, provider, prompt))
+    
+    def _mock_text(self, model, provider, prompt):
+        """Return the text the mock providers answer a prompt with."""
+        names = {'openai': 'OpenAI', 'anthropic': 'Anthropic'}
+        return f"This is a mock response from {names.get(provider, provider)} {model} for prompt: {prompt[:50]}..."
+    
+    def _provider_result(self, model, provider, prompt, generated_text):
+        """Build the result a provider returns for a completion, with token usage counted locally."""
         if provider == 'openai':
-            result = self._mock_openai_call(model, prompt, max_tokens, temperature)
+            prompt_tokens = count_tokens(prompt, model)
+            completion_tokens = count_tokens(generated_text, model)
+            return {
+                "model": model,
+                "generated_text": generated_text,
+                "finish_reason": "stop",
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            }
         elif provider == 'anthropic':
-            result = self._mock_anthropic_call(model, prompt, max_tokens, temperature)
-        else:
-            result = {
-                "generated_text": f"This is a mock response from {provider} {model} for prompt: {prompt[:50]}..."
+            return {
+                "model": model,
+                "generated_text": generated_text,
+                "stop_reason": "end_turn",
+                "usage": {
+                    "input_tokens": count_tokens(prompt, model),
+                    "output_tokens": count_tokens(generated_text, model)
+                }
             }
-        
-        self.result = result
-        return result
+        return {"generated_text": generated_text}
     
     def _mock_openai_call(self, model, prompt, max_tokens, temperature):
         """Mock an OpenAI API call."""
-        return {
-            "model": model,
-            "generated_text": f"This is a mock response from OpenAI {model} for prompt: {prompt[:50]}...",
-            "finish_reason": "stop",
-            "usage": {
-                "prompt_tokens": len(prompt.split()),
-                "completion_tokens": 50,
-                "total_tokens": len(prompt.split()) + 50
-            }
-        }
+        return self._provider_result(model, 'openai', prompt, self._mock_text(model, 'openai', prompt))
     
     def _mock_anthropic_call(self, model, prompt, max_tokens, temperature):
         """Mock an Anthropic API call."""
-        return {
-            "model": model,
-            "generated_text": f"This is a mock response from Anthropic {model} for prompt: {prompt[:50]}...",
-            "stop_reason": "end_turn",
-            "usage": {
-                "input_tokens": len(prompt.split()),
-                "output_tokens": 50
-            }
-        }
+        return self._provider_result(model, 'anthropic', prompt, self._mock_text(model, 'anthropic', prompt))
     
     def _real_openai_call(self, model, prompt, max_tokens, temperature):
         """Make a real OpenAI API call."""
+        import requests
+        
         api_key = self._get_api_key('openai')
         headers = {
             "Authorization": f"Bearer {api_key}",
@@ -124,6 +258,46 @@ class LLMNodeHandler(AINodeHandler):
             }
         else:
             raise Exception(f"OpenAI API error: {response.text}")
+    
+    def _real_openai_stream(self, model, prompt, max_tokens, temperature):
+        """Make a real streaming OpenAI API call, yielding text deltas."""
+        import requests
+        
+        api_key = self._get_api_key('openai')
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+        
+        response = requests.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=headers,
+            json=data,
+            stream=True
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"OpenAI API error: {response.text}")
+        
+        # The API sends Server-Sent Events terminated by a [DONE] marker
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data: '):
+                continue
+            payload = line[len('data: '):]
+            if payload == '[DONE]':
+                break
+            choice = json.loads(payload)["choices"][0]
+            delta = choice.get("delta", {}).get("content")
+            if delta:
+                yield delta
 
 
 class AgentNodeHandler(AINodeHandler):
@@ -131,42 +305,42 @@ class AgentNodeHandler(AINodeHandler):
     Handler for Agent nodes that execute autonomous tasks using AI.
     """
     
+    def __init__(self, node_data, input_data=None, variables=None, on_step=None):
+        """Initialize the handler; on_step receives the steps taken so far after each step."""
+        super().__init__(node_data, input_data, variables)
+        self.on_step = on_step
+    
     def process(self):
         """Process the Agent node and return the result of the autonomous task."""
         agent_type = self.node_data.get('agent_type', 'general')
         goal = self.node_data.get('goal', '')
         model = self.node_data.get('model', 'gpt-4')
         provider = self.node_data.get('provider', 'openai')
-        max_steps = self.node_data.get('max_steps', 5)
         
         # Replace variables in goal with input data
-        if goal:
-            for key, value in self.input_data.items():
-                if isinstance(value, dict) and 'result' in value:
-                    goal = goal.replace(f"{{{{{key}}}}}", str(value['result']))
-                else:
-                    goal = goal.replace(f"{{{{{key}}}}}", str(value))
-        
-        # In a real implementation, this would execute an autonomous agent
-        # For now, we'll simulate a response
-        
-        # Simulate agent steps
-        steps = []
-        for i in range(min(3, max_steps)):
-            steps.append({
-                "step": i + 1,
-                "thought": f"Thinking about how to achieve the goal: {goal}",
-                "action": f"Action {i+1}: Performing subtask {i+1}",
-                "result": f"Result of subtask {i+1}"
-            })
+        goal = self._render_prompt(goal)
+        
+        runtime = AgentRuntime(
+            goal,
+            tools=self.node_data.get('tools'),
+            max_steps=self.node_data.get('max_steps', 5),
+            max_parallel_tools=self.node_data.get('max_parallel_tools', 4),
+            tool_timeout=self.node_data.get('tool_timeout', 10),
+            step_timeout=self.node_data.get('step_timeout', 30),
+            time_budget=self.node_data.get('time_budget', 60),
+            on_step=self.on_step
+        )
+        stopped_reason = runtime.run()
+        success = stopped_reason == 'completed'
         
         result = {
             "agent_type": agent_type,
             "goal": goal,
             "model": model,
-            "steps_taken": steps,
-            "final_result": f"Successfully completed the goal: {goal}",
-            "success": True
+            "steps_taken": runtime.steps,
+            "stopped_reason": stopped_reason,
+            "final_result": f"Successfully completed the goal: {goal}" if success else f"Stopped before completing the goal: {stopped_reason}",
+            "success": success
         }
         
         self.result = result
@@ -180,48 +354,74 @@ class ContentGenerationNodeHandler(AINodeHandler):
     
     def process(self):
         """Process the Content Generation node and return the generated content."""
-        content_type = self.node_data.get('content_type', 'text')
-        prompt = self.node_data.get('prompt', '')
-        model = self.node_data.get('model', 'gpt-4')
-        provider = self.node_data.get('provider', 'openai')
-        
+        result = self._generate()
+        self.result = result
+        return result
+    
+    def stream(self):
+        """Process the Content Generation node, yielding text content as it is produced."""
+        content_type, prompt, model, provider = self._get_settings()
+        if content_type == 'image':
+            # Image URLs are not meaningful in pieces
+            result = self.process()
+            yield {"done": True, "result": result}
+            return
+        
+        parts = []
+        with provider_call(provider, 'content_generation'):
+            for delta in self._generate_stream(content_type, prompt):
+                parts.append(delta)
+                yield {"delta": delta}
+        
+        result = self._build_result(content_type, prompt, model, ''.join(parts))
+        self.result = result
+        yield {"done": True, "result": result}
+    
+    def _generate(self):
+        """Generate content, timing the provider call."""
+        content_type, prompt, model, provider = self._get_settings()
+        with provider_call(provider, 'content_generation'):
+            return self._build_result(content_type, prompt, model, ''.join(self._generate_stream(content_type, prompt)))
+    
+    def _get_settings(self):
+        """Return the (content_type, prompt, model, provider) for this node."""
         # Replace variables in prompt with input data
-        if prompt:
-            for key, value in self.input_data.items():
-                if isinstance(value, dict) and 'result' in value:
-                    prompt = prompt.replace(f"{{{{{key}}}}}", str(value['result']))
-                else:
-                    prompt = prompt.replace(f"{{{{{key}}}}}", str(value))
-        
-        # In a real implementation, this would call the appropriate content generation API
+        prompt = self._render_prompt(self.node_data.get('prompt', ''))
+        return (self.node_data.get('content_type', 'text'), prompt,
+                self.node_data.get('model', 'gpt-4'), self.node_data.get('provider', 'openai'))
+    
+    def _generate_stream(self, content_type, prompt):
+        """Yield the generated content in deltas as it is produced."""
+        # In a real implementation, this would stream from the appropriate content generation API
         # For now, we'll simulate a response
-        
         if content_type == 'text':
-            result = {
-                "content_type": "text",
-                "generated_content": f"This is a mock text response for prompt: {prompt[:50]}..."
-            }
+            content = f"This is a mock text response for prompt: {prompt[:50]}..."
         elif content_type == 'image':
-            result = {
-                "content_type": "image",
-                "generated_content": "https://example.com/mock-image.jpg",
-                "description": f"A mock image generated for prompt: {prompt[:50]}..."
-            }
+            content = "https://example.com/mock-image.jpg"
         elif content_type == 'code':
-            result = {
-                "content_type": "code",
-                "generated_content": "def hello_world():\n    print('Hello, world!')\n\nhello_world()",
-                "language": "python",
-                "description": f"Mock code generated for prompt: {prompt[:50]}..."
-            }
+            content = "def hello_world():\n    print('Hello, world!')\n\nhello_world()"
         else:
-            result = {
-                "content_type": content_type,
-                "generated_content": f"Mock {content_type} content for prompt: {prompt[:50]}...",
-                "description": f"Mock {content_type} generated for prompt: {prompt[:50]}..."
-            }
-        
-        self.result = result
+            content = f"Mock {content_type} content for prompt: {prompt[:50]}..."
+        yield from _split_tokens(content)
+    
+    def _build_result(self, content_type, prompt, model, content):
+        """Build the result for generated content, with its description and token usage."""
+        result = {"content_type": content_type, "generated_content": content}
+        if content_type == 'image':
+            result["description"] = f"A mock image generated for prompt: {prompt[:50]}..."
+        elif content_type == 'code':
+            result["language"] = "python"
+            result["description"] = f"Mock code generated for prompt: {prompt[:50]}..."
+        elif content_type != 'text':
+            result["description"] = f"Mock {content_type} generated for prompt: {prompt[:50]}..."
+        
+        prompt_tokens = count_tokens(prompt, model)
+        completion_tokens = 0 if content_type == 'image' else count_tokens(content, model)
+        result["usage"] = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
         return result
 
 
@@ -235,210 +435,95 @@ class WorkflowSuggestionEngine:
         self.prompt = prompt
         self.user_id = user_id
         self.result = {}
+        self.cached = False
     
     def generate_suggestion(self):
-        """Generate a workflow suggestion based on the prompt."""
+        """Generate a workflow suggestion, reusing a recent one for a repeated prompt."""
+        cache = get_suggestion_cache()
+        prompt_hash = hash_prompt(self.prompt)
+        
+        # The user asked the same thing recently: return that suggestion as-is
+        suggestion = cache.get_user_suggestion(self.user_id, prompt_hash)
+        if suggestion is not None:
+            self.cached = True
+            self.result = suggestion.to_dict()
+            return suggestion.get_suggestion()
+        
+        # Another user asked the same thing: copy their suggestion and link to it
+        cached = cache.get_global(prompt_hash)
+        if cached is not None:
+            source_suggestion_id, suggestion_json = cached
+            self.cached = True
+            suggestion = self._save_suggestion(None, prompt_hash, source_suggestion_id, suggestion_json)
+            return suggestion.get_suggestion()
+        
+        workflow = self._generate_suggestion()
+        suggestion = self._save_suggestion(workflow, prompt_hash)
+        cache.put(prompt_hash, suggestion.id, suggestion.suggestion)
+        return workflow
+    
+    def _generate_suggestion(self):
+        """Generate a new workflow suggestion based on the prompt."""
         # In a real implementation, this would call an AI model to generate a workflow
         # For now, we'll create a simple example workflow
         
-        # Parse the prompt to identify potential workflow components
-        keywords = self._extract_keywords(self.prompt)
+        # Match the prompt against the suggestion rule table in a single scan
+        rule_indexes = match_rules(self.prompt)
         
-        # Generate a workflow based on keywords
-        workflow = self._generate_workflow(keywords)
-        
-        # Save the suggestion to the database
-        self._save_suggestion(workflow)
-        
-        return workflow
+        # Generate a workflow based on the matched rules
+        return self._generate_workflow(rule_indexes)
     
-    def _extract_keywords(self, prompt):
-        """Extract keywords from the prompt."""
-        # In a real implementation, this would use NLP to extract keywords
-        # For now, we'll use a simple approach
-        keywords = []
-        
-        if 'email' in prompt.lower():
-            keywords.append('email')
-        
-        if 'twitter' in prompt.lower() or 'tweet' in prompt.lower():
-            keywords.append('twitter')
+    def _generate_workflow(self, rule_indexes):
+        """Generate a linear workflow from the matched rules, given as table-ordered indexes."""
+        stage_nodes = {stage: [] for stage in STAGES}
+        for index in rule_indexes:
+            rule = SUGGESTION_RULES[index]
+            stage_nodes[rule['stage']].append(rule['node'])
+        
+        # A workflow starts from exactly one trigger and always ends in an output
+        stage_nodes['trigger'] = stage_nodes['trigger'][:1]
+        for stage, default in DEFAULT_STAGE_NODES.items():
+            if not stage_nodes[stage]:
+                stage_nodes[stage].append(default)
         
-        if 'schedule' in prompt.lower() or 'time' in prompt.lower():
-            keywords.append('schedule')
-        
-        if 'filter' in prompt.lower() or 'sort' in prompt.lower():
-            keywords.append('filter')
-        
-        if 'analyze' in prompt.lower() or 'sentiment' in prompt.lower():
-            keywords.append('analyze')
-        
-        if 'report' in prompt.lower() or 'summary' in prompt.lower():
-            keywords.append('report')
-        
-        if 'notification' in prompt.lower() or 'alert' in prompt.lower():
-            keywords.append('notification')
-        
-        if 'ai' in prompt.lower() or 'gpt' in prompt.lower() or 'llm' in prompt.lower():
-            keywords.append('ai')
-        
-        return keywords
-    
-    def _generate_workflow(self, keywords):
-        """Generate a workflow based on keywords."""
         nodes = []
         edges = []
-        node_id = 0
-        
-        # Add a trigger node based on keywords
-        if 'email' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "trigger",
-                "position": {"x": 100, "y": 100},
-                "data": {"name": "Email Trigger", "type": "email"}
-            })
-        elif 'twitter' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "trigger",
-                "position": {"x": 100, "y": 100},
-                "data": {"name": "Twitter Trigger", "type": "twitter"}
-            })
-        elif 'schedule' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "trigger",
-                "position": {"x": 100, "y": 100},
-                "data": {"name": "Schedule Trigger", "type": "schedule"}
-            })
-        else:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "trigger",
-                "position": {"x": 100, "y": 100},
-                "data": {"name": "Manual Trigger", "type": "manual"}
-            })
-        
-        prev_node_id = f"node_{node_id}"
-        node_id += 1
-        
-        # Add processing nodes based on keywords
-        if 'filter' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "function",
-                "position": {"x": 300, "y": 100},
-                "data": {"name": "Filter Data", "type": "filter"}
-            })
-            
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
-            
-            prev_node_id = f"node_{node_id}"
-            node_id += 1
-        
-        if 'analyze' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "function",
-                "position": {"x": 500, "y": 100},
-                "data": {"name": "Analyze Data", "type": "analyze"}
-            })
-            
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
-            
-            prev_node_id = f"node_{node_id}"
-            node_id += 1
-        
-        if 'ai' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "llm",
-                "position": {"x": 700, "y": 100},
-                "data": {"name": "AI Processing", "type": "llm", "model": "gpt-4"}
-            })
-            
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
-            
-            prev_node_id = f"node_{node_id}"
-            node_id += 1
-        
-        # Add output nodes based on keywords
-        if 'report' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "action",
-                "position": {"x": 900, "y": 100},
-                "data": {"name": "Generate Report", "type": "report"}
-            })
-            
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
-            
-            prev_node_id = f"node_{node_id}"
-            node_id += 1
-        
-        if 'notification' in keywords:
-            nodes.append({
-                "id": f"node_{node_id}",
-                "type": "action",
-                "position": {"x": 1100, "y": 100},
-                "data": {"name": "Send Notification", "type": "notification"}
-            })
-            
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
-            
-            node_id += 1
-        
-        # If no output nodes were added, add a default one
-        if 'report' not in keywords and 'notification' not in keywords:
+        for template in (node for stage in STAGES for node in stage_nodes[stage]):
+            node_id = len(nodes)
             nodes.append({
                 "id": f"node_{node_id}",
-                "type": "action",
-                "position": {"x": 900, "y": 100},
-                "data": {"name": "Default Action", "type": "action"}
+                "type": template['type'],
+                "position": {"x": 100 + 200 * node_id, "y": 100},
+                "data": dict(template['data'])
             })
             
-            edges.append({
-                "id": f"edge_{prev_node_id}_{node_id}",
-                "source": prev_node_id,
-                "target": f"node_{node_id}"
-            })
+            if node_id:
+                prev_node_id = f"node_{node_id - 1}"
+                edges.append({
+                    "id": f"edge_{prev_node_id}_{node_id}",
+                    "source": prev_node_id,
+                    "target": f"node_{node_id}"
+                })
         
         return {
             "nodes": nodes,
             "edges": edges
         }
     
-    def _save_suggestion(self, workflow):
-        """Save the suggestion to the database."""
+    def _save_suggestion(self, workflow, prompt_hash=None, source_suggestion_id=None, suggestion_json=None):
+        """Save the suggestion to the database, storing already encoded JSON when given."""
         from src.models.all_models import AIWorkflowSuggestion, db
         
         suggestion = AIWorkflowSuggestion(
             user_id=self.user_id,
-            prompt=self.prompt
+            prompt=self.prompt,
+            prompt_hash=prompt_hash,
+            source_suggestion_id=source_suggestion_id
         )
         
-        if hasattr(suggestion, 'set_suggestion'):
+        if suggestion_json is not None:
+            suggestion.suggestion = suggestion_json
+        else:
             suggestion.set_suggestion(workflow)
         
         db.session.add(suggestion)
@@ -1,101 +1,138 @@
-from src.ai.handlers import LLMNodeHandler, AgentNodeHandler, ContentGenerationNodeHandler, WorkflowSuggestionEngine
+from src.ai.cache import get_response_cache
+from src.ai.catalog import get_model_catalog
 import os
 import json
+import threading
+
+_batcher = None
+_batcher_lock = threading.Lock()
 
 class AIService:
     """
     Service for managing AI capabilities in the workflow platform.
+    
+    Handler modules are imported on first use so that importing the service,
+    and the blueprints that depend on it, stays cheap at worker start-up.
     """
     
     @staticmethod
-    def process_llm_node(node_data, input_data=None):
+    def process_llm_node(node_data, input_data=None, variables=None):
         """Process an LLM node and return the result."""
-        handler = LLMNodeHandler(node_data, input_data)
+        from src.ai.handlers import LLMNodeHandler
+        
+        handler = LLMNodeHandler(node_data, input_data, variables)
         return handler.process()
     
     @staticmethod
-    def process_agent_node(node_data, input_data=None):
-        """Process an Agent node and return the result."""
-        handler = AgentNodeHandler(node_data, input_data)
+    def get_batcher():
+        """Return the process-wide LLM request batcher, creating it on first use."""
+        from src.ai.batching import LLMRequestBatcher
+        
+        global _batcher
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = LLMRequestBatcher.from_environment()
+            return _batcher
+    
+    @staticmethod
+    def process_llm_items(node_data, items, input_data=None, variables=None):
+        """
+        Process an LLM node once per item through the batcher.
+        
+        Each item is available to the prompt as {{item}}. Cached responses are
+        served directly and only misses reach the batcher. Results are returned
+        in item order.
+        """
+        from src.ai.handlers import LLMNodeHandler
+        
+        batcher = AIService.get_batcher()
+        results = []
+        pending = []
+        in_flight = {}
+        for item in items:
+            handler = LLMNodeHandler(node_data, dict(input_data or {}, item=item), variables)
+            model, provider, prompt, max_tokens, temperature = handler._get_settings()
+            cache = handler.get_cache()
+            call = (provider, model, prompt, temperature, max_tokens)
+            cached = None
+            if cache and call not in in_flight:
+                cached = cache.get(*call)
+            if cached is None:
+                # Identical deterministic prompts in one run share a single provider call
+                future = in_flight.get(call) if cache and cache.is_cacheable(temperature) else None
+                shared = future is not None
+                if future is None:
+                    future = batcher.submit(model, provider, prompt, max_tokens, temperature)
+                    in_flight[call] = future
+                pending.append((len(results), future, shared, cache, call))
+            results.append(cached)
+        
+        for index, future, shared, cache, call in pending:
+            if shared:
+                # Reused another item's call, so it cost nothing extra
+                results[index] = dict(future.result(), cached=True)
+            else:
+                results[index] = future.result()
+                if cache:
+                    cache.put(*call, results[index])
+        return results
+    
+    @staticmethod
+    def get_cache_stats():
+        """Get hit rates and tokens saved by the LLM response cache."""
+        cache = get_response_cache()
+        return cache.stats() if cache else {'enabled': False}
+    
+    @staticmethod
+    def stream_llm_node(node_data, input_data=None, variables=None):
+        """Process an LLM node, yielding text deltas followed by the final result."""
+        from src.ai.handlers import LLMNodeHandler
+        
+        handler = LLMNodeHandler(node_data, input_data, variables)
+        return handler.stream()
+    
+    @staticmethod
+    def process_agent_node(node_data, input_data=None, variables=None, on_step=None):
+        """Process an Agent node and return the result, reporting each step to on_step."""
+        from src.ai.handlers import AgentNodeHandler
+        
+        handler = AgentNodeHandler(node_data, input_data, variables, on_step)
         return handler.process()
     
     @staticmethod
-    def process_content_generation_node(node_data, input_data=None):
+    def process_content_generation_node(node_data, input_data=None, variables=None):
         """Process a Content Generation node and return the result."""
-        handler = ContentGenerationNodeHandler(node_data, input_data)
+        from src.ai.handlers import ContentGenerationNodeHandler
+        
+        handler = ContentGenerationNodeHandler(node_data, input_data, variables)
         return handler.process()
     
+    @staticmethod
+    def stream_content_generation_node(node_data, input_data=None, variables=None):
+        """Process a Content Generation node, yielding content deltas followed by the final result."""
+        from src.ai.handlers import ContentGenerationNodeHandler
+        
+        handler = ContentGenerationNodeHandler(node_data, input_data, variables)
+        return handler.stream()
+    
     @staticmethod
     def generate_workflow_suggestion(prompt, user_id):
         """Generate a workflow suggestion based on a natural language prompt."""
+        from src.ai.handlers import WorkflowSuggestionEngine
+        
         engine = WorkflowSuggestionEngine(prompt, user_id)
         return engine.generate_suggestion()
     
     @staticmethod
-    def get_available_models(model_type=None):
-        """Get a list of available AI models."""
-        # In a real implementation, this would query the database or external APIs
-        # For now, we'll return a static list
-        models = [
-            {
-                "id": "gpt-4",
-                "name": "GPT-4",
-                "provider": "openai",
-                "type": "llm",
-                "description": "Advanced language model from OpenAI"
-            },
-            {
-                "id": "gpt-3.5-turbo",
-                "name": "GPT-3.5 Turbo",
-                "provider": "openai",
-                "type": "llm",
-                "description": "Efficient language model from OpenAI"
-            },
-            {
-                "id": "claude-3-opus",
-                "name": "Claude 3 Opus",
-                "provider": "anthropic",
-                "type": "llm",
-                "description": "Advanced language model from Anthropic"
-            },
-            {
-                "id": "claude-3-sonnet",
-                "name": "Claude 3 Sonnet",
-                "provider": "anthropic",
-                "type": "llm",
-                "description": "Balanced language model from Anthropic"
-            },
-            {
-                "id": "gemini-pro",
-                "name": "Gemini Pro",
-                "provider": "google",
-                "type": "llm",
-                "description": "Advanced language model from Google"
-            },
-            {
-                "id": "agent-basic",
-                "name": "Basic Agent",
-                "provider": "internal",
-                "type": "agent",
-                "description": "Basic autonomous agent for simple tasks"
-            },
-            {
-                "id": "agent-advanced",
-                "name": "Advanced Agent",
-                "provider": "internal",
-                "type": "agent",
-                "description": "Advanced autonomous agent for complex tasks"
-            },
-            {
-                "id": "dalle-3",
-                "name": "DALL-E 3",
-                "provider": "openai",
-                "type": "image",
-                "description": "Image generation model from OpenAI"
-            }
-        ]
-        
-        if model_type:
-            return [model for model in models if model["type"] == model_type]
+    def suggest_workflow(prompt, user_id):
+        """Generate or reuse a workflow suggestion; returns (suggestion dict, whether it was reused)."""
+        from src.ai.handlers import WorkflowSuggestionEngine
         
-        return models
+        engine = WorkflowSuggestionEngine(prompt, user_id)
+        engine.generate_suggestion()
+        return engine.result, engine.cached
+    
+    @staticmethod
+    def get_available_models(model_type=None, provider=None):
+        """Get a list of available AI models from the model catalog."""
+        return get_model_catalog().models(model_type, provider)
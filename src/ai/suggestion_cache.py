@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import os
+import re
+import threading
+import time
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_suggestion_cache = None
+_suggestion_cache_lock = threading.Lock()
+
+
+def normalize_prompt(prompt):
+    """Normalize a prompt so trivially different phrasings share a cache key."""
+    return _WHITESPACE_PATTERN.sub(' ', (prompt or '').lower()).strip().rstrip('.!?')
+
+
+def hash_prompt(prompt):
+    """Return the cache key for a prompt."""
+    return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+
+def get_suggestion_cache():
+    """Return the process-wide suggestion cache."""
+    global _suggestion_cache
+    with _suggestion_cache_lock:
+        if _suggestion_cache is None:
+            _suggestion_cache = SuggestionCache.from_environment()
+        return _suggestion_cache
+
+
+class SuggestionCache:
+    """
+    Reuses workflow suggestions for repeated prompts within a time window.
+    
+    The per-user tier looks up the user's own recent suggestion for the same
+    normalized prompt in the database, so it is shared by every worker. The
+    global tier is an in-process LRU of suggestions generated for any user;
+    a hit there is copied into a new row for the caller that links back to
+    the original through ``source_suggestion_id``.
+    """
+    
+    def __init__(self, window_seconds=3600, max_entries=1000):
+        """Initialize the cache with its reuse window and global tier size."""
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {
+            'user_hits': 0,
+            'global_hits': 0,
+            'misses': 0
+        }
+    
+    @classmethod
+    def from_environment(cls):
+        """Create a cache configured from environment variables."""
+        return cls(
+            window_seconds=int(os.getenv('SUGGESTION_CACHE_WINDOW_SECONDS', '3600')),
+            max_entries=int(os.getenv('SUGGESTION_CACHE_MAX_ENTRIES', '1000'))
+        )
+    
+    def get_user_suggestion(self, user_id, prompt_hash):
+        """Return the user's most recent suggestion for the prompt within the window, or None."""
+        from src.models.all_models import AIWorkflowSuggestion, db
+        
+        if self.window_seconds <= 0:
+            return None
+        
+        since = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        suggestion = AIWorkflowSuggestion.query.filter(
+            AIWorkflowSuggestion.user_id == user_id,
+            AIWorkflowSuggestion.prompt_hash == prompt_hash,
+            AIWorkflowSuggestion.created_at >= since,
+            db.or_(AIWorkflowSuggestion.feedback.is_(None), AIWorkflowSuggestion.feedback != 'negative')
+        ).order_by(AIWorkflowSuggestion.created_at.desc()).first()
+        
+        with self._lock:
+            if suggestion is not None:
+                self._stats['user_hits'] += 1
+        return suggestion
+    
+    def get_global(self, prompt_hash):
+        """Return (source_suggestion_id, suggestion_json) generated for any user, or None."""
+        with self._lock:
+            entry = self._entries.get(prompt_hash)
+            if entry is not None and entry['expires_at'] < time.time():
+                del self._entries[prompt_hash]
+                entry = None
+            
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            
+            self._entries.move_to_end(prompt_hash)
+            self._stats['global_hits'] += 1
+            return entry['suggestion_id'], entry['suggestion']
+    
+    def put(self, prompt_hash, suggestion_id, suggestion_json):
+        """Remember a freshly generated suggestion for other users."""
+        if self.window_seconds <= 0:
+            return
+        
+        with self._lock:
+            self._entries[prompt_hash] = {
+                'suggestion_id': suggestion_id,
+                'suggestion': suggestion_json,
+                'expires_at': time.time() + self.window_seconds
+            }
+            self._entries.move_to_end(prompt_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def discard(self, prompt_hash):
+        """Stop reusing the suggestion for a prompt, e.g. after negative feedback."""
+        with self._lock:
+            self._entries.pop(prompt_hash, None)
+    
+    def clear(self):
+        """Drop every entry of the global tier."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Return hit counts and the global tier size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+
+def compact_suggestions(retention_days=30, batch_size=1000):
+    """
+    Delete unapplied suggestions older than the retention period.
+    
+    Suggestions that were applied or received feedback are kept. Rows are
+    deleted in batches so the job never holds long locks, and links from
+    surviving rows to deleted ones are cleared first. Returns the number of
+    suggestions deleted.
+    """
+    from src.models.all_models import AIWorkflowSuggestion, db
+    
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    
+    while True:
+        ids = [row.id for row in db.session.query(AIWorkflowSuggestion.id).filter(
+            AIWorkflowSuggestion.created_at < cutoff,
+            db.or_(AIWorkflowSuggestion.is_applied.is_(None), AIWorkflowSuggestion.is_applied == False),
+            AIWorkflowSuggestion.feedback.is_(None)
+        ).limit(batch_size)]
+        
+        if not ids:
+            break
+        
+        AIWorkflowSuggestion.query.filter(
+            AIWorkflowSuggestion.source_suggestion_id.in_(ids)
+        ).update({'source_suggestion_id': None}, synchronize_session=False)
+        AIWorkflowSuggestion.query.filter(
+            AIWorkflowSuggestion.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+    
+    return deleted
@@ -0,0 +1,87 @@
+import re
+
+# Workflow stages, in the order their nodes are chained
+STAGES = ('trigger', 'process', 'output')
+
+# Declarative suggestion rules. Each rule maps the terms that mention it in a
+# prompt to the node it contributes. Only the first matching trigger rule is
+# used; every matching process and output rule adds a node, in table order.
+# Terms match whole words, optionally followed by s, es, d, ed or ing.
+SUGGESTION_RULES = [
+    {
+        'keyword': 'email',
+        'terms': ('email', 'e-mail', 'inbox'),
+        'stage': 'trigger',
+        'node': {'type': 'trigger', 'data': {'name': 'Email Trigger', 'type': 'email'}}
+    },
+    {
+        'keyword': 'twitter',
+        'terms': ('twitter', 'tweet'),
+        'stage': 'trigger',
+        'node': {'type': 'trigger', 'data': {'name': 'Twitter Trigger', 'type': 'twitter'}}
+    },
+    {
+        'keyword': 'schedule',
+        'terms': ('schedule', 'scheduling', 'time', 'daily', 'hourly', 'weekly', 'cron'),
+        'stage': 'trigger',
+        'node': {'type': 'trigger', 'data': {'name': 'Schedule Trigger', 'type': 'schedule'}}
+    },
+    {
+        'keyword': 'filter',
+        'terms': ('filter', 'sort'),
+        'stage': 'process',
+        'node': {'type': 'function', 'data': {'name': 'Filter Data', 'type': 'filter'}}
+    },
+    {
+        'keyword': 'analyze',
+        'terms': ('analyze', 'analyzing', 'analyse', 'analysing', 'analysis', 'sentiment'),
+        'stage': 'process',
+        'node': {'type': 'function', 'data': {'name': 'Analyze Data', 'type': 'analyze'}}
+    },
+    {
+        'keyword': 'ai',
+        'terms': ('ai', 'gpt', 'llm'),
+        'stage': 'process',
+        'node': {'type': 'llm', 'data': {'name': 'AI Processing', 'type': 'llm', 'model': 'gpt-4'}}
+    },
+    {
+        'keyword': 'report',
+        'terms': ('report', 'summary', 'summaries', 'summarize', 'summarizing'),
+        'stage': 'output',
+        'node': {'type': 'action', 'data': {'name': 'Generate Report', 'type': 'report'}}
+    },
+    {
+        'keyword': 'notification',
+        'terms': ('notification', 'notify', 'notifies', 'alert'),
+        'stage': 'output',
+        'node': {'type': 'action', 'data': {'name': 'Send Notification', 'type': 'notification'}}
+    }
+]
+
+# Nodes used when no rule for a stage matches; process has no default
+DEFAULT_STAGE_NODES = {
+    'trigger': {'type': 'trigger', 'data': {'name': 'Manual Trigger', 'type': 'manual'}},
+    'output': {'type': 'action', 'data': {'name': 'Default Action', 'type': 'action'}}
+}
+
+
+def _build_matcher(rules):
+    """Compile every rule term into one alternation and map each term back to its rule index."""
+    rule_for_term = {}
+    for index, rule in enumerate(rules):
+        for term in rule['terms']:
+            rule_for_term.setdefault(term.lower(), index)
+    
+    # Longest terms first so a term never loses to one of its prefixes
+    alternatives = '|'.join(re.escape(term) for term in sorted(rule_for_term, key=len, reverse=True))
+    pattern = re.compile(rf'\b({alternatives})(?:s|es|d|ed|ing)?\b')
+    return pattern, rule_for_term
+
+
+_TERM_PATTERN, _RULE_FOR_TERM = _build_matcher(SUGGESTION_RULES)
+
+
+def match_rules(prompt):
+    """Return the indexes of the rules a prompt mentions, in table order, in a single scan."""
+    matched = {_RULE_FOR_TERM[match.group(1)] for match in _TERM_PATTERN.finditer(prompt.lower())}
+    return sorted(matched)
@@ -0,0 +1,89 @@
+from functools import lru_cache
+import re
+
+_PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*([^{}]+?)\s*\}\}')
+
+# First path segment that addresses workflow variables instead of upstream outputs
+VARIABLES_ROOT = 'vars'
+
+
+class PromptTemplate:
+    """
+    A prompt parsed once into literal and placeholder segments.
+    
+    Placeholders are ``{{key}}`` or dotted paths such as
+    ``{{node_1.items.0.title}}`` into upstream outputs and
+    ``{{vars.name}}`` into workflow variables. Rendering walks the segments
+    once and joins the pieces, so its cost is linear in the output size no
+    matter how many inputs are supplied.
+    """
+    
+    __slots__ = ('source', 'literals', 'placeholders')
+    
+    def __init__(self, source):
+        """Parse the source text into alternating literals and placeholders."""
+        self.source = source
+        self.literals = []
+        self.placeholders = []
+        
+        position = 0
+        for match in _PLACEHOLDER_PATTERN.finditer(source):
+            self.literals.append(source[position:match.start()])
+            self.placeholders.append((match.group(0), tuple(match.group(1).split('.'))))
+            position = match.end()
+        self.literals.append(source[position:])
+    
+    def render(self, inputs, variables=None):
+        """Render the template against upstream inputs and workflow variables."""
+        if not self.placeholders:
+            return self.source
+        
+        parts = [self.literals[0]]
+        for (raw, path), literal in zip(self.placeholders, self.literals[1:]):
+            parts.append(_resolve(path, raw, inputs, variables))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source):
+    """Return the compiled template for a prompt, reusing earlier compilations."""
+    return PromptTemplate(source)
+
+
+def render_template(source, inputs, variables=None):
+    """Compile (or reuse) a prompt template and render it."""
+    if not source:
+        return source
+    return compile_template(source).render(inputs, variables)
+
+
+def _resolve(path, raw, inputs, variables):
+    """Resolve a placeholder path, leaving the placeholder untouched when it is missing."""
+    root = path[0]
+    if root in inputs:
+        value = inputs[root]
+    elif root == VARIABLES_ROOT and variables is not None and len(path) > 1:
+        path = path[1:]
+        if path[0] not in variables:
+            return raw
+        value = variables[path[0]]
+    else:
+        return raw
+    
+    for segment in path[1:]:
+        if isinstance(value, dict) and segment in value:
+            value = value[segment]
+        elif isinstance(value, (list, tuple)) and segment.lstrip('-').isdigit() and -len(value) <= int(segment) < len(value):
+            value = value[int(segment)]
+        else:
+            return raw
+    
+    return _format(value)
+
+
+def _format(value):
+    """Format a resolved value, unwrapping function node style {'result': ...} outputs."""
+    if isinstance(value, dict) and 'result' in value:
+        return str(value['result'])
+    return str(value)
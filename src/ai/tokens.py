@@ -0,0 +1,149 @@
+from functools import lru_cache
+import re
+
+# Approximate USD prices per 1K tokens as (prompt, completion), used for cost metrics
+MODEL_PRICING = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'claude-3-opus': (0.015, 0.075),
+    'claude-3-sonnet': (0.003, 0.015),
+    'gemini-pro': (0.0005, 0.0015)
+}
+
+# Context window sizes in tokens, shared between prompt and completion
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'claude-3-opus': 200000,
+    'claude-3-sonnet': 200000,
+    'gemini-pro': 32760
+}
+
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# tiktoken encodings for OpenAI model families
+_TIKTOKEN_ENCODINGS = {
+    'gpt-4o': 'o200k_base',
+    'gpt': 'cl100k_base'
+}
+
+# Words are split into pieces of about this many characters when approximating
+_APPROXIMATE_CHARS_PER_TOKEN = 4
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def model_family(model):
+    """Map a model ID to the family whose tokenizer it shares."""
+    model = (model or '').lower()
+    if model.startswith('gpt-4o'):
+        return 'gpt-4o'
+    if model.startswith(('gpt-', 'text-')):
+        return 'gpt'
+    if model.startswith('claude'):
+        return 'claude'
+    if model.startswith('gemini'):
+        return 'gemini'
+    return 'default'
+
+
+class ApproximateTokenizer:
+    """
+    Dependency-free tokenizer approximating BPE counts.
+    
+    Punctuation marks count as one token each and words as one token per
+    started group of four characters, which tracks BPE tokenizers closely for
+    English prose.
+    """
+    
+    def tokenize(self, text):
+        """Split text into token-sized (start, end) spans."""
+        spans = []
+        for match in _APPROXIMATE_TOKEN_PATTERN.finditer(text):
+            start, end = match.span()
+            for piece_start in range(start, end, _APPROXIMATE_CHARS_PER_TOKEN):
+                spans.append((piece_start, min(piece_start + _APPROXIMATE_CHARS_PER_TOKEN, end)))
+        return spans
+    
+    def count(self, text):
+        """Count the tokens in text."""
+        return len(self.tokenize(text))
+    
+    def truncate(self, text, max_tokens):
+        """Keep at most max_tokens tokens from the start of text."""
+        spans = self.tokenize(text)
+        if len(spans) <= max_tokens:
+            return text
+        return text[:spans[max_tokens - 1][1]] if max_tokens > 0 else ''
+
+
+class TiktokenTokenizer:
+    """Exact tokenizer for OpenAI models backed by the optional tiktoken package."""
+    
+    def __init__(self, encoding):
+        """Wrap a tiktoken encoding."""
+        self.encoding = encoding
+    
+    def count(self, text):
+        """Count the tokens in text."""
+        return len(self.encoding.encode(text, disallowed_special=()))
+    
+    def truncate(self, text, max_tokens):
+        """Keep at most max_tokens tokens from the start of text."""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(family):
+    """Return the tokenizer for a model family, built once per process."""
+    encoding_name = _TIKTOKEN_ENCODINGS.get(family)
+    if encoding_name:
+        try:
+            import tiktoken
+            return TiktokenTokenizer(tiktoken.get_encoding(encoding_name))
+        except ImportError:
+            pass
+    return ApproximateTokenizer()
+
+
+def count_tokens(text, model):
+    """Count the tokens text uses for a model."""
+    if not text:
+        return 0
+    return get_tokenizer(model_family(model)).count(text)
+
+
+def truncate_to_tokens(text, model, max_tokens):
+    """Trim text so it uses at most max_tokens tokens for a model."""
+    if not text:
+        return text
+    return get_tokenizer(model_family(model)).truncate(text, max_tokens)
+
+
+def prompt_token_budget(model, max_tokens, max_prompt_tokens=None):
+    """
+    Return how many tokens a prompt may use.
+    
+    The budget is what remains of the model's context window after reserving
+    max_tokens for the completion, further capped by max_prompt_tokens.
+    """
+    budget = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - (max_tokens or 0)
+    if max_prompt_tokens is not None:
+        budget = min(budget, max_prompt_tokens)
+    return max(budget, 0)
+
+
+def usage_tokens(usage):
+    """Return (prompt_tokens, completion_tokens) from an OpenAI or Anthropic usage dict."""
+    usage = usage or {}
+    prompt_tokens = usage.get('prompt_tokens', usage.get('input_tokens', 0))
+    completion_tokens = usage.get('completion_tokens', usage.get('output_tokens', 0))
+    return prompt_tokens, completion_tokens
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimate the USD cost of a call from the pricing table."""
+    prompt_price, completion_price = MODEL_PRICING.get(model, (0, 0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
@@ -3,45 +3,142 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, request
+import click
 from src.models import db
 from src.routes import register_blueprints
+from src.static_assets import StaticAssets
 
-# Create Flask app
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USERNAME', 'root')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'mydb')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app(config=None, lazy=None):
+    """
+    Create and configure the Flask app.
+    
+    The database schema is not touched here; run the init-db command once per
+    deployment instead. In lazy mode (the default, see APP_LAZY_IMPORTS) AI
+    handler modules are imported on first use; otherwise they are imported
+    up front so the first AI request doesn't pay for it.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USERNAME', 'root')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'mydb')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    if config:
+        app.config.update(config)
+    
+    # Initialize database
+    db.init_app(app)
+    
+    # Register all blueprints
+    register_blueprints(app)
+    register_commands(app)
+    register_static_routes(app)
+    
+    if lazy is None:
+        lazy = os.getenv('APP_LAZY_IMPORTS', 'true').lower() == 'true'
+    if not lazy:
+        import src.ai.handlers
+        import src.ai.batching
+    
+    return app
 
-# Initialize database
-db.init_app(app)
-with app.app_context():
-    db.create_all()
+def create_server_app(config=None):
+    """
+    Create the app for serving requests, e.g. gunicorn 'src.main:create_server_app()'.
+    
+    Unlike create_app(), which CLI commands and scripts also use, this
+    starts the background log compaction thread when
+    LOG_COMPACTION_INTERVAL_SECONDS is set.
+    """
+    app = create_app(config)
+    from src.services.retention import start_compaction_thread
+    start_compaction_thread(app)
+    return app
 
-# Register all blueprints
-register_blueprints(app)
+def register_commands(app):
+    """Register the maintenance CLI commands."""
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create any missing database tables."""
+        import src.models.all_models
+        db.create_all()
+        click.echo("Database schema is up to date")
+    
+    @app.cli.command('compact-suggestions')
+    @click.option('--days', default=lambda: int(os.getenv('SUGGESTION_RETENTION_DAYS', '30')),
+                  help='Delete unapplied suggestions without feedback older than this many days.')
+    def compact_suggestions_command(days):
+        """Delete old unapplied AI workflow suggestions."""
+        from src.ai.suggestion_cache import compact_suggestions
+        
+        deleted = compact_suggestions(retention_days=days)
+        click.echo(f"Deleted {deleted} suggestions older than {days} days")
+    
+    @app.cli.command('compact-logs')
+    def compact_logs_command():
+        """Archive execution logs past their retention policy, purge expired archives and unreferenced blobs."""
+        from src.services.retention import compact_execution_logs
+        
+        result = compact_execution_logs()
+        if result is None:
+            raise click.ClickException("Another compaction is already running")
+        click.echo(f"Archived {result['archived']} executions ({result['deleted_logs']} log rows), "
+                   f"purged {result['purged']} archived executions and {result['blobs_deleted']} unreferenced blobs")
+    
+    @app.cli.command('instantiate-template')
+    @click.argument('template_id', type=int)
+    @click.option('--user-id', 'user_ids', type=int, multiple=True, required=True,
+                  help='Owner of a new workflow; repeat to create one workflow per user.')
+    @click.option('--name', default=None, help='Name for the new workflows (defaults to the template name).')
+    def instantiate_template_command(template_id, user_ids, name):
+        """Create workflows from a template for one or more users in a single transaction."""
+        from src.models.ai import WorkflowTemplate
+        from src.services.cloning import instantiate_template_bulk, unknown_user_ids
+        
+        template = db.session.get(WorkflowTemplate, template_id)
+        if template is None:
+            raise click.ClickException(f"Template {template_id} not found")
+        
+        unknown = unknown_user_ids(user_ids)
+        if unknown:
+            raise click.ClickException(f"Unknown user IDs: {', '.join(map(str, unknown))}")
+        
+        workflows = instantiate_template_bulk(template, [{'created_by': user_id, 'name': name} for user_id in user_ids])
+        click.echo(f"Created {len(workflows)} workflows from template {template_id}")
+    
+    @app.cli.command('compress-static')
+    def compress_static_command():
+        """Write precompressed .gz/.br copies of the frontend build next to the originals."""
+        from src.static_assets import compress_static_folder
+        
+        written = compress_static_folder(app.static_folder)
+        click.echo(f"Wrote {written} compressed files")
 
-# Serve static files and SPA routes
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+def register_static_routes(app):
+    """Serve static files and SPA routes from a manifest built at start-up."""
+    assets = StaticAssets(app.static_folder) if app.static_folder else None
+    
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if assets is None:
             return "Static folder not configured", 404
+        
+        # Pick up rebuilt frontend files while developing
+        if app.debug:
+            assets.refresh()
+        
+        return assets.serve(path, request)
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+# Create Flask app
+app = create_app()
 
 # Run the app
 if __name__ == '__main__':
     # Use debug mode in development, not in production
     debug_mode = os.getenv('FLASK_ENV', 'production') == 'development'
+    from src.services.retention import start_compaction_thread
+    start_compaction_thread(app)
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=debug_mode)
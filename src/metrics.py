@@ -0,0 +1,558 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import atexit
+import bisect
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+# Latency buckets in seconds, from fast SQL statements to slow provider calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_sqlalchemy_listening = False
+_snapshot_writer = None
+_listen_lock = threading.Lock()
+
+# Response headers carrying a request's SQL statement count and time
+SQL_STATEMENTS_HEADER = 'X-SQL-Statements'
+SQL_TIME_HEADER = 'X-SQL-Time-Ms'
+
+# StatementStats collecting on the current thread
+_active_stats = threading.local()
+
+# Snapshot holding the merged totals of processes that have exited, and the key listing the files merged into it
+RETIRED_SNAPSHOT = 'retired.json'
+MERGED_KEY = '$merged'
+
+
+class _Metric:
+    """
+    Base class for a metric whose values are sharded per thread.
+    
+    Each thread updates its own shard without taking a lock, so recording a
+    value costs a thread-local lookup and a dict update. Shards are summed
+    when the registry is collected. Shards of threads that have exited are
+    folded into a retired shard whenever a thread registers or the metric
+    is collected, so the list stays as short as the live threads even when
+    nobody scrapes.
+    """
+    
+    type_name = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        """Describe the metric; label values are passed positionally when recording."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+    
+    def _shard(self):
+        """Return the calling thread's shard, registering it on first use."""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+    
+    def _retire_dead_shards(self):
+        """Fold the shards of threads that have exited into the retired shard. Caller holds the lock."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for labels, values in list(shard.items()):
+                    self._merge(self._retired, labels, values)
+        self._shards = live
+    
+    def _merge(self, target, labels, values):
+        """Add one shard's values for a label set into target."""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def reset(self):
+        """Drop every recorded value."""
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+    
+    def collect(self):
+        """Return {label values: value} summed over every thread's shard."""
+        with self._lock:
+            self._retire_dead_shards()
+            
+            totals = {}
+            for labels, values in self._retired.items():
+                self._merge(totals, labels, values)
+            for _, shard in self._shards:
+                # Copy first: the owning thread may be adding label sets meanwhile
+                for labels, values in list(shard.items()):
+                    self._merge(totals, labels, values)
+        return totals
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    
+    type_name = 'counter'
+    
+    def inc(self, labels=(), amount=1):
+        """Add amount to the count for a label set."""
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+    
+    def _merge(self, target, labels, value):
+        target[labels] = target.get(labels, 0) + value
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down, such as the number of running executions.
+    
+    Gauges only support relative updates so per-thread shards can be summed.
+    """
+    
+    type_name = 'gauge'
+    
+    def dec(self, labels=(), amount=1):
+        """Subtract amount from the value for a label set."""
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    """A distribution of observed values counted into fixed buckets."""
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Describe the histogram and its bucket upper bounds."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, labels=()):
+        """Record one observation for a label set."""
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # One count per bucket plus +Inf, then the sum of observations
+            values = shard[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+    
+    def _merge(self, target, labels, values):
+        totals = target.get(labels)
+        if totals is None:
+            target[labels] = list(values)
+        else:
+            for index, value in enumerate(values):
+                totals[index] += value
+
+
+class Registry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+    
+    With a snapshot directory (``METRICS_DIR``) every process, including
+    engine and process-pool workers, periodically writes its totals to its
+    own file there, and collecting sums all files so any worker can answer
+    a scrape for the whole deployment. Counters and histograms of processes
+    that have exited are kept; their gauges are dropped. On start-up their
+    snapshots are merged into one retired snapshot and removed, so the
+    directory doesn't fill up with the files of past workers.
+    """
+    
+    def __init__(self, snapshot_dir=None):
+        """Initialize an empty registry, optionally sharing snapshots through a directory."""
+        self.snapshot_dir = snapshot_dir
+        self.metrics = {}
+        self._started = int(time.time())
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        """Add a metric to the registry and return it."""
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name, documentation, labelnames=()):
+        """Create and register a gauge."""
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    @property
+    def snapshot_path(self):
+        """This process's snapshot file, unique even if the PID is reused later."""
+        return os.path.join(self.snapshot_dir, f"{os.getpid()}-{self._started}.json")
+    
+    def reset_after_fork(self):
+        """Start a forked worker from zero so values recorded by its parent aren't counted twice."""
+        self._started = int(time.time())
+        for metric in self.metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+    
+    def collect(self):
+        """Return {name: {label values: value}} for this process."""
+        return {name: metric.collect() for name, metric in self.metrics.items()}
+    
+    def write_snapshot(self):
+        """Write this process's totals to its snapshot file, replacing it atomically."""
+        if not self.snapshot_dir:
+            return
+        
+        snapshot = {
+            name: [[list(labels), value] for labels, value in samples.items()]
+            for name, samples in self.collect().items()
+        }
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.snapshot_path)
+    
+    def _read_snapshots(self, skip=()):
+        """Yield (file name, alive, snapshot) for the snapshot files in the directory."""
+        for file_name in os.listdir(self.snapshot_dir):
+            if not file_name.endswith('.json') or file_name in skip:
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, file_name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                # Being replaced or half-written by its process; its next snapshot counts
+                continue
+            
+            if file_name == RETIRED_SNAPSHOT:
+                yield file_name, False, snapshot
+            elif file_name.split('-')[0].isdigit():
+                yield file_name, _process_alive(int(file_name.split('-')[0])), snapshot
+    
+    def _merge_snapshot(self, totals, snapshot, alive):
+        """Add a snapshot's samples into totals, leaving out gauges of processes that have exited."""
+        for name, samples in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.type_name == 'gauge' and not alive):
+                continue
+            for labels, value in samples:
+                metric._merge(totals.setdefault(name, {}), tuple(labels), value)
+    
+    def collect_all(self):
+        """Return this process's totals plus those of every other process's snapshot."""
+        totals = self.collect()
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return totals
+        
+        snapshots = list(self._read_snapshots(skip=(os.path.basename(self.snapshot_path),)))
+        # Files already merged into the retired snapshot but not yet removed
+        merged = set()
+        for file_name, _, snapshot in snapshots:
+            if file_name == RETIRED_SNAPSHOT:
+                merged.update(snapshot.get(MERGED_KEY, ()))
+        for file_name, alive, snapshot in snapshots:
+            if file_name not in merged:
+                self._merge_snapshot(totals, snapshot, alive)
+        return totals
+    
+    def retire_dead_snapshots(self):
+        """
+        Fold the snapshots of processes that have exited into the retired snapshot and remove them.
+        
+        Like prometheus_client's mark_process_dead, but their counters and
+        histograms are kept. The retired snapshot lists the files already
+        merged into it, so a process dying between writing it and removing
+        the files doesn't get counted twice.
+        """
+        if not self.snapshot_dir:
+            return 0
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        
+        # Workers starting together take turns, so no file is merged twice
+        with open(os.path.join(self.snapshot_dir, '.retire.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            retired_path = os.path.join(self.snapshot_dir, RETIRED_SNAPSHOT)
+            try:
+                with open(retired_path) as f:
+                    retired = json.load(f)
+            except (OSError, ValueError):
+                retired = {}
+            merged = set(retired.pop(MERGED_KEY, ()))
+            
+            dead = []
+            totals = {}
+            self._merge_snapshot(totals, retired, False)
+            for file_name, alive, snapshot in self._read_snapshots(skip=(RETIRED_SNAPSHOT,)):
+                if alive:
+                    continue
+                dead.append(file_name)
+                if file_name not in merged:
+                    self._merge_snapshot(totals, snapshot, False)
+            if not dead:
+                return 0
+            
+            retired = {name: [[list(labels), value] for labels, value in samples.items()]
+                       for name, samples in totals.items()}
+            retired[MERGED_KEY] = dead
+            temp_path = f"{retired_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(retired, f)
+            os.replace(temp_path, retired_path)
+            for file_name in dead:
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, file_name))
+                except FileNotFoundError:
+                    pass
+        return len(dead)
+    
+    def exposition(self):
+        """Render every metric in the Prometheus text exposition format."""
+        totals = self.collect_all()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            for labels, value in sorted(totals[name].items()):
+                label_pairs = list(zip(metric.labelnames, labels))
+                if metric.type_name != 'histogram':
+                    lines.append(f"{name}{_format_labels(label_pairs)} {_format_value(value)}")
+                    continue
+                
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(label_pairs + [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(label_pairs)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(label_pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    """Return whether a process with this PID is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_value(value):
+    """Format a sample value the way Prometheus expects."""
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _format_labels(pairs):
+    """Render label pairs as {name="value",...}, escaping values."""
+    if not pairs:
+        return ''
+    rendered = []
+    for label, value in pairs:
+        text = _format_value(value) if isinstance(value, (int, float)) else str(value)
+        text = text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        rendered.append(f'{label}="{text}"')
+    return '{' + ','.join(rendered) + '}'
+
+
+REGISTRY = Registry(os.getenv('METRICS_DIR') or None)
+
+# API
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Latency of authenticated API requests.', ('blueprint', 'method', 'status'))
+
+# Workflow engine
+EXECUTIONS = REGISTRY.counter('workflow_executions_total', 'Workflow executions finished.', ('status',))
+EXECUTION_DURATION = REGISTRY.histogram('workflow_execution_duration_seconds', 'Wall time of workflow executions.')
+EXECUTIONS_IN_PROGRESS = REGISTRY.gauge('workflow_executions_in_progress', 'Workflow executions currently running.')
+ENGINE_QUEUE_DEPTH = REGISTRY.gauge('workflow_engine_queue_depth', 'Nodes ready to run and waiting for their turn.')
+NODE_DURATION = REGISTRY.histogram('workflow_node_duration_seconds', 'Run time of workflow nodes.', ('node_type', 'status'))
+FUNCTION_POOL_TASKS = REGISTRY.counter(
+    'function_pool_tasks_total', 'Function node tasks run in worker processes.', ('outcome',))
+FUNCTION_POOL_DURATION = REGISTRY.histogram(
+    'function_pool_task_duration_seconds', 'Time from submitting a function task to its result.', ('outcome',))
+
+# AI providers
+AI_PROVIDER_DURATION = REGISTRY.histogram(
+    'ai_provider_request_duration_seconds', 'Latency of AI provider calls.', ('provider', 'operation'))
+AI_PROVIDER_ERRORS = REGISTRY.counter('ai_provider_errors_total', 'AI provider calls that failed.', ('provider', 'operation'))
+
+# Database
+DB_STATEMENT_DURATION = REGISTRY.histogram('db_statement_duration_seconds', 'Latency of SQL statements.', ('statement',))
+DB_COMMIT_DURATION = REGISTRY.histogram('db_commit_duration_seconds', 'Time to flush and commit a session.')
+
+
+class provider_call:
+    """Context manager timing an AI provider call and counting its failures."""
+    
+    __slots__ = ('labels', 'started')
+    
+    def __init__(self, provider, operation):
+        self.labels = (provider, operation)
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        AI_PROVIDER_DURATION.observe(time.perf_counter() - self.started, self.labels)
+        if exc_type is not None:
+            AI_PROVIDER_ERRORS.inc(self.labels)
+        return False
+
+
+def observe_request(blueprint, method, response, started):
+    """Record the latency of an API request from the view's return value."""
+    if isinstance(response, tuple):
+        status = response[1] if len(response) > 1 else 200
+    else:
+        status = getattr(response, 'status_code', 200)
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, (blueprint or '', method, str(status)))
+
+
+class StatementStats:
+    """
+    Counts and times the SQL statements run on the current thread between start and stop.
+    
+    Used for the per-request debug headers and statement budgets; stats can
+    be nested, and every active one sees each statement.
+    """
+    
+    def __init__(self):
+        """Initialize empty stats."""
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+    
+    def start(self):
+        """Begin collecting on this thread and return self."""
+        listen_sqlalchemy()
+        if not hasattr(_active_stats, 'stack'):
+            _active_stats.stack = []
+        _active_stats.stack.append(self)
+        return self
+    
+    def stop(self):
+        """Stop collecting."""
+        stack = getattr(_active_stats, 'stack', [])
+        if self in stack:
+            stack.remove(self)
+    
+    def record(self, statement, seconds):
+        """Add one executed statement."""
+        self.count += 1
+        self.seconds += seconds
+        self.statements.append(statement)
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def count_statements():
+    """Return a context manager counting the SQL statements run inside it on this thread."""
+    return StatementStats()
+
+
+def listen_sqlalchemy():
+    """Time every SQL statement and session commit in this process (installed once)."""
+    global _sqlalchemy_listening
+    with _listen_lock:
+        if _sqlalchemy_listening:
+            return
+        _sqlalchemy_listening = True
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+    
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        elapsed = time.perf_counter() - started
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        DB_STATEMENT_DURATION.observe(elapsed, (verb,))
+        for stats in getattr(_active_stats, 'stack', ()):
+            stats.record(statement, elapsed)
+    
+    def handle_error(exception_context):
+        # The statement failed, so after_cursor_execute won't pop its start time
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('metrics_started'):
+            connection.info['metrics_started'].pop()
+    
+    def before_commit(session):
+        session.info['metrics_commit_started'] = time.perf_counter()
+    
+    def after_commit(session):
+        started = session.info.pop('metrics_commit_started', None)
+        if started is not None:
+            DB_COMMIT_DURATION.observe(time.perf_counter() - started)
+    
+    def forget_on_rollback(session, previous_transaction):
+        session.info.pop('metrics_commit_started', None)
+    
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', handle_error)
+    event.listen(Session, 'before_commit', before_commit)
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_soft_rollback', forget_on_rollback)
+
+
+def _after_fork_in_child():
+    """Reset metrics in a forked worker and restart its snapshot writer."""
+    global _listen_lock, _snapshot_writer
+    _listen_lock = threading.Lock()
+    REGISTRY.reset_after_fork()
+    if _snapshot_writer is not None:
+        _snapshot_writer = None
+        start_snapshot_writer()
+
+
+def start_snapshot_writer(interval=None):
+    """Write this process's snapshot every interval seconds and at exit, when METRICS_DIR is set."""
+    global _snapshot_writer
+    if not REGISTRY.snapshot_dir:
+        return
+    if interval is None:
+        interval = float(os.getenv('METRICS_SNAPSHOT_SECONDS', '10'))
+    
+    with _listen_lock:
+        if _snapshot_writer is not None:
+            return
+        REGISTRY.retire_dead_snapshots()
+        
+        def write_periodically():
+            while True:
+                time.sleep(interval)
+                REGISTRY.write_snapshot()
+        
+        _snapshot_writer = threading.Thread(target=write_periodically, name='metrics-snapshot', daemon=True)
+        _snapshot_writer.start()
+        atexit.register(REGISTRY.write_snapshot)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
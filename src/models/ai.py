@@ -74,6 +74,18 @@ class WorkflowTemplate(db.Model):
     def set_tags(self, tags_list):
         self.tags = json.dumps(tags_list)
     
+    def to_summary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'category': self.category,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'is_featured': self.is_featured,
+            'tags': self.get_tags()
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -99,6 +111,12 @@ class AIWorkflowSuggestion(db.Model):
     is_applied = db.Column(db.Boolean, default=False)
     applied_at = db.Column(db.DateTime, nullable=True)
     feedback = db.Column(db.Enum('positive', 'negative', 'neutral'), nullable=True)
+    prompt_hash = db.Column(db.String(64), nullable=True)  # Hash of the normalized prompt
+    source_suggestion_id = db.Column(db.Integer, db.ForeignKey('ai_workflow_suggestions.id'), nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_ai_workflow_suggestions_user_prompt', 'user_id', 'prompt_hash', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<AIWorkflowSuggestion {self.id}>'
@@ -120,5 +138,50 @@ class AIWorkflowSuggestion(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'is_applied': self.is_applied,
             'applied_at': self.applied_at.isoformat() if self.applied_at else None,
-            'feedback': self.feedback
+            'feedback': self.feedback,
+            'source_suggestion_id': self.source_suggestion_id
+        }
+
+
+class AIUsage(db.Model):
+    __tablename__ = 'ai_usage'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    execution_log_id = db.Column(db.Integer, db.ForeignKey('execution_logs.id'), nullable=True, index=True)  # NULL once the log is archived
+    execution_id = db.Column(db.Integer, db.ForeignKey('executions.id'), nullable=False, index=True)
+    workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    node_id = db.Column(db.String(255), nullable=False)
+    node_type = db.Column(db.String(255))
+    provider = db.Column(db.String(255))
+    model = db.Column(db.String(255))
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    total_tokens = db.Column(db.Integer, default=0)
+    estimated_cost = db.Column(db.Float, default=0)
+    calls = db.Column(db.Integer, default=1)
+    cached = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<AIUsage {self.execution_id}-{self.node_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'execution_log_id': self.execution_log_id,
+            'execution_id': self.execution_id,
+            'workflow_id': self.workflow_id,
+            'user_id': self.user_id,
+            'node_id': self.node_id,
+            'node_type': self.node_type,
+            'provider': self.provider,
+            'model': self.model,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+            'estimated_cost': self.estimated_cost,
+            'calls': self.calls,
+            'cached': self.cached,
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -3,9 +3,9 @@ import json
 from src.models.user import User
 from src.models.workflow import Workflow, WorkflowVersion
 from src.models.node import Node, NodeCategory
-from src.models.execution import Execution, ExecutionLog
+from src.models.execution import Execution, ExecutionLog, RetentionPolicy, ExecutionArchive
 from src.models.credential import Credential, Variable
 from src.models.trigger import Webhook, Schedule
-from src.models.ai import AIModel, WorkflowTemplate, AIWorkflowSuggestion
+from src.models.ai import AIModel, WorkflowTemplate, AIWorkflowSuggestion, AIUsage
 
 # This file imports all models to make them available from a single import
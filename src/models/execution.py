@@ -47,27 +47,49 @@ class ExecutionLog(db.Model):
     input_data = db.Column(db.Text)  # JSON
     output_data = db.Column(db.Text)  # JSON
     error_message = db.Column(db.Text)
+    timings = db.Column(db.Text)  # Compact JSON array: start offset and phase timings in microseconds
     
     def __repr__(self):
         return f'<ExecutionLog {self.execution_id}-{self.node_id}>'
     
-    def get_input_data(self):
+    def get_input_data(self, resolve_blobs=True):
+        from src.services.blobs import resolve
+        
         if self.input_data:
-            return json.loads(self.input_data)
+            data = json.loads(self.input_data)
+            return resolve(data) if resolve_blobs else data
         return {}
     
-    def set_input_data(self, input_dict):
-        self.input_data = json.dumps(input_dict)
+    def set_input_data(self, input_dict, encoded=None):
+        from src.services.blobs import encode_mapping
+        
+        # Large parent outputs are stored once in the blob store and referenced by hash
+        self.input_data = encode_mapping(input_dict, encoded)
     
-    def get_output_data(self):
+    def get_output_data(self, resolve_blobs=True):
+        from src.services.blobs import resolve
+        
         if self.output_data:
-            return json.loads(self.output_data)
+            data = json.loads(self.output_data)
+            return resolve(data) if resolve_blobs else data
         return {}
     
     def set_output_data(self, output_dict):
-        self.output_data = json.dumps(output_dict)
+        from src.services.blobs import encode_payload
+        from src.services.results import NodeResult
+        
+        # NodeResult envelopes carry the JSON they were already encoded to
+        if isinstance(output_dict, NodeResult):
+            self.output_data = output_dict.encoded
+        else:
+            self.output_data = encode_payload(output_dict)
     
-    def to_dict(self):
+    def get_timings(self):
+        if self.timings:
+            return json.loads(self.timings)
+        return []
+    
+    def to_dict(self, resolve_blobs=True):
         return {
             'id': self.id,
             'execution_id': self.execution_id,
@@ -75,7 +97,77 @@ class ExecutionLog(db.Model):
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'finished_at': self.finished_at.isoformat() if self.finished_at else None,
             'status': self.status,
-            'input_data': self.get_input_data(),
-            'output_data': self.get_output_data(),
-            'error_message': self.error_message
+            'input_data': self.get_input_data(resolve_blobs),
+            'output_data': self.get_output_data(resolve_blobs),
+            'error_message': self.error_message,
+            'timings': self.get_timings()
+        }
+    
+    def to_json(self, resolve_blobs=True):
+        """Return to_dict() as JSON text, splicing in the stored input and output JSON without decoding it."""
+        from src.services.blobs import resolve_json
+        
+        payloads = {'input_data': self.input_data or '{}', 'output_data': self.output_data or '{}'}
+        if resolve_blobs:
+            payloads = {name: resolve_json(text) for name, text in payloads.items()}
+        
+        fields = json.dumps({
+            'id': self.id,
+            'execution_id': self.execution_id,
+            'node_id': self.node_id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'status': self.status,
+            'error_message': self.error_message,
+            'timings': self.get_timings()
+        })
+        return fields[:-1] + ''.join(f', "{name}": {text}' for name, text in payloads.items()) + '}'
+
+
+class RetentionPolicy(db.Model):
+    __tablename__ = 'retention_policies'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id'), nullable=False, unique=True)
+    archive_after_days = db.Column(db.Integer, nullable=True)  # NULL: never archive
+    purge_after_days = db.Column(db.Integer, nullable=True)  # NULL: keep archived logs forever
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RetentionPolicy {self.workflow_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'workflow_id': self.workflow_id,
+            'archive_after_days': self.archive_after_days,
+            'purge_after_days': self.purge_after_days,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ExecutionArchive(db.Model):
+    __tablename__ = 'execution_archives'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    execution_id = db.Column(db.Integer, db.ForeignKey('executions.id'), nullable=False, unique=True)
+    segment = db.Column(db.String(255), nullable=False, index=True)  # File name in the archive directory
+    byte_offset = db.Column(db.BigInteger, nullable=False)
+    byte_length = db.Column(db.Integer, nullable=False)
+    log_count = db.Column(db.Integer, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    purged_at = db.Column(db.DateTime, nullable=True)  # Set once the retention policy dropped the logs
+    
+    def __repr__(self):
+        return f'<ExecutionArchive {self.execution_id}>'
+    
+    def to_dict(self):
+        return {
+            'execution_id': self.execution_id,
+            'segment': self.segment,
+            'log_count': self.log_count,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+            'purged_at': self.purged_at.isoformat() if self.purged_at else None
         }
@@ -8,9 +8,11 @@ def register_blueprints(app):
     from src.routes.execution import execution_bp
     from src.routes.credential import credential_bp, variable_bp
     from src.routes.ai import ai_bp, template_bp
+    from src.routes.ai_api import ai_api_bp
     from src.routes.trigger import trigger_bp
     from src.routes.engine import engine_bp
     from src.routes.user import user_bp
+    from src.routes.metrics import metrics_bp
     
     # Register all blueprints with API prefix
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -20,7 +22,9 @@ def register_blueprints(app):
     app.register_blueprint(credential_bp, url_prefix='/api/credentials')
     app.register_blueprint(variable_bp, url_prefix='/api/variables')
     app.register_blueprint(ai_bp, url_prefix='/api/ai')
+    app.register_blueprint(ai_api_bp, url_prefix='/api/ai')
     app.register_blueprint(template_bp, url_prefix='/api/templates')
     app.register_blueprint(trigger_bp, url_prefix='/api/triggers')
     app.register_blueprint(engine_bp, url_prefix='/api/engine')
     app.register_blueprint(user_bp, url_prefix='/api/users')
+    app.register_blueprint(metrics_bp)
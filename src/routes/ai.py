@@ -1,11 +1,24 @@
-from flask import Blueprint, jsonify, request
-from src.models.all_models import AIModel, WorkflowTemplate, AIWorkflowSuggestion, db, User
+from flask import Blueprint, Response, jsonify, request
+from src.models.all_models import AIModel, WorkflowTemplate, AIWorkflowSuggestion, AIUsage, Workflow, db, User
 from src.routes.auth import token_required
+from src.ai.service import AIService
+from src.ai.catalog import get_model_catalog
+from src.ai.suggestion_cache import get_suggestion_cache
+from src.services.cloning import instantiate_template, instantiate_template_bulk, unknown_user_ids
+from src.services.template_search import get_template_index
 import datetime
 import json
 
 ai_bp = Blueprint('ai', __name__)
 
+def catalog_response(model_type=None, provider=None):
+    """Return a model listing from the catalog with an ETag, or 304 when the client's copy is current."""
+    body, etag = get_model_catalog().view(model_type, provider)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 @ai_bp.route('/models', methods=['GET'])
 @token_required
 def get_ai_models(current_user):
@@ -13,32 +26,19 @@ def get_ai_models(current_user):
     model_type = request.args.get('type')
     provider = request.args.get('provider')
     
-    # Start with base query
-    query = AIModel.query.filter_by(is_active=True)
-    
-    # Apply filters
-    if model_type:
-        query = query.filter(AIModel.type == model_type)
-    
-    if provider:
-        query = query.filter(AIModel.provider == provider)
-    
-    models = query.all()
-    
-    return jsonify({
-        'models': [model.to_dict() for model in models]
-    }), 200
+    # Serve the pre-encoded listing from the catalog; clients holding it get a 304
+    return catalog_response(model_type, provider)
 
 @ai_bp.route('/models/<int:model_id>', methods=['GET'])
 @token_required
 def get_ai_model(current_user, model_id):
-    model = AIModel.query.get(model_id)
+    model = get_model_catalog().get(model_id)
     
     if not model:
         return jsonify({'message': 'AI model not found'}), 404
     
     return jsonify({
-        'model': model.to_dict()
+        'model': model
     }), 200
 
 @ai_bp.route('/suggest', methods=['POST'])
@@ -49,60 +49,12 @@ def suggest_workflow(current_user):
     if not data or not data.get('prompt'):
         return jsonify({'message': 'Missing prompt'}), 400
     
-    # In a real implementation, this would call an AI service to generate a workflow
-    # For now, we'll just create a placeholder suggestion
-    
-    # Create a simple example workflow suggestion
-    example_workflow = {
-        "nodes": [
-            {
-                "id": "start",
-                "type": "trigger",
-                "position": {"x": 100, "y": 100},
-                "data": {"name": "Start Trigger"}
-            },
-            {
-                "id": "process",
-                "type": "function",
-                "position": {"x": 300, "y": 100},
-                "data": {"name": "Process Data"}
-            },
-            {
-                "id": "end",
-                "type": "action",
-                "position": {"x": 500, "y": 100},
-                "data": {"name": "End Action"}
-            }
-        ],
-        "edges": [
-            {
-                "id": "e1",
-                "source": "start",
-                "target": "process"
-            },
-            {
-                "id": "e2",
-                "source": "process",
-                "target": "end"
-            }
-        ]
-    }
-    
-    # Save the suggestion
-    suggestion = AIWorkflowSuggestion(
-        user_id=current_user.id,
-        prompt=data['prompt']
-    )
-    
-    if hasattr(suggestion, 'set_suggestion'):
-        suggestion.set_suggestion(example_workflow)
-    
-    db.session.add(suggestion)
-    db.session.commit()
+    suggestion, cached = AIService.suggest_workflow(data['prompt'], current_user.id)
     
     return jsonify({
         'message': 'Workflow suggestion generated',
-        'suggestion': suggestion.to_dict()
+        'suggestion': suggestion,
+        'cached': cached
     }), 200
 
 @ai_bp.route('/suggestions', methods=['GET'])
@@ -138,11 +90,80 @@ def provide_suggestion_feedback(current_user, suggestion_id):
     suggestion.feedback = data['feedback']
     db.session.commit()
     
+    # Don't hand a suggestion the user disliked to anyone else asking the same thing
+    if suggestion.feedback == 'negative' and suggestion.prompt_hash:
+        get_suggestion_cache().discard(suggestion.prompt_hash)
+    
     return jsonify({
         'message': 'Feedback recorded successfully',
         'suggestion': suggestion.to_dict()
     }), 200
 
+# Columns that AI usage can be rolled up by
+USAGE_GROUPS = {
+    'workflow': (AIUsage.workflow_id,),
+    'user': (AIUsage.user_id,),
+    'model': (AIUsage.provider, AIUsage.model),
+    'node': (AIUsage.workflow_id, AIUsage.node_id)
+}
+
+@ai_bp.route('/usage', methods=['GET'])
+@token_required
+def get_ai_usage(current_user):
+    # Get query parameters for grouping and filtering
+    group_by = request.args.get('group_by', 'model')
+    workflow_id = request.args.get('workflow_id', type=int)
+    since = request.args.get('since')
+    
+    if group_by not in USAGE_GROUPS:
+        return jsonify({'message': f'Invalid group_by, expected one of: {", ".join(USAGE_GROUPS)}'}), 400
+    
+    columns = USAGE_GROUPS[group_by]
+    total_tokens = db.func.sum(AIUsage.total_tokens)
+    query = db.session.query(
+        *columns,
+        db.func.sum(AIUsage.prompt_tokens),
+        db.func.sum(AIUsage.completion_tokens),
+        total_tokens,
+        db.func.sum(AIUsage.estimated_cost),
+        db.func.sum(AIUsage.calls),
+        db.func.count(AIUsage.id)
+    )
+    
+    # Admins see usage across all workflows, everyone else only their own
+    if current_user.role != 'admin':
+        query = query.join(Workflow, Workflow.id == AIUsage.workflow_id).filter(Workflow.created_by == current_user.id)
+    
+    if workflow_id:
+        query = query.filter(AIUsage.workflow_id == workflow_id)
+    
+    if since:
+        try:
+            query = query.filter(AIUsage.created_at >= datetime.datetime.fromisoformat(since))
+        except ValueError:
+            return jsonify({'message': 'Invalid since timestamp'}), 400
+    
+    rows = query.group_by(*columns).order_by(total_tokens.desc()).all()
+    
+    usage = []
+    for row in rows:
+        entry = {column.key: value for column, value in zip(columns, row)}
+        prompt_tokens, completion_tokens, tokens, cost, calls, executions = row[len(columns):]
+        entry.update({
+            'prompt_tokens': int(prompt_tokens or 0),
+            'completion_tokens': int(completion_tokens or 0),
+            'total_tokens': int(tokens or 0),
+            'estimated_cost': round(cost or 0, 6),
+            'calls': int(calls or 0),
+            'node_runs': executions
+        })
+        usage.append(entry)
+    
+    return jsonify({
+        'group_by': group_by,
+        'usage': usage
+    }), 200
+
 # Template routes
 template_bp = Blueprint('template', __name__)
 
@@ -154,30 +175,51 @@ def get_templates(current_user):
     is_featured = request.args.get('is_featured')
     tag = request.args.get('tag')
     
-    # Start with base query
-    query = WorkflowTemplate.query
+    # Filter through the in-memory index instead of decoding every template's tags
+    found = get_template_index().search(
+        category=category,
+        tag=tag,
+        is_featured=is_featured.lower() == 'true' if is_featured is not None else None,
+        limit=None
+    )
+    templates = found['results']
     
-    # Apply filters
-    if category:
-        query = query.filter(WorkflowTemplate.category == category)
+    # Definitions are only loaded when asked for
+    if request.args.get('include_definition', '').lower() == 'true' and templates:
+        definitions = dict(db.session.query(WorkflowTemplate.id, WorkflowTemplate.definition).filter(
+            WorkflowTemplate.id.in_([template['id'] for template in templates])
+        ).all())
+        for template in templates:
+            template['definition'] = json.loads(definitions.get(template['id']) or '{}')
     
-    if is_featured is not None:
-        is_featured_bool = is_featured.lower() == 'true'
-        query = query.filter(WorkflowTemplate.is_featured == is_featured_bool)
+    return jsonify({
+        'templates': templates
+    }), 200
+
+@template_bp.route('/search', methods=['GET'])
+@token_required
+def search_templates(current_user):
+    is_featured = request.args.get('is_featured')
     
-    # Filter by tag if provided
-    if tag:
-        # This is a simplistic approach - in production you'd use a proper tag table or JSON search
-        templates = []
-        for template in query.all():
-            tags = template.get_tags() if hasattr(template, 'get_tags') else []
-            if tag in tags:
-                templates.append(template)
-    else:
-        templates = query.all()
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'message': 'Invalid limit or offset'}), 400
+    
+    found = get_template_index().search(
+        query=request.args.get('q'),
+        category=request.args.get('category'),
+        tag=request.args.get('tag'),
+        is_featured=is_featured.lower() == 'true' if is_featured is not None else None,
+        limit=limit,
+        offset=offset
+    )
     
     return jsonify({
-        'templates': [template.to_dict() for template in templates]
+        'total': found['total'],
+        'templates': found['results'],
+        'facets': found['facets']
     }), 200
 
 @template_bp.route('/<int:template_id>', methods=['GET'])
@@ -202,41 +244,49 @@ def use_template(current_user, template_id):
     
     data = request.get_json() or {}
     
-    # Get the template definition
-    template_definition = template.get_definition() if hasattr(template, 'get_definition') else {}
-    
-    # Create a new workflow from the template
-    new_workflow = Workflow(
-        name=data.get('name', template.name),
-        description=data.get('description', template.description),
-        created_by=current_user.id,
-        is_active=True,
-        is_public=False
+    # Create the workflow and its first version in one transaction
+    new_workflow = instantiate_template(
+        template,
+        current_user.id,
+        name=data.get('name'),
+        description=data.get('description')
     )
     
-    # Copy tags from template
-    if hasattr(template, 'get_tags') and hasattr(new_workflow, 'set_tags'):
-        new_workflow.set_tags(template.get_tags())
+    return jsonify({
+        'message': 'Workflow created from template',
+        'workflow': new_workflow.to_dict()
+    }), 201
+
+@template_bp.route('/<int:template_id>/use/bulk', methods=['POST'])
+@token_required
+def use_template_bulk(current_user, template_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    template = WorkflowTemplate.query.get(template_id)
     
-    db.session.add(new_workflow)
-    db.session.commit()
+    if not template:
+        return jsonify({'message': 'Template not found'}), 404
     
-    # Create initial workflow version with template definition
-    from src.models.workflow import WorkflowVersion
-    new_version = WorkflowVersion(
-        workflow_id=new_workflow.id,
-        version=1,
-        created_by=current_user.id,
-        notes=f'Created from template: {template.name}'
-    )
+    data = request.get_json()
     
-    if hasattr(new_version, 'set_definition'):
-        new_version.set_definition(template_definition)
+    if not data or not data.get('workflows'):
+        return jsonify({'message': 'Missing workflows'}), 400
     
-    db.session.add(new_version)
-    db.session.commit()
+    specs = []
+    for spec in data['workflows']:
+        owner = spec.get('created_by') if isinstance(spec, dict) else None
+        if not isinstance(owner, int) or isinstance(owner, bool):
+            return jsonify({'message': 'Each workflow needs a numeric created_by'}), 400
+        specs.append(spec)
+    
+    unknown = unknown_user_ids(spec['created_by'] for spec in specs)
+    if unknown:
+        return jsonify({'message': 'Unknown created_by user IDs', 'user_ids': unknown}), 400
+    
+    workflows = instantiate_template_bulk(template, specs)
     
     return jsonify({
-        'message': 'Workflow created from template',
-        'workflow': new_workflow.to_dict()
+        'message': f'{len(workflows)} workflows created from template',
+        'workflows': [workflow.to_dict() for workflow in workflows]
     }), 201
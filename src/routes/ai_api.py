@@ -1,21 +1,35 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from src.models.all_models import AIModel, WorkflowTemplate, AIWorkflowSuggestion, db
 from src.routes.auth import token_required
 from src.ai.service import AIService
+from src.ai.suggestion_cache import get_suggestion_cache
 import datetime
+import json
 
 ai_api_bp = Blueprint('ai_api', __name__)
 
-@ai_api_bp.route('/models', methods=['GET'])
-@token_required
-def get_ai_models(current_user):
-    """Get a list of available AI models."""
-    model_type = request.args.get('type')
-    models = AIService.get_available_models(model_type)
-    
-    return jsonify({
-        'models': models
-    }), 200
+def sse_event(event, data):
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Wrap a generator of formatted events in an unbuffered event-stream response."""
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _relay_handler_stream(handler_stream):
+    """Relay handler stream events as SSE token and result events."""
+    try:
+        for event in handler_stream:
+            if event.get('done'):
+                yield sse_event('result', event['result'])
+            else:
+                yield sse_event('token', {'delta': event['delta']})
+    except Exception as e:
+        yield sse_event('error', {'message': str(e)})
 
 @ai_api_bp.route('/llm/process', methods=['POST'])
 @token_required
@@ -32,6 +46,34 @@ def process_llm(current_user):
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+@ai_api_bp.route('/llm/stream', methods=['POST'])
+@token_required
+def stream_llm(current_user):
+    """Process text using an LLM model, streaming tokens as Server-Sent Events."""
+    data = request.get_json()
+    
+    if not data or not data.get('model') or not data.get('prompt'):
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    return sse_response(_relay_handler_stream(AIService.stream_llm_node(data)))
+
+@ai_api_bp.route('/batching/stats', methods=['GET'])
+@token_required
+def get_batching_stats(current_user):
+    """Get throughput and cost metrics for batched LLM provider calls."""
+    return jsonify({
+        'stats': AIService.get_batcher().stats()
+    }), 200
+
+@ai_api_bp.route('/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """Get hit rates of the LLM response cache and the workflow suggestion cache."""
+    return jsonify({
+        'stats': AIService.get_cache_stats(),
+        'suggestion_stats': get_suggestion_cache().stats()
+    }), 200
+
 @ai_api_bp.route('/agent/process', methods=['POST'])
 @token_required
 def process_agent(current_user):
@@ -62,6 +104,17 @@ def generate_content(current_user):
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+@ai_api_bp.route('/content/stream', methods=['POST'])
+@token_required
+def stream_content(current_user):
+    """Generate content using AI, streaming it as Server-Sent Events."""
+    data = request.get_json()
+    
+    if not data or not data.get('content_type') or not data.get('prompt'):
+        return jsonify({'message': 'Missing required fields'}), 400
+    
+    return sse_response(_relay_handler_stream(AIService.stream_content_generation_node(data)))
+
 @ai_api_bp.route('/workflow/suggest', methods=['POST'])
 @token_required
 def suggest_workflow(current_user):
@@ -72,17 +125,13 @@ def suggest_workflow(current_user):
         return jsonify({'message': 'Missing prompt'}), 400
     
     try:
-        workflow = AIService.generate_workflow_suggestion(data['prompt'], current_user.id)
-        
-        # Get the suggestion from the database
-        suggestion = AIWorkflowSuggestion.query.filter_by(
-            user_id=current_user.id
-        ).order_by(AIWorkflowSuggestion.created_at.desc()).first()
+        suggestion, cached = AIService.suggest_workflow(data['prompt'], current_user.id)
         
         return jsonify({
             'message': 'Workflow suggestion generated',
-            'workflow': workflow,
-            'suggestion': suggestion.to_dict() if suggestion else None
+            'workflow': suggestion['suggestion'],
+            'suggestion': suggestion,
+            'cached': cached
         }), 200
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -1,9 +1,11 @@
 from flask import Blueprint, jsonify, request
 from src.models.all_models import User, db
+from src.metrics import observe_request
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import os
+import time
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -23,6 +25,15 @@ def generate_token(user_id):
 # Token verification decorator
 def token_required(f):
     def decorated(*args, **kwargs):
+        started = time.perf_counter()
+        response = (None, 500)
+        try:
+            response = authenticated(*args, **kwargs)
+            return response
+        finally:
+            observe_request(request.blueprint, request.method, response, started)
+    
+    def authenticated(*args, **kwargs):
         token = None
         if 'Authorization' in request.headers:
             auth_header = request.headers['Authorization']
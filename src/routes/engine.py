@@ -1,22 +1,168 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import insert
 from src.models.all_models import db
+from src.metrics import ENGINE_QUEUE_DEPTH, EXECUTION_DURATION, EXECUTIONS, EXECUTIONS_IN_PROGRESS, NODE_DURATION
+from src.services.conditions import evaluate_condition
+from src.services.item_streams import StageStats, chunked, get_chunk_size, iter_items, load_callable
+from src.services.profiling import ExecutionProfiler
+from src.services.results import NodeResult, freeze
+from concurrent.futures import ThreadPoolExecutor
+import collections
 import importlib
 import json
+import os
+import queue
+import threading
+import time
 import traceback
 import datetime
 
-# Import all route blueprints
-from src.routes.auth import auth_bp
-from src.routes.workflow import workflow_bp
-from src.routes.node import node_bp
-from src.routes.execution import execution_bp
-from src.routes.credential import credential_bp, variable_bp
-from src.routes.ai import ai_bp, template_bp
-from src.routes.trigger import trigger_bp
-
 # Create a blueprint for the workflow engine
 engine_bp = Blueprint('engine', __name__)
 
+# Node types handled by AIService whose provider usage is recorded
+AI_NODE_TYPES = ('llm', 'agent', 'content_generation')
+
+# Node types that can stream partial output, mapped to the field holding their text
+STREAMING_NODE_TYPES = {
+    'llm': 'generated_text',
+    'content_generation': 'generated_content'
+}
+
+# Container node types running a body subgraph once per item
+MAP_NODE_TYPES = ('map', 'foreach')
+
+# Failed iterations whose errors a map node's result keeps
+MAP_ERROR_SAMPLE_SIZE = 10
+
+
+def _edge_label(edge):
+    """Return the branch an edge belongs to (its label, or its React Flow source handle), or None."""
+    label = edge.get('label', edge.get('sourceHandle'))
+    if isinstance(label, bool):
+        return 'true' if label else 'false'
+    return str(label) if label not in (None, '') else None
+
+
+def _follow_branches(edges, value):
+    """
+    Return (target, live) for each (target, label) edge leaving a node whose result is value.
+    
+    Unlabeled edges are always live. Labeled edges are live only for the
+    branch the result chose: its "branch" value (switch-style) or
+    "true"/"false" from its "condition_result". A "default" edge is live
+    when no other label matches.
+    """
+    labels = {label for _, label in edges if label}
+    branch = None
+    if labels:
+        if isinstance(value, dict) and 'branch' in value:
+            branch = str(value['branch'])
+        elif isinstance(value, dict) and 'condition_result' in value:
+            branch = 'true' if value['condition_result'] else 'false'
+        if branch not in labels:
+            branch = 'default'
+    return [(target, label is None or label == branch) for target, label in edges]
+
+
+class MapBody:
+    """
+    The body subgraph of a map node, parsed once and run once per item.
+    
+    Body nodes run in dependency order without execution logs, following
+    branch labels like workflow edges do. Nodes without parents receive
+    {"item": item, "index": index} as their input.
+    """
+    
+    def __init__(self, engine, definition):
+        """Parse the body definition, raising if it contains a cycle."""
+        self.engine = engine
+        self.nodes = {node['id']: node for node in definition.get('nodes', [])}
+        self.out_edges = {}
+        self.parents = {}
+        for edge in definition.get('edges', []):
+            if edge['source'] in self.nodes and edge['target'] in self.nodes:
+                self.out_edges.setdefault(edge['source'], []).append((edge['target'], _edge_label(edge)))
+                self.parents.setdefault(edge['target'], []).append(edge['source'])
+        
+        # Order the body once, so iterations only walk a list
+        waiting = {node_id: len(self.parents.get(node_id, [])) for node_id in self.nodes}
+        ready = [node_id for node_id, count in waiting.items() if not count]
+        self.order = []
+        while ready:
+            node_id = ready.pop()
+            self.order.append(node_id)
+            for target, _ in self.out_edges.get(node_id, []):
+                waiting[target] -= 1
+                if not waiting[target]:
+                    ready.append(target)
+        if len(self.order) < len(self.nodes):
+            raise Exception("Map body contains a cycle")
+        self.sinks = [node_id for node_id in self.order if not self.out_edges.get(node_id)]
+    
+    def run(self, item, index):
+        """Run the body for one item; return its sink's result, or {sink ID: result} when it has several."""
+        results = {}
+        live_parents = {}
+        for node_id in self.order:
+            if node_id in self.parents:
+                input_data = {parent_id: results[parent_id] for parent_id in live_parents.get(node_id, [])}
+                # Nodes on untaken branches are skipped
+                if not input_data:
+                    continue
+            else:
+                input_data = {'item': item, 'index': index}
+            
+            node = self.nodes[node_id]
+            try:
+                result = freeze(self.engine._process_body_node(node.get('type', ''), node.get('data', {}), input_data))
+            except Exception as e:
+                raise Exception(f"Node {node_id}: {e}") from e
+            results[node_id] = result
+            for target, is_live in _follow_branches(self.out_edges.get(node_id, []), result):
+                if is_live:
+                    live_parents.setdefault(target, []).append(node_id)
+        
+        if len(self.sinks) == 1:
+            return results.get(self.sinks[0])
+        return {node_id: results[node_id] for node_id in self.sinks if node_id in results}
+
+
+class PartialStream:
+    """
+    The text deltas of a streaming node, read by a child started on its partial output.
+    
+    Iterating yields every delta from the start of the output, waiting for
+    new ones until the parent finishes, and raises if the parent fails
+    before finishing it.
+    """
+    
+    _CLOSED = object()
+    _ABORTED = object()
+    
+    def __init__(self, deltas=()):
+        """Initialize the stream with the deltas that already arrived."""
+        self._queue = queue.Queue()
+        for delta in deltas:
+            self._queue.put(delta)
+    
+    def put(self, delta):
+        self._queue.put(delta)
+    
+    def close(self, failed=False):
+        """Mark the end of the output, or that the parent failed before finishing it."""
+        self._queue.put(self._ABORTED if failed else self._CLOSED)
+    
+    def __iter__(self):
+        while True:
+            delta = self._queue.get()
+            if delta is self._ABORTED:
+                raise Exception("The streaming parent failed before finishing its output")
+            if delta is self._CLOSED:
+                return
+            yield delta
+
+
 class WorkflowEngine:
     """
     Core workflow execution engine that processes workflow definitions and executes nodes.
@@ -32,8 +178,18 @@ class WorkflowEngine:
         self.definition = workflow_version.get_definition()
         self.nodes = {}
         self.edges = {}
-        self.node_results = {}
+        self.out_edges = {}  # Source ID -> [(target ID, branch label or None)]
+        self.parents = {}
+        self.node_results = {}  # Node ID -> NodeResult
+        self.processed_nodes = set()
+        self.failed_nodes = []
+        self.listeners = []
+        self._variables = None
+        self.current_log = None
         self.current_node = None
+        self.partial_runs = {}  # Child ID -> (log entry, timer, future) for children started on partial output
+        self._partial_executor = None
+        self.profiler = ExecutionProfiler()
         
         # Parse workflow definition
         self._parse_definition()
@@ -49,6 +205,17 @@ class WorkflowEngine:
                 if edge['source'] not in self.edges:
                     self.edges[edge['source']] = []
                 self.edges[edge['source']].append(edge['target'])
+                self.out_edges.setdefault(edge['source'], []).append((edge['target'], _edge_label(edge)))
+                self.parents.setdefault(edge['target'], []).append(edge['source'])
+    
+    def add_listener(self, listener):
+        """Register a callable receiving (event, payload) while the workflow executes."""
+        self.listeners.append(listener)
+    
+    def _emit(self, event, **payload):
+        """Notify listeners of an execution event."""
+        for listener in self.listeners:
+            listener(event, payload)
     
     def _find_start_nodes(self):
         """Find all start nodes (nodes with no incoming edges)."""
@@ -62,20 +229,121 @@ class WorkflowEngine:
         # Start nodes are those that are not targets of any edge
         return list(all_nodes - target_nodes)
     
+    def _live_edges(self, node_id):
+        """Return (target, live) for each outgoing edge of a node that has run."""
+        result = self.node_results.get(node_id)
+        return _follow_branches(self.out_edges.get(node_id, []), result.value if result else None)
+    
+    def _skip_nodes(self, node_ids):
+        """Record nodes on untaken branches as skipped, with one bulk insert."""
+        from src.models.all_models import ExecutionLog
+        
+        now = datetime.datetime.utcnow()
+        db.session.execute(insert(ExecutionLog), [
+            {'execution_id': self.execution_id, 'node_id': node_id, 'status': 'skipped',
+             'started_at': now, 'finished_at': now}
+            for node_id in node_ids
+        ])
+        db.session.commit()
+        self.processed_nodes.update(node_ids)
+        for node_id in node_ids:
+            self._emit('node_skipped', node_id=node_id)
+    
     def _get_next_nodes(self, node_id):
         """Get the next nodes to execute after the current node."""
         if node_id in self.edges:
             return self.edges[node_id]
         return []
     
+    @property
+    def variables(self):
+        """Workflow variables for prompt templates, loaded once per execution."""
+        from src.models.all_models import Variable
+        
+        if self._variables is None:
+            owner_id = self.execution.workflow.created_by
+            rows = Variable.query.filter(
+                Variable.created_by == owner_id,
+                db.or_(Variable.scope == 'global', Variable.workflow_id == self.execution.workflow_id)
+            ).all()
+            
+            # Workflow-scoped variables override global ones with the same name
+            rows.sort(key=lambda variable: variable.scope == 'workflow')
+            self._variables = {variable.name: variable.get_value() for variable in rows}
+        
+        return self._variables
+    
+    def _collect_inputs(self, node_id):
+        """Collect the results of a node's finished parents, keyed by parent ID."""
+        return {
+            parent_id: self.node_results[parent_id].value
+            for parent_id in self.parents.get(node_id, [])
+            if parent_id in self.node_results
+        }
+    
+    def _encoded_inputs(self, input_data):
+        """Return the JSON finished parents' results were stored as, for reuse in a child's input."""
+        return {
+            parent_id: self.node_results[parent_id].encoded
+            for parent_id, value in input_data.items()
+            if parent_id in self.node_results and self.node_results[parent_id].value is value
+        }
+    
+    def _run_node(self, node_id, error_message):
+        """Execute a scheduled node unless it already ran, raising on any failure."""
+        if node_id in self.partial_runs:
+            if not self._finish_partial_run(node_id):
+                raise Exception(error_message)
+        elif node_id not in self.processed_nodes:
+            if not self._execute_node(node_id):
+                raise Exception(error_message)
+        
+        # Nodes started early on partial output fail independently of their parent
+        if self.failed_nodes:
+            raise Exception(f"Failed to execute node: {self.failed_nodes[0]}")
+    
+    def _run_batch(self, node_ids, error_message):
+        """Run ready nodes one after another, keeping the queue depth gauge current."""
+        waiting = len(node_ids)
+        ENGINE_QUEUE_DEPTH.inc(amount=waiting)
+        try:
+            for node_id in node_ids:
+                waiting -= 1
+                ENGINE_QUEUE_DEPTH.dec()
+                self._run_node(node_id, error_message.format(node_id=node_id))
+        finally:
+            # Nodes left unrun after a failure are no longer waiting
+            ENGINE_QUEUE_DEPTH.dec(amount=waiting)
+    
     def _execute_node(self, node_id):
         """Execute a single node in the workflow."""
-        from src.models.all_models import ExecutionLog
-        
         node = self.nodes[node_id]
         node_type = node.get('type', '')
         node_data = node.get('data', {})
         
+        # Item-stream nodes run together with the stream nodes chained after them
+        if node_data.get('item_stream'):
+            return self._execute_item_stream(node_id)
+        
+        self.current_node = node_id
+        input_data = self._collect_inputs(node_id)
+        log_entry, timer = self._start_node_log(node_id, input_data)
+        self.current_log = log_entry
+        
+        try:
+            # Execute node based on type
+            result = self._process_node(node_type, node_data, input_data)
+        except Exception as e:
+            return self._fail_node(node_id, log_entry, timer, e)
+        return self._complete_node(node_id, log_entry, timer, result)
+    
+    def _start_node_log(self, node_id, input_data, nested_in=None):
+        """Mark a node as started: create its running log entry and start its timer."""
+        from src.models.all_models import ExecutionLog
+        
+        self.processed_nodes.add(node_id)
+        timer = self.profiler.start_node(node_id, self.parents.get(node_id, []), nested_in=nested_in)
+        
         # Create execution log entry
         log_entry = ExecutionLog(
             execution_id=self.execution_id,
@@ -84,53 +352,381 @@ class WorkflowEngine:
         )
         
         # Set input data if available
-        input_data = {}
-        for input_node_id, result in self.node_results.items():
-            if input_node_id in self.edges and node_id in self.edges[input_node_id]:
-                input_data[input_node_id] = result
-        
         if input_data:
-            log_entry.set_input_data(input_data)
+            log_entry.set_input_data(input_data, self._encoded_inputs(input_data))
+        timer.lap('inputs')
         
         db.session.add(log_entry)
         db.session.commit()
+        timer.lap('persist')
+        self._emit('node_started', node_id=node_id)
+        return log_entry, timer
+    
+    def _complete_node(self, node_id, log_entry, timer, result):
+        """Record a node's result on its log entry and hand it to downstream nodes."""
+        node_type = self.nodes[node_id].get('type', '')
+        node_data = self.nodes[node_id].get('data', {})
+        timer.lap('handler')
         
         try:
-            # Execute node based on type
-            result = self._process_node(node_type, node_data, input_data)
-            
             # Update execution log
             log_entry.status = 'completed'
             log_entry.finished_at = datetime.datetime.utcnow()
-            log_entry.set_output_data(result)
+            envelope = NodeResult(result)
+            result = envelope.value
+            log_entry.set_output_data(envelope)
+            timer.lap('serialize')
+            
+            if node_type in AI_NODE_TYPES and isinstance(result, dict):
+                self._record_usage(log_entry, node_type, node_data, result)
             
             # Store result for downstream nodes
-            self.node_results[node_id] = result
+            self.node_results[node_id] = envelope
             
             db.session.commit()
-            return True
+        except Exception as e:
+            return self._fail_node(node_id, log_entry, timer, e)
+        
+        timer.lap('persist')
+        self.profiler.finish_node(timer, log_entry.id)
+        NODE_DURATION.observe(timer.elapsed / 1000000, (node_type, 'completed'))
+        self._emit('node_completed', node_id=node_id, output=result)
+        return True
+    
+    def _fail_node(self, node_id, log_entry, timer, error):
+        """Record a node's failure on its log entry; called while handling the error."""
+        timer.lap('handler')
+        
+        # Update execution log with error
+        log_entry.status = 'failed'
+        log_entry.finished_at = datetime.datetime.utcnow()
+        log_entry.error_message = str(error) + '\n' + traceback.format_exc()
+        
+        db.session.commit()
+        timer.lap('persist')
+        self.profiler.finish_node(timer, log_entry.id)
+        NODE_DURATION.observe(timer.elapsed / 1000000, (self.nodes[node_id].get('type', ''), 'failed'))
+        self.failed_nodes.append(node_id)
+        self._emit('node_failed', node_id=node_id, error=str(error))
+        return False
+    
+    def _record_usage(self, log_entry, node_type, node_data, result):
+        """Add a token usage row for an AI node's provider calls, linked to its log entry."""
+        from src.models.all_models import AIUsage
+        from src.ai.tokens import estimate_cost, usage_tokens
+        
+        # Mapped llm nodes hold one provider result per item
+        calls = result.get('items', []) if node_data.get('map_items') else [result]
+        calls = [call for call in calls if isinstance(call, dict) and 'usage' in call]
+        if not calls:
+            return
+        
+        prompt_tokens = completion_tokens = billed_calls = 0
+        for call in calls:
+            # Responses served from the cache cost nothing
+            if call.get('cached'):
+                continue
+            used_prompt, used_completion = usage_tokens(call['usage'])
+            prompt_tokens += used_prompt
+            completion_tokens += used_completion
+            billed_calls += 1
+        
+        model = calls[0].get('model') or node_data.get('model', 'gpt-4')
+        db.session.add(AIUsage(
+            execution_log_id=log_entry.id,
+            execution_id=self.execution_id,
+            workflow_id=self.execution.workflow_id,
+            user_id=self.execution.triggered_by or self.execution.workflow.created_by,
+            node_id=log_entry.node_id,
+            node_type=node_type,
+            provider=node_data.get('provider', 'openai'),
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            estimated_cost=estimate_cost(model, prompt_tokens, completion_tokens),
+            calls=billed_calls,
+            cached=billed_calls == 0
+        ))
+    
+    def _agent_step_writer(self, log_entry):
+        """Return a callback that saves an agent's steps to its log entry as they happen."""
+        node_id = log_entry.node_id
+        
+        def write_steps(steps):
+            log_entry.set_output_data({'steps_taken': steps, 'in_progress': True})
+            db.session.commit()
+            self._emit('agent_step', node_id=node_id, step=steps[-1])
+        
+        return write_steps
+    
+    def _stream_node(self, node_type, node_data, input_data):
+        """Run a streaming AI node, publishing partial output as it arrives."""
+        from src.ai.service import AIService
+        
+        node_id = self.current_node
+        if node_type == 'llm':
+            events = AIService.stream_llm_node(node_data, input_data, self.variables)
+        else:
+            events = AIService.stream_content_generation_node(node_data, input_data, self.variables)
+        
+        chunks = []
+        partial_length = 0
+        streams = []
+        failed = True
+        try:
+            for event in events:
+                if event.get('done'):
+                    failed = False
+                    return event['result']
+                
+                chunks.append(event['delta'])
+                partial_length += len(event['delta'])
+                self._emit('token', node_id=node_id, delta=event['delta'])
+                for stream in streams:
+                    stream.put(event['delta'])
+                streams += self._start_partial_consumers(node_id, STREAMING_NODE_TYPES[node_type], chunks, partial_length)
+        finally:
+            for stream in streams:
+                stream.close(failed)
+        
+        raise Exception(f"Stream for node {node_id} ended without a result")
+    
+    def _start_partial_consumers(self, node_id, text_field, chunks, partial_length):
+        """
+        Start children that opted in to partial output once enough of it has arrived.
+        
+        Only function nodes with an in-process handler can read the delta
+        stream, so only they start early; other children wait for the full
+        output as usual. The handler runs on an executor thread while the
+        parent keeps streaming. Its log entry, timing and result are handled
+        here on the engine's thread. Returns the streams of the children started.
+        """
+        streams = []
+        for child_id, label in self.out_edges.get(node_id, []):
+            child = self.nodes[child_id]
+            child_data = child.get('data', {})
+            if child_id in self.processed_nodes or not child_data.get('accept_partial'):
+                continue
+            if child.get('type') != 'function' or not child_data.get('handler') or child_data.get('cpu_bound'):
+                continue
+            
+            # Whether a labeled edge is followed depends on the final result
+            if label is not None:
+                continue
             
+            if partial_length < child_data.get('partial_min_chars', 1):
+                continue
+            
+            # Every other parent must already be finished
+            if any(parent_id not in self.node_results
+                   for parent_id in self.parents[child_id] if parent_id != node_id):
+                continue
+            
+            input_data = self._collect_inputs(child_id)
+            input_data[node_id] = {text_field: ''.join(chunks), 'partial': True}
+            log_entry, timer = self._start_node_log(child_id, input_data, nested_in=node_id)
+            
+            stream = PartialStream(chunks)
+            input_data[node_id] = dict(input_data[node_id], deltas=stream)
+            try:
+                handler = load_callable(child_data['handler'])
+            except Exception as e:
+                self._fail_node(child_id, log_entry, timer, e)
+                continue
+            
+            if self._partial_executor is None:
+                self._partial_executor = ThreadPoolExecutor(thread_name_prefix='partial-consumer')
+            future = self._partial_executor.submit(handler, input_data, child_data)
+            self.partial_runs[child_id] = (log_entry, timer, future)
+            streams.append(stream)
+        return streams
+    
+    def _finish_partial_run(self, child_id):
+        """Wait for the handler of a child started on partial output and record how it ended."""
+        log_entry, timer, future = self.partial_runs.pop(child_id)
+        try:
+            result = future.result()
         except Exception as e:
-            # Update execution log with error
-            log_entry.status = 'failed'
-            log_entry.finished_at = datetime.datetime.utcnow()
-            log_entry.error_message = str(e) + '\n' + traceback.format_exc()
+            return self._fail_node(child_id, log_entry, timer, e)
+        return self._complete_node(child_id, log_entry, timer, result)
+    
+    def _collect_items(self, input_data, items_field):
+        """Concatenate the item lists that parent results hold under items_field."""
+        return list(iter_items(input_data, items_field))
+    
+    def _item_chain(self, node_id):
+        """Return node_id followed by the item-stream nodes linked to it one after another."""
+        chain = [node_id]
+        while True:
+            children = self._get_next_nodes(chain[-1])
+            if len(children) != 1:
+                return chain
+            child_id = children[0]
+            if (child_id in self.processed_nodes or len(self.parents[child_id]) != 1
+                    or not self.nodes[child_id].get('data', {}).get('item_stream')):
+                return chain
+            chain.append(child_id)
+    
+    def _item_stage(self, node_id, chunks, input_data, usage_calls):
+        """Return the chunk iterator a stream node produces from the chunks it consumes."""
+        node = self.nodes[node_id]
+        node_type = node.get('type', '')
+        node_data = node.get('data', {})
+        if self.definition.get('settings', {}).get('llm_cache') is False:
+            node_data = dict(node_data, cache=False)
+        
+        # Custom handlers take and return iterables of item lists
+        if node_data.get('item_handler'):
+            return load_callable(node_data['item_handler'])(chunks, node_data)
+        
+        if node_type == 'llm':
+            from src.ai.service import AIService
+            
+            def generate():
+                for chunk in chunks:
+                    results = AIService.process_llm_items(node_data, chunk, input_data, self.variables)
+                    # Keep only what usage accounting needs, not the generated text
+                    usage_calls.extend(
+                        {'usage': result['usage'], 'cached': result.get('cached'), 'model': result.get('model')}
+                        for result in results if isinstance(result, dict) and 'usage' in result
+                    )
+                    yield results
+            
+            return generate()
+        
+        # Other node types pass items through unchanged
+        return chunks
+    
+    def _execute_item_stream(self, head_id):
+        """
+        Run a chain of item-stream nodes as one generator pipeline.
+        
+        Items come from the head's item_source callable, or from the item
+        lists of its parents' results, and flow through every node of the
+        chain in chunks of chunk_size. Each chunk is pulled through the whole
+        pipeline before the next one is read, so at most one chunk per node
+        is in memory. Logs record item counts and a sample of items; the
+        last node's result only holds all of its items if other nodes
+        depend on it.
+        """
+        from src.models.all_models import ExecutionLog
+        
+        chain = self._item_chain(head_id)
+        self.current_node = head_id
+        self.processed_nodes.update(chain)
+        timers = [self.profiler.start_node(node_id, self.parents.get(node_id, [])) for node_id in chain]
+        
+        input_data = self._collect_inputs(head_id)
+        log_entries = [ExecutionLog(execution_id=self.execution_id, node_id=node_id, status='running')
+                       for node_id in chain]
+        if input_data:
+            log_entries[0].set_input_data(input_data, self._encoded_inputs(input_data))
+        for timer in timers:
+            timer.lap('inputs')
+        
+        db.session.add_all(log_entries)
+        db.session.commit()
+        for timer in timers:
+            timer.lap('persist')
+        self.current_log = log_entries[0]
+        for node_id in chain:
+            self._emit('node_started', node_id=node_id)
+        
+        try:
+            head_data = self.nodes[head_id].get('data', {})
+            if head_data.get('item_source'):
+                items = load_callable(head_data['item_source'])(head_data, input_data, self.variables)
+            else:
+                items = iter_items(input_data, head_data.get('items_field', 'items'))
+            
+            source_stats = StageStats()
+            chunks = source_stats.observe(chunked(items, get_chunk_size(head_data)))
+            stage_stats = []
+            usage_calls = {}
+            for node_id in chain:
+                usage_calls[node_id] = []
+                chunks = self._item_stage(node_id, chunks, input_data if node_id == head_id else {},
+                                          usage_calls[node_id])
+                stage_stats.append(StageStats())
+                chunks = stage_stats[-1].observe(chunks)
+            
+            # Pulling chunks from the last node drives the whole pipeline
+            if self._get_next_nodes(chain[-1]):
+                collected = [item for chunk in chunks for item in chunk]
+            else:
+                collected = None
+                for _ in chunks:
+                    pass
+            for timer in timers:
+                timer.lap('handler')
+            
+        except Exception as e:
+            for timer in timers:
+                timer.lap('handler')
+            
+            finished_at = datetime.datetime.utcnow()
+            for log_entry in log_entries:
+                log_entry.status = 'failed'
+                log_entry.finished_at = finished_at
+                log_entry.error_message = str(e) + '\n' + traceback.format_exc()
             
             db.session.commit()
+            for node_id, log_entry, timer in zip(chain, log_entries, timers):
+                timer.lap('persist')
+                self.profiler.finish_node(timer, log_entry.id)
+                NODE_DURATION.observe(timer.elapsed / 1000000, (self.nodes[node_id].get('type', ''), 'failed'))
+                self.failed_nodes.append(node_id)
+                self._emit('node_failed', node_id=node_id, error=str(e))
             return False
+        
+        finished_at = datetime.datetime.utcnow()
+        counts = [source_stats.item_count] + [stats.item_count for stats in stage_stats]
+        for index, (node_id, log_entry, timer) in enumerate(zip(chain, log_entries, timers)):
+            node = self.nodes[node_id]
+            summary = NodeResult(stage_stats[index].to_dict())
+            log_entry.status = 'completed'
+            log_entry.finished_at = finished_at
+            if index > 0:
+                log_entry.set_input_data({chain[index - 1]: {'item_count': counts[index], 'streamed': True}})
+            log_entry.set_output_data(summary)
+            timer.lap('serialize')
+            
+            if usage_calls[node_id]:
+                self._record_usage(log_entry, node.get('type', ''), dict(node.get('data', {}), map_items=True),
+                                   {'items': usage_calls[node_id]})
+            
+            # Downstream nodes that don't stream get the full item list
+            if node_id == chain[-1] and collected is not None:
+                summary = NodeResult(dict(summary.value, items=collected))
+            self.node_results[node_id] = summary
+        
+        db.session.commit()
+        for node_id, log_entry, timer in zip(chain, log_entries, timers):
+            timer.lap('persist')
+            self.profiler.finish_node(timer, log_entry.id)
+            NODE_DURATION.observe(timer.elapsed / 1000000, (self.nodes[node_id].get('type', ''), 'completed'))
+            self._emit('node_completed', node_id=node_id, output=self.node_results[node_id].value)
+        return True
     
     def _process_node(self, node_type, node_data, input_data):
         """Process a node based on its type and return the result."""
         # In a real implementation, this would dynamically load and execute node handlers
         # For now, we'll implement a simple version with basic node types
         
+        # Workflows can opt out of the LLM response cache for all of their nodes
+        if self.definition.get('settings', {}).get('llm_cache') is False:
+            node_data = dict(node_data, cache=False)
+        
         if node_type == 'trigger':
             # Trigger nodes just pass through their configuration
             return node_data
             
+        elif node_type == 'function' and node_data.get('handler'):
+            return self._run_function(node_data, input_data)
+            
         elif node_type == 'function':
-            # Function nodes would execute some code
-            # For now, just return a mock result
+            # Function nodes without a handler return a mock result
             return {
                 "processed": True,
                 "timestamp": datetime.datetime.utcnow().isoformat(),
@@ -138,95 +734,212 @@ class WorkflowEngine:
             }
             
         elif node_type == 'condition':
-            # Condition nodes would evaluate a condition
-            # For now, always return true
-            return {"condition_result": True}
+            # The result picks the "true" or "false" branch leaving the node
+            return {"condition_result": evaluate_condition(node_data, input_data)}
             
         elif node_type == 'action':
             # Action nodes would perform some action
             # For now, just return success
             return {"action": "completed", "success": True}
             
+        elif node_type == 'llm' and node_data.get('map_items'):
+            # Run the prompt once per upstream item, batching compatible provider calls
+            from src.ai.service import AIService
+            items = self._collect_items(input_data, node_data.get('items_field', 'items'))
+            return {"items": AIService.process_llm_items(node_data, items, input_data, self.variables)}
+            
+        elif node_type in STREAMING_NODE_TYPES and node_data.get('stream'):
+            # Streaming AI nodes publish tokens to listeners as they arrive
+            return self._stream_node(node_type, node_data, input_data)
+            
         elif node_type == 'llm':
-            # LLM nodes would call an AI model
-            # For now, return mock response
-            return {
-                "generated_text": f"This is a mock response from an LLM for prompt: {node_data.get('prompt', 'No prompt provided')}"
-            }
+            from src.ai.service import AIService
+            return AIService.process_llm_node(node_data, input_data, self.variables)
             
         elif node_type == 'agent':
-            # Agent nodes would execute an autonomous agent
-            # For now, return mock response
-            return {
-                "agent_result": "Task completed successfully",
-                "steps_taken": ["analyzed input", "made decision", "took action"]
-            }
+            from src.ai.service import AIService
+            return AIService.process_agent_node(node_data, input_data, self.variables,
+                                                self._agent_step_writer(self.current_log))
+            
+        elif node_type == 'content_generation':
+            from src.ai.service import AIService
+            return AIService.process_content_generation_node(node_data, input_data, self.variables)
+            
+        elif node_type in MAP_NODE_TYPES:
+            return self._process_map(node_data, input_data)
             
         else:
             # Unknown node type
             return {"error": f"Unknown node type: {node_type}"}
     
+    def _process_body_node(self, node_type, node_data, input_data):
+        """Process a node of a map body, which has no log entry for agent steps or streamed tokens."""
+        if node_type == 'agent':
+            from src.ai.service import AIService
+            return AIService.process_agent_node(node_data, input_data, self.variables)
+        if node_data.get('stream'):
+            node_data = dict(node_data, stream=False)
+        return self._process_node(node_type, node_data, input_data)
+    
+    def _process_map(self, node_data, input_data):
+        """
+        Run a map node's body once per item and return the results in item order.
+        
+        Items come from the lists parents hold under items_field. Up to
+        concurrency iterations run at once, and at most twice that many are
+        queued, so items are read as the iterations progress. Instead of
+        logs per body node, the result keeps iteration counts, durations
+        and the first errors. A failed iteration fails the node unless
+        continue_on_error is set, in which case its result is None.
+        """
+        body = MapBody(self, node_data.get('body', {}))
+        items = iter_items(input_data, node_data.get('items_field', 'items'))
+        concurrency = max(1, int(node_data.get('concurrency') or os.getenv('MAP_CONCURRENCY', '8')))
+        continue_on_error = node_data.get('continue_on_error', False)
+        
+        # Load variables once here rather than racing to load them from every iteration
+        self.variables
+        app = current_app._get_current_object()
+        
+        def run_iteration(index, item):
+            started = time.perf_counter()
+            with app.app_context():
+                try:
+                    result, error = body.run(item, index), None
+                except Exception as e:
+                    result, error = None, str(e)
+            return index, result, error, (time.perf_counter() - started) * 1000
+        
+        results = []
+        iterations = {'completed': 0, 'failed': 0, 'total_ms': 0, 'max_ms': 0, 'errors': []}
+        
+        def collect(future):
+            index, result, error, duration_ms = future.result()
+            results.append(result)
+            iterations['failed' if error else 'completed'] += 1
+            iterations['total_ms'] += duration_ms
+            iterations['max_ms'] = max(iterations['max_ms'], duration_ms)
+            if error:
+                if len(iterations['errors']) < MAP_ERROR_SAMPLE_SIZE:
+                    iterations['errors'].append({'index': index, 'error': error})
+                if not continue_on_error:
+                    raise Exception(f"Map iteration {index} failed: {error}")
+        
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                for index, item in enumerate(items):
+                    window.append(executor.submit(run_iteration, index, item))
+                    if len(window) >= 2 * concurrency:
+                        collect(window.popleft())
+                while window:
+                    collect(window.popleft())
+            except Exception:
+                for future in window:
+                    future.cancel()
+                raise
+        
+        iterations['total_ms'] = round(iterations['total_ms'], 3)
+        iterations['max_ms'] = round(iterations['max_ms'], 3)
+        return {'results': results, 'item_count': len(results), 'iterations': iterations}
+    
+    def _run_function(self, node_data, input_data):
+        """Call a function node's handler, in the worker process pool when it is marked CPU-bound."""
+        if node_data.get('cpu_bound'):
+            from src.services.function_pool import get_function_pool
+            
+            return get_function_pool().run(
+                node_data['handler'], input_data, node_data,
+                timeout=float(node_data.get('timeout_seconds') or os.getenv('FUNCTION_TIMEOUT_SECONDS', '60')),
+                cpu_seconds=float(node_data.get('cpu_limit_seconds') or os.getenv('FUNCTION_CPU_LIMIT_SECONDS', '30')),
+                memory_mb=int(node_data.get('memory_limit_mb') or os.getenv('FUNCTION_MEMORY_LIMIT_MB', '512'))
+            )
+        
+        # I/O-bound handlers run on the engine's thread, like the AI nodes
+        return load_callable(node_data['handler'])(input_data, node_data)
+    
     def execute(self):
         """Execute the entire workflow."""
         # Update execution status
         self.execution.status = 'running'
         db.session.commit()
+        started = time.perf_counter()
+        EXECUTIONS_IN_PROGRESS.inc()
         
         try:
-            # Find start nodes
-            start_nodes = self._find_start_nodes()
-            
-            # Execute start nodes
-            for node_id in start_nodes:
-                success = self._execute_node(node_id)
-                if not success:
-                    raise Exception(f"Failed to execute start node: {node_id}")
-            
-            # Process remaining nodes in topological order
-            processed_nodes = set(start_nodes)
-            all_nodes = set(self.nodes.keys())
-            
-            while processed_nodes != all_nodes:
-                # Find nodes whose dependencies have all been processed
-                next_nodes = []
-                for node_id in all_nodes - processed_nodes:
-                    # Check if all incoming edges are from processed nodes
-                    has_unprocessed_dependency = False
-                    for source, targets in self.edges.items():
-                        if node_id in targets and source not in processed_nodes:
-                            has_unprocessed_dependency = True
-                            break
-                    
-                    if not has_unprocessed_dependency:
-                        next_nodes.append(node_id)
+            # Incoming edges not yet resolved, and how many of the resolved ones are live
+            waiting = {node_id: len(self.parents.get(node_id, [])) for node_id in self.nodes}
+            live = dict.fromkeys(self.nodes, 0)
+            decided = 0
+            
+            # Execute start nodes, then every node whose incoming edges are all resolved
+            batch = self._find_start_nodes()
+            error_message = "Failed to execute start node: {node_id}"
+            while batch:
+                self._run_batch(batch, error_message)
+                decided += len(batch)
+                error_message = "Failed to execute node: {node_id}"
                 
-                if not next_nodes:
-                    # No more nodes can be processed, but we haven't processed all nodes
-                    # This indicates a cycle in the workflow
-                    raise Exception("Workflow contains a cycle")
+                # A node with no live incoming edge is skipped, and so is everything only it leads to
+                next_batch = []
+                skipped = []
+                resolved = [(target, is_live) for node_id in batch for target, is_live in self._live_edges(node_id)]
+                while resolved:
+                    target, is_live = resolved.pop()
+                    if target not in waiting:
+                        continue
+                    waiting[target] -= 1
+                    live[target] += is_live
+                    if waiting[target]:
+                        continue
+                    if live[target]:
+                        next_batch.append(target)
+                    else:
+                        skipped.append(target)
+                        resolved += [(child_id, False) for child_id, _ in self.out_edges.get(target, [])]
                 
-                # Execute the next batch of nodes
-                for node_id in next_nodes:
-                    success = self._execute_node(node_id)
-                    if not success:
-                        raise Exception(f"Failed to execute node: {node_id}")
-                    processed_nodes.add(node_id)
+                if skipped:
+                    self._skip_nodes(skipped)
+                    decided += len(skipped)
+                batch = next_batch
+            
+            if decided < len(self.nodes):
+                # Nodes left waiting on each other indicate a cycle in the workflow
+                raise Exception("Workflow contains a cycle")
             
             # Update execution status
             self.execution.status = 'completed'
             self.execution.finished_at = datetime.datetime.utcnow()
+            self.profiler.save()
             db.session.commit()
+            self._record_execution_metrics('completed', started)
             
             return True
             
         except Exception as e:
+            # Children started on partial output still get their logs finished
+            for child_id in list(self.partial_runs):
+                self._finish_partial_run(child_id)
+            
             # Update execution status
             self.execution.status = 'failed'
             self.execution.error_message = str(e)
             self.execution.finished_at = datetime.datetime.utcnow()
+            self.profiler.save()
             db.session.commit()
+            self._record_execution_metrics('failed', started)
             
             return False
+        
+        finally:
+            if self._partial_executor is not None:
+                self._partial_executor.shutdown()
+    
+    def _record_execution_metrics(self, status, started):
+        """Count a finished execution and record its wall time."""
+        EXECUTIONS_IN_PROGRESS.dec()
+        EXECUTIONS.inc((status,))
+        EXECUTION_DURATION.observe(time.perf_counter() - started)
 
 # Engine API endpoints
 @engine_bp.route('/execute/<int:execution_id>', methods=['POST'])
@@ -262,15 +975,45 @@ def execute_workflow_engine(execution_id):
             'execution': execution.to_dict()
         }), 500
 
-def register_blueprints(app):
-    """Register all blueprints with the Flask app."""
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(workflow_bp, url_prefix='/api/workflows')
-    app.register_blueprint(node_bp, url_prefix='/api/nodes')
-    app.register_blueprint(execution_bp, url_prefix='/api/executions')
-    app.register_blueprint(credential_bp, url_prefix='/api/credentials')
-    app.register_blueprint(variable_bp, url_prefix='/api/variables')
-    app.register_blueprint(ai_bp, url_prefix='/api/ai')
-    app.register_blueprint(template_bp, url_prefix='/api/templates')
-    app.register_blueprint(trigger_bp, url_prefix='/api/triggers')
-    app.register_blueprint(engine_bp, url_prefix='/api/engine')
+@engine_bp.route('/execute/<int:execution_id>/stream', methods=['POST'])
+def stream_workflow_engine(execution_id):
+    """Execute a workflow, relaying node and token events as Server-Sent Events."""
+    from src.models.all_models import Execution, WorkflowVersion
+    from src.routes.ai_api import sse_event, sse_response
+    
+    execution = Execution.query.get(execution_id)
+    
+    if not execution:
+        return jsonify({'message': 'Execution not found'}), 404
+    
+    if execution.status != 'pending':
+        return jsonify({'message': f'Execution is already in {execution.status} state'}), 400
+    
+    if not WorkflowVersion.query.get(execution.workflow_version_id):
+        return jsonify({'message': 'Workflow version not found'}), 404
+    
+    # The engine runs in its own thread so events reach the client while it executes
+    app = current_app._get_current_object()
+    events = queue.Queue()
+    
+    def run():
+        with app.app_context():
+            try:
+                execution = Execution.query.get(execution_id)
+                engine = WorkflowEngine(WorkflowVersion.query.get(execution.workflow_version_id), execution_id)
+                engine.add_listener(lambda event, payload: events.put((event, payload)))
+                success = engine.execute()
+                events.put(('done', {'success': success, 'execution': engine.execution.to_dict()}))
+            except Exception as e:
+                events.put(('done', {'success': False, 'message': str(e)}))
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    def relay():
+        while True:
+            event, payload = events.get()
+            yield sse_event(event, payload)
+            if event == 'done':
+                break
+    
+    return sse_response(relay())
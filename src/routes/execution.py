@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify, request
-from src.models.all_models import Execution, ExecutionLog, Workflow, WorkflowVersion, db
+from flask import Blueprint, Response, jsonify, request
+from src.models.all_models import Execution, Workflow, WorkflowVersion, db
 from src.routes.auth import token_required
+from src.services.retention import load_execution_logs
 import datetime
 
 execution_bp = Blueprint('execution', __name__)
@@ -59,10 +60,70 @@ def get_execution_logs(current_user, execution_id):
     if not workflow or workflow.created_by != current_user.id:
         return jsonify({'message': 'Unauthorized access'}), 403
     
-    logs = ExecutionLog.query.filter_by(execution_id=execution_id).order_by(ExecutionLog.started_at).all()
+    # Logs of old executions may have been moved to the archive
+    logs = load_execution_logs(execution_id)
+    
+    # Clients can leave large payloads as references and fetch them on demand
+    resolve_blobs = request.args.get('blobs') != 'reference'
+    
+    # Stored payload JSON is passed through as it is instead of being decoded and encoded again
+    return Response('{"logs": [' + ', '.join(log.to_json(resolve_blobs) for log in logs) + ']}',
+                    mimetype='application/json')
+
+@execution_bp.route('/<int:execution_id>/blobs/<digest>', methods=['GET'])
+@token_required
+def get_execution_blob(current_user, execution_id, digest):
+    from src.services.blobs import LocalBlobStore, get_blob_store, references
+    
+    execution = Execution.query.get(execution_id)
+    
+    if not execution:
+        return jsonify({'message': 'Execution not found'}), 404
+    
+    # Check permissions
+    workflow = Workflow.query.get(execution.workflow_id)
+    if not workflow or workflow.created_by != current_user.id:
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    # Only serve payloads this execution's logs refer to
+    logs = load_execution_logs(execution_id)
+    if not any(digest in references(log.get_input_data(False)) | references(log.get_output_data(False))
+               for log in logs):
+        return jsonify({'message': 'Blob not found'}), 404
+    
+    try:
+        data = (get_blob_store() or LocalBlobStore.from_environment()).get(digest)
+    except KeyError:
+        return jsonify({'message': 'Blob not found'}), 404
+    
+    return Response(data, mimetype='application/json')
+
+@execution_bp.route('/<int:execution_id>/profile', methods=['GET'])
+@token_required
+def get_execution_profile(current_user, execution_id):
+    from src.services.profiling import build_profile
+    
+    execution = Execution.query.get(execution_id)
+    
+    if not execution:
+        return jsonify({'message': 'Execution not found'}), 404
+    
+    # Check permissions
+    workflow = Workflow.query.get(execution.workflow_id)
+    if not workflow or workflow.created_by != current_user.id:
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    logs = load_execution_logs(execution_id)
+    workflow_version = WorkflowVersion.query.get(execution.workflow_version_id)
+    profile = build_profile(logs, workflow_version.get_definition() if workflow_version else {})
+    
+    # Folded stacks for flamegraph.pl / speedscope
+    if request.args.get('format') == 'folded':
+        return Response(profile['folded'] + '\n', mimetype='text/plain')
     
     return jsonify({
-        'logs': [log.to_dict() for log in logs]
+        'execution_id': execution_id,
+        'profile': profile
     }), 200
 
 @execution_bp.route('/workflows/<int:workflow_id>/execute', methods=['POST'])
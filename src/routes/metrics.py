@@ -0,0 +1,56 @@
+from flask import Blueprint, Response, current_app, g, jsonify, request
+from src.metrics import REGISTRY, SQL_STATEMENTS_HEADER, SQL_TIME_HEADER, StatementStats, listen_sqlalchemy, start_snapshot_writer
+import hmac
+import os
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Clients that may scrape /metrics when no METRICS_TOKEN is set
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+@metrics_bp.record_once
+def start_metrics(state):
+    """Start timing SQL statements and commits, and sharing snapshots when configured."""
+    listen_sqlalchemy()
+    start_snapshot_writer()
+
+def sql_stats_enabled():
+    """Whether responses carry SQL statement headers: in debug mode or when SQL_STATS_HEADER is set."""
+    enabled = current_app.config.get('SQL_STATS_HEADER')
+    if enabled is None:
+        enabled = os.getenv('SQL_STATS_HEADER', 'false').lower() == 'true'
+    return current_app.debug or enabled
+
+@metrics_bp.before_app_request
+def start_statement_stats():
+    if sql_stats_enabled():
+        g.statement_stats = StatementStats().start()
+
+@metrics_bp.after_app_request
+def add_statement_headers(response):
+    stats = g.pop('statement_stats', None)
+    if stats is not None:
+        stats.stop()
+        response.headers[SQL_STATEMENTS_HEADER] = str(stats.count)
+        response.headers[SQL_TIME_HEADER] = f"{stats.seconds * 1000:.2f}"
+    return response
+
+@metrics_bp.teardown_app_request
+def stop_statement_stats(exception):
+    # after_app_request is skipped when a view raises
+    stats = g.pop('statement_stats', None)
+    if stats is not None:
+        stats.stop()
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Serve all metrics in the Prometheus text exposition format."""
+    # Scrapers authenticate with a static bearer token; without METRICS_TOKEN only local scrapes are served
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return jsonify({'message': 'Unauthorized access'}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    return Response(REGISTRY.exposition(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify, request
-from src.models.all_models import Workflow, WorkflowVersion, db
+from src.models.all_models import RetentionPolicy, Workflow, WorkflowVersion, db
 from src.routes.auth import token_required
 import datetime
 import json
@@ -105,6 +105,77 @@ def create_workflow(current_user):
         'workflow': new_workflow.to_dict()
     }), 201
 
+@workflow_bp.route('/<int:workflow_id>/retention', methods=['GET'])
+@token_required
+def get_retention_policy(current_user, workflow_id):
+    from src.services.retention import default_policy
+    
+    workflow = Workflow.query.get(workflow_id)
+    
+    if not workflow:
+        return jsonify({'message': 'Workflow not found'}), 404
+    
+    # Check permissions
+    if workflow.created_by != current_user.id:
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    policy = RetentionPolicy.query.filter_by(workflow_id=workflow_id).first()
+    if policy is None:
+        archive_after_days, purge_after_days = default_policy()
+        return jsonify({
+            'policy': {
+                'workflow_id': workflow_id,
+                'archive_after_days': archive_after_days,
+                'purge_after_days': purge_after_days,
+                'is_default': True
+            }
+        }), 200
+    
+    return jsonify({
+        'policy': dict(policy.to_dict(), is_default=False)
+    }), 200
+
+@workflow_bp.route('/<int:workflow_id>/retention', methods=['PUT'])
+@token_required
+def update_retention_policy(current_user, workflow_id):
+    from src.services.retention import default_policy
+    
+    workflow = Workflow.query.get(workflow_id)
+    
+    if not workflow:
+        return jsonify({'message': 'Workflow not found'}), 404
+    
+    # Check permissions
+    if workflow.created_by != current_user.id:
+        return jsonify({'message': 'Unauthorized access'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    for field in ('archive_after_days', 'purge_after_days'):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            return jsonify({'message': f'{field} must be a non-negative integer or null'}), 400
+    
+    policy = RetentionPolicy.query.filter_by(workflow_id=workflow_id).first()
+    if policy is None:
+        # A new policy starts from the deployment defaults
+        archive_after_days, purge_after_days = default_policy()
+        policy = RetentionPolicy(workflow_id=workflow_id, archive_after_days=archive_after_days,
+                                 purge_after_days=purge_after_days)
+        db.session.add(policy)
+    
+    # Omitted fields keep their value; null disables the step
+    if 'archive_after_days' in data:
+        policy.archive_after_days = data['archive_after_days']
+    if 'purge_after_days' in data:
+        policy.purge_after_days = data['purge_after_days']
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Retention policy updated successfully',
+        'policy': dict(policy.to_dict(), is_default=False)
+    }), 200
+
 @workflow_bp.route('/<int:workflow_id>', methods=['PUT'])
 @token_required
 def update_workflow(current_user, workflow_id):
@@ -0,0 +1,280 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+
+# Key marking a JSON object as a reference to a stored payload
+BLOB_KEY = '$blob'
+
+# Finds the digests of blob references in stored JSON text without decoding it
+REFERENCE_PATTERN = re.compile(r'"\$blob": "(sha256:[0-9a-f]{64})"')
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Return the process-wide blob store, or None when offloading is disabled."""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None and int(os.getenv('BLOB_THRESHOLD_BYTES', '65536')) > 0:
+            backend = os.getenv('BLOB_STORE_BACKEND', 'local')
+            if backend == 'local':
+                store_class = LocalBlobStore
+            else:
+                # Other backends are named as "package.module:ClassName"
+                module_name, class_name = backend.split(':')
+                store_class = getattr(importlib.import_module(module_name), class_name)
+            _blob_store = store_class.from_environment()
+        return _blob_store
+
+
+class BlobStore:
+    """
+    Content-addressed storage for large node payloads.
+    
+    Payloads are keyed by their SHA-256 digest, so storing the same payload
+    again is a no-op. Backends implement ``_write``, ``_read`` and
+    ``_exists``, and ``_list`` and ``_delete`` for garbage collection.
+    Digests already known to exist are remembered so repeated payloads
+    don't even touch the backend. That lasts at most half of grace_seconds,
+    after which storing the payload again touches the blob. ``sweep`` only
+    deletes blobs untouched for grace_seconds, so a blob still in use
+    always survives it.
+    """
+    
+    def __init__(self, threshold=65536, grace_seconds=86400):
+        """Initialize the store; payloads of at least threshold bytes are offloaded."""
+        self.threshold = threshold
+        self.grace_seconds = grace_seconds
+        self._known = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_environment(cls):
+        """Create a store configured from environment variables."""
+        return cls(threshold=int(os.getenv('BLOB_THRESHOLD_BYTES', '65536')),
+                   grace_seconds=float(os.getenv('BLOB_GC_GRACE_SECONDS', '86400')))
+    
+    def put(self, data):
+        """Store bytes and return their digest ("sha256:<hex>")."""
+        digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            confirmed = self._known.get(digest)
+        if confirmed is not None and now - confirmed < self.grace_seconds / 2:
+            return digest
+        if not self._touch(digest):
+            self._write(digest, data)
+        with self._lock:
+            self._known[digest] = now
+        return digest
+    
+    def get(self, digest):
+        """Return the bytes stored under a digest, raising KeyError if there are none."""
+        return self._read(digest)
+    
+    def _write(self, digest, data):
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _read(self, digest):
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def sweep(self, is_referenced, now=None):
+        """
+        Delete blobs untouched for grace_seconds that is_referenced(digest) rejects.
+        
+        is_referenced is only called for such stale blobs, so an expensive
+        scan for references can be skipped when there are none. Returns the
+        number of blobs deleted.
+        """
+        cutoff = (now or time.time()) - self.grace_seconds
+        stale = [digest for digest, touched_at in self._list() if touched_at < cutoff]
+        deleted = 0
+        for digest in stale:
+            if not is_referenced(digest) and self._delete(digest, cutoff):
+                with self._lock:
+                    self._known.pop(digest, None)
+                deleted += 1
+        return deleted
+    
+    def _exists(self, digest):
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _touch(self, digest):
+        """Mark a blob as in use, returning whether it exists."""
+        return self._exists(digest)
+    
+    def _list(self):
+        """Yield (digest, last touched timestamp) for every stored blob."""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _delete(self, digest, cutoff):
+        """Delete a blob unless it was touched since cutoff, returning whether it was deleted."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under a directory, fanned out by the first digest characters."""
+    
+    def __init__(self, root, threshold=65536, grace_seconds=86400):
+        """Initialize the store under root."""
+        super().__init__(threshold, grace_seconds)
+        self.root = root
+    
+    @classmethod
+    def from_environment(cls):
+        """Create a store in BLOB_STORE_DIR."""
+        return cls(os.getenv('BLOB_STORE_DIR', os.path.join(os.getcwd(), 'blobs')),
+                   threshold=int(os.getenv('BLOB_THRESHOLD_BYTES', '65536')),
+                   grace_seconds=float(os.getenv('BLOB_GC_GRACE_SECONDS', '86400')))
+    
+    def _path(self, digest):
+        """Return the file path for a digest."""
+        algorithm, hexdigest = digest.split(':', 1)
+        if algorithm != 'sha256' or len(hexdigest) != 64 or not all(c in '0123456789abcdef' for c in hexdigest):
+            raise KeyError(digest)
+        return os.path.join(self.root, hexdigest[:2], hexdigest[2:4], hexdigest)
+    
+    def _write(self, digest, data):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial blob
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    
+    def _read(self, digest):
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(digest)
+    
+    def _exists(self, digest):
+        return os.path.exists(self._path(digest))
+    
+    def _touch(self, digest):
+        try:
+            os.utime(self._path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def _list(self):
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if len(file_name) != 64 or file_name.endswith('.tmp'):
+                    continue
+                try:
+                    yield 'sha256:' + file_name, os.path.getmtime(os.path.join(directory, file_name))
+                except FileNotFoundError:
+                    pass
+    
+    def _delete(self, digest, cutoff):
+        path = self._path(digest)
+        try:
+            # Stored again while references were being collected
+            if os.path.getmtime(path) >= cutoff:
+                return False
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def is_reference(value):
+    """Whether a decoded JSON value is a blob reference."""
+    return isinstance(value, dict) and BLOB_KEY in value and len(value) == 2 and 'size' in value
+
+
+def referenced_digests(text):
+    """Return the digests of every blob reference in stored JSON text."""
+    return set(REFERENCE_PATTERN.findall(text)) if text and BLOB_KEY in text else set()
+
+
+def references(value):
+    """Return the digests of blob references in a value and its top-level members."""
+    if is_reference(value):
+        return {value[BLOB_KEY]}
+    if isinstance(value, dict):
+        return {member[BLOB_KEY] for member in value.values() if is_reference(member)}
+    return set()
+
+
+def encode_payload(value, store=None):
+    """
+    Encode a value as JSON text, offloading it to the blob store when the text is large.
+    
+    Returns either the JSON itself or a small reference object
+    ``{"$blob": "sha256:...", "size": n}``.
+    """
+    text = json.dumps(value)
+    store = store or get_blob_store()
+    if store is None or len(text) < store.threshold:
+        return text
+    data = text.encode()
+    return json.dumps({BLOB_KEY: store.put(data), 'size': len(data)})
+
+
+def encode_mapping(mapping, encoded=None, store=None):
+    """
+    Encode a dict as JSON text, offloading each large value separately.
+    
+    ``encoded`` maps keys to JSON text already produced for the same values
+    (for example a parent node's stored output); those are spliced in as
+    they are instead of being serialized again.
+    """
+    encoded = encoded or {}
+    parts = []
+    for key, value in mapping.items():
+        text = encoded.get(key)
+        if text is None:
+            text = encode_payload(value, store)
+        parts.append(f"{json.dumps(str(key))}: {text}")
+    return '{' + ', '.join(parts) + '}'
+
+
+def _reader(store):
+    """Return the store to load references from, even when offloading new payloads is disabled."""
+    return store or get_blob_store() or LocalBlobStore.from_environment()
+
+
+def resolve(value, store=None):
+    """Replace blob references in a value and its top-level members with the stored payloads."""
+    if is_reference(value):
+        return json.loads(_reader(store).get(value[BLOB_KEY]))
+    if isinstance(value, dict) and any(is_reference(member) for member in value.values()):
+        return {key: resolve(member, store) for key, member in value.items()}
+    return value
+
+
+def resolve_json(text, store=None):
+    """
+    Return JSON text with blob references replaced by the stored payloads.
+    
+    The payloads are spliced in as the JSON text they were stored as, and
+    text without references is returned unchanged, so nothing large is
+    decoded and encoded again.
+    """
+    if BLOB_KEY not in text:
+        return text
+    value = json.loads(text)
+    if is_reference(value):
+        return _reader(store).get(value[BLOB_KEY]).decode()
+    if isinstance(value, dict):
+        return '{' + ', '.join(
+            f"{json.dumps(key)}: "
+            f"{_reader(store).get(member[BLOB_KEY]).decode() if is_reference(member) else json.dumps(member)}"
+            for key, member in value.items()
+        ) + '}'
+    return text
+
+
+def decode_payload(text, store=None):
+    """Decode JSON text written by encode_payload or encode_mapping, loading referenced blobs."""
+    return resolve(json.loads(text), store)
@@ -0,0 +1,95 @@
+from sqlalchemy import insert
+from src.models import db
+from datetime import datetime
+from src.models.user import User
+from src.models.workflow import Workflow, WorkflowVersion
+
+
+def _workflow_from_template(template, created_by, name=None, description=None):
+    """Build an unsaved workflow from a template, copying its encoded tags as-is."""
+    return Workflow(
+        name=name or template.name,
+        description=description if description is not None else template.description,
+        created_by=created_by,
+        is_active=True,
+        is_public=False,
+        tags=template.tags
+    )
+
+
+def _initial_version(workflow, definition, notes):
+    """Build the unsaved first version of a flushed workflow around an encoded definition."""
+    return WorkflowVersion(
+        workflow_id=workflow.id,
+        version=1,
+        created_by=workflow.created_by,
+        definition=definition,
+        notes=notes
+    )
+
+
+def instantiate_template(template, created_by, name=None, description=None):
+    """
+    Create a workflow and its first version from a template in one transaction.
+    
+    The stored definition and tags are copied verbatim, without decoding and
+    re-encoding the JSON.
+    """
+    workflow = _workflow_from_template(template, created_by, name, description)
+    db.session.add(workflow)
+    db.session.flush()
+    
+    db.session.add(_initial_version(workflow, template.definition, f'Created from template: {template.name}'))
+    db.session.commit()
+    return workflow
+
+
+def unknown_user_ids(user_ids):
+    """Return the given user IDs that don't exist, sorted, with one query."""
+    user_ids = set(user_ids)
+    known = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(user_ids))}
+    return sorted(user_ids - known)
+
+
+def instantiate_template_bulk(template, specs):
+    """
+    Create many workflows from one template in a single transaction.
+    
+    Each spec is a dict with created_by and optional name and description;
+    callers check the owners exist first (see unknown_user_ids).
+    Workflows are flushed together so the dialect can batch their inserts,
+    and the versions, whose IDs are not needed, go out as one executemany.
+    Returns the new workflows in spec order.
+    """
+    workflows = [
+        _workflow_from_template(template, spec['created_by'], spec.get('name'), spec.get('description'))
+        for spec in specs
+    ]
+    try:
+        db.session.add_all(workflows)
+        db.session.flush()
+        
+        ids = [workflow.id for workflow in workflows]
+        now = datetime.utcnow()
+        notes = f'Created from template: {template.name}'
+        db.session.execute(insert(WorkflowVersion), [
+            {
+                'workflow_id': workflow.id,
+                'version': 1,
+                'created_by': workflow.created_by,
+                'definition': template.definition,
+                'notes': notes,
+                'created_at': now
+            }
+            for workflow in workflows
+        ])
+        db.session.commit()
+    except Exception:
+        # Leave nothing half-created behind
+        db.session.rollback()
+        raise
+    
+    # Reload the committed workflows with one query rather than one per object
+    loaded = {workflow.id: workflow for workflow in Workflow.query.filter(Workflow.id.in_(ids))}
+    return [loaded[workflow_id] for workflow_id in ids]
+
@@ -0,0 +1,59 @@
+import operator
+
+# Comparisons a condition node can apply between the value at its field and its configured value
+OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'contains': lambda actual, expected: actual is not None and expected in actual,
+    'in': lambda actual, expected: actual in (expected or ()),
+    'truthy': lambda actual, expected: bool(actual),
+    'falsy': lambda actual, expected: not actual
+}
+
+_MISSING = object()
+
+
+def _lookup(data, path):
+    """Return the value at a dotted path ("parent.field.0") in a node's input, or _MISSING."""
+    value = data
+    for part in str(path).split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.lstrip('-').isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def evaluate_condition(node_data, input_data):
+    """
+    Evaluate a condition node's configured comparison against its input and return the outcome.
+    
+    The node names a dotted "field" path into its input (keyed by parent
+    node ID), an "operator" from OPERATORS ("truthy" by default) and the
+    "value" to compare with. "exists" tests only whether the field is
+    present. A node without a field passes, as condition nodes always did.
+    """
+    field = node_data.get('field')
+    if not field:
+        return True
+    
+    op = node_data.get('operator', 'truthy')
+    actual = _lookup(input_data, field)
+    if op == 'exists':
+        return actual is not _MISSING
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown condition operator: {op}")
+    if actual is _MISSING:
+        return False
+    
+    try:
+        return bool(OPERATORS[op](actual, node_data.get('value')))
+    except TypeError:
+        # Values that can't be compared (a string against a number, say) don't match
+        return False
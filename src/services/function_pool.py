@@ -0,0 +1,227 @@
+from multiprocessing import shared_memory
+from src.metrics import FUNCTION_POOL_DURATION, FUNCTION_POOL_TASKS
+from src.services.item_streams import load_callable
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+import traceback
+
+_function_pool = None
+_function_pool_lock = threading.Lock()
+
+
+def get_function_pool():
+    """Return the process-wide pool for CPU-bound function nodes, created on first use."""
+    global _function_pool
+    with _function_pool_lock:
+        if _function_pool is None:
+            _function_pool = FunctionPool(
+                size=int(os.getenv('FUNCTION_POOL_SIZE', '0')) or os.cpu_count() or 1,
+                shared_memory_threshold=int(os.getenv('FUNCTION_POOL_SHM_BYTES', str(1024 * 1024))),
+                start_method=os.getenv('FUNCTION_POOL_START_METHOD', 'forkserver')
+            )
+        return _function_pool
+
+
+class FunctionTimeout(Exception):
+    """A function node ran past its timeout and its worker was killed."""
+
+
+class FunctionFailed(Exception):
+    """A function node raised, or its worker died (for example on hitting a resource limit)."""
+
+
+def _send_payload(data, threshold):
+    """Return a message carrying bytes inline, or in a shared memory block when they are large."""
+    if len(data) < threshold:
+        return ('inline', data)
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return ('shm', name, len(data))
+
+
+def _receive_payload(message):
+    """Return the bytes of a payload message, unlinking its shared memory block."""
+    if message[0] == 'inline':
+        return message[1]
+    _, name, size = message
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _discard_payload(message):
+    """Free the shared memory of a payload that will never be received."""
+    if message[0] == 'shm':
+        try:
+            block = shared_memory.SharedMemory(name=message[1])
+            block.close()
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _set_soft_limit(limit, soft):
+    """Set a resource's soft limit, never above its hard limit; None lifts it to the hard limit."""
+    _, hard = resource.getrlimit(limit)
+    if soft is None or (hard != resource.RLIM_INFINITY and soft > hard):
+        soft = hard
+    resource.setrlimit(limit, (soft, hard))
+
+
+def _address_space_size():
+    """Return the worker's current virtual memory size in bytes, or 0 where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+
+def _apply_limits(cpu_seconds, memory_bytes):
+    """Limit the CPU time and the extra memory the next task may use; falsy values lift the limit."""
+    if cpu_seconds:
+        # RLIMIT_CPU counts the worker's whole life, so the limit moves with every task
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1)
+    else:
+        _set_soft_limit(resource.RLIMIT_CPU, None)
+    if memory_bytes:
+        _set_soft_limit(resource.RLIMIT_AS, _address_space_size() + memory_bytes)
+    else:
+        _set_soft_limit(resource.RLIMIT_AS, None)
+
+
+def _worker_main(connection, shared_memory_threshold):
+    """Run tasks received over connection until it closes."""
+    while True:
+        try:
+            handler_path, payload, node_data, cpu_seconds, memory_bytes = connection.recv()
+        except EOFError:
+            return
+        
+        try:
+            input_data = json.loads(_receive_payload(payload))
+            _apply_limits(cpu_seconds, memory_bytes)
+            result = load_callable(handler_path)(input_data, node_data)
+            reply = ('ok', _send_payload(json.dumps(result).encode(), shared_memory_threshold))
+        except BaseException as e:
+            reply = ('error', f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+        finally:
+            # Lift the limits between tasks so neither the worker nor its next task inherits them
+            _apply_limits(None, None)
+        connection.send(reply)
+
+
+class _Worker:
+    """A warm worker process and the parent's end of its pipe."""
+    
+    def __init__(self, context, shared_memory_threshold):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, shared_memory_threshold),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+    
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class FunctionPool:
+    """
+    Runs CPU-bound function node handlers in warm worker processes, out of reach of the GIL.
+    
+    Each worker runs one task at a time. Inputs and results at least
+    shared_memory_threshold bytes long travel through shared memory instead
+    of the pipe. Every task gets its own CPU time and memory limits, and a
+    task running past its timeout has its worker killed and replaced.
+    """
+    
+    def __init__(self, size, shared_memory_threshold=1024 * 1024, start_method='forkserver'):
+        """Initialize the pool; workers are started lazily and then kept warm."""
+        self.size = size
+        self.shared_memory_threshold = shared_memory_threshold
+        self.context = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+    
+    def _acquire(self):
+        """Take an idle worker, starting a new one while the pool is below its size."""
+        while True:
+            with self._lock:
+                if self._idle.empty() and self._started < self.size:
+                    self._started += 1
+                    break
+            # Check again now and then, as a killed worker frees a slot without becoming idle
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        
+        try:
+            return _Worker(self.context, self.shared_memory_threshold)
+        except BaseException:
+            # Give the slot back, or the pool would shrink with every failed start
+            with self._lock:
+                self._started -= 1
+            raise
+    
+    def _discard(self, worker):
+        """Kill a worker and make room for a fresh one."""
+        worker.kill()
+        with self._lock:
+            self._started -= 1
+    
+    def run(self, handler_path, input_data, node_data, timeout=60, cpu_seconds=None, memory_mb=None):
+        """Call the handler with (input_data, node_data) in a worker and return its result."""
+        started = time.perf_counter()
+        outcome = 'failed'
+        worker = self._acquire()
+        payload = _send_payload(json.dumps(input_data).encode(), self.shared_memory_threshold)
+        try:
+            try:
+                worker.connection.send((handler_path, payload, node_data, cpu_seconds,
+                                        memory_mb * 1024 * 1024 if memory_mb else None))
+                if not worker.connection.poll(timeout):
+                    self._discard(worker)
+                    _discard_payload(payload)
+                    outcome = 'timeout'
+                    raise FunctionTimeout(f"Function {handler_path} timed out after {timeout} seconds")
+                status, reply = worker.connection.recv()
+            except (EOFError, OSError):
+                # Workers stopped by RLIMIT_CPU exit with -SIGXCPU
+                worker.process.join(1)
+                exit_code = worker.process.exitcode
+                self._discard(worker)
+                _discard_payload(payload)
+                raise FunctionFailed(f"Worker running {handler_path} died (exit code {exit_code})")
+            
+            self._idle.put(worker)
+            if status == 'error':
+                raise FunctionFailed(reply)
+            outcome = 'completed'
+            return json.loads(_receive_payload(reply))
+        finally:
+            FUNCTION_POOL_TASKS.inc((outcome,))
+            FUNCTION_POOL_DURATION.observe(time.perf_counter() - started, (outcome,))
+    
+    def shutdown(self):
+        """Stop the idle workers."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(worker)
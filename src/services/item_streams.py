@@ -0,0 +1,68 @@
+import importlib
+import itertools
+import os
+
+
+def get_chunk_size(node_data):
+    """Items per chunk for a stream that starts at a node, from its chunk_size or ITEM_CHUNK_SIZE."""
+    return int(node_data.get('chunk_size') or os.getenv('ITEM_CHUNK_SIZE', '500'))
+
+
+def load_callable(path):
+    """Import a callable named as "package.module:function" from a module allowed by NODE_HANDLER_MODULES."""
+    module_name, name = path.split(':')
+    
+    # Workflow definitions come from users, so only listed modules (and their submodules) may be imported
+    allowed = [module.strip() for module in os.getenv('NODE_HANDLER_MODULES', '').split(',') if module.strip()]
+    if not any(module_name == module or module_name.startswith(module + '.') for module in allowed):
+        raise ValueError(f"Handler module {module_name} is not listed in NODE_HANDLER_MODULES")
+    
+    return getattr(importlib.import_module(module_name), name)
+
+
+def iter_items(input_data, items_field):
+    """Yield the items that parent results hold in lists under items_field, without copying them."""
+    for result in input_data.values():
+        if isinstance(result, dict) and isinstance(result.get(items_field), list):
+            yield from result[items_field]
+
+
+def chunked(items, size):
+    """Group an iterable of items into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StageStats:
+    """Counts the items and chunks flowing out of one pipeline stage and keeps the first few as a sample."""
+    
+    def __init__(self, sample_size=None):
+        """Initialize empty counts, sampling ITEM_SAMPLE_SIZE items by default."""
+        self.sample_size = int(os.getenv('ITEM_SAMPLE_SIZE', '5')) if sample_size is None else sample_size
+        self.item_count = 0
+        self.chunk_count = 0
+        self.sample = []
+    
+    def observe(self, chunks):
+        """Pass chunks through unchanged while counting them."""
+        for chunk in chunks:
+            # Handlers may yield any iterable per chunk
+            if not isinstance(chunk, list):
+                chunk = list(chunk)
+            self.item_count += len(chunk)
+            self.chunk_count += 1
+            if len(self.sample) < self.sample_size:
+                self.sample.extend(chunk[:self.sample_size - len(self.sample)])
+            yield chunk
+    
+    def to_dict(self):
+        return {
+            'item_count': self.item_count,
+            'chunk_count': self.chunk_count,
+            'sample': self.sample,
+            'streamed': True
+        }
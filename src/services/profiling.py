@@ -0,0 +1,198 @@
+import json
+import time
+
+# Phases of a node run, in the order they are stored
+PHASES = ('queue', 'inputs', 'handler', 'serialize', 'persist')
+
+
+def _now_us():
+    """Return a monotonic timestamp in microseconds."""
+    return int(time.perf_counter() * 1000000)
+
+
+class NodeTimer:
+    """Accumulates phase timings for one node run, lap by lap."""
+    
+    __slots__ = ('node_id', 'parent', 'start', 'phases', '_last')
+    
+    def __init__(self, node_id, parent, start, queue):
+        """Start timing a node that waited queue microseconds after becoming ready."""
+        self.node_id = node_id
+        self.parent = parent
+        self.start = start
+        self.phases = dict.fromkeys(PHASES, 0)
+        self.phases['queue'] = queue
+        self._last = start
+    
+    def lap(self, phase):
+        """Charge the time since the previous lap to a phase."""
+        now = _now_us()
+        self.phases[phase] += now - self._last
+        self._last = now
+    
+    @property
+    def elapsed(self):
+        """Microseconds from the node's start to its latest lap."""
+        return self._last - self.start
+
+
+class ExecutionProfiler:
+    """
+    Records per-node phase timings while a workflow executes.
+    
+    Queue wait runs from the moment all of a node's parents finished (or the
+    execution started) to the moment the node starts. A node started from
+    inside another node's handler (e.g. on partial output) records that node
+    as its parent so profiles can nest it. Timings are kept in memory and written for every node at once
+    by ``save``.
+    """
+    
+    def __init__(self):
+        """Start the execution clock."""
+        self.started = _now_us()
+        self.timers = []
+        self._log_ids = {}
+        self._finished = {}
+        self._stack = []
+    
+    def start_node(self, node_id, parents, nested_in=None):
+        """Begin timing a node run; nested_in names the node a concurrently started node is nested under."""
+        now = _now_us()
+        if all(parent in self._finished for parent in parents):
+            ready = max((self._finished[parent] for parent in parents), default=self.started)
+        else:
+            # Started on a running parent's partial output, so it was ready just now
+            ready = now
+        if nested_in is not None:
+            # Still running after the node it's nested under finishes, so it stays off the stack
+            return NodeTimer(node_id, nested_in, now, max(now - ready, 0))
+        timer = NodeTimer(node_id, self._stack[-1].node_id if self._stack else None, now, max(now - ready, 0))
+        self._stack.append(timer)
+        return timer
+    
+    def finish_node(self, timer, log_id):
+        """Stop timing a node run and remember which log entry it belongs to."""
+        if self._stack and self._stack[-1] is timer:
+            self._stack.pop()
+        self._finished[timer.node_id] = timer._last
+        self._log_ids[id(timer)] = log_id
+        self.timers.append(timer)
+    
+    def save(self):
+        """Store every node's timings on its execution log entry with one batched update."""
+        from sqlalchemy import update
+        from src.models.all_models import ExecutionLog, db
+        
+        rows = [
+            {'id': self._log_ids[id(timer)], 'timings': encode_timings(timer.start - self.started, timer.phases, timer.parent)}
+            for timer in self.timers
+            if self._log_ids.get(id(timer)) is not None
+        ]
+        if rows:
+            db.session.execute(update(ExecutionLog), rows)
+
+
+def encode_timings(offset, phases, parent=None):
+    """Encode a node's start offset and phase timings (microseconds) as a compact JSON array."""
+    values = [offset] + [phases[phase] for phase in PHASES]
+    if parent is not None:
+        values.append(parent)
+    return json.dumps(values, separators=(',', ':'))
+
+
+def decode_timings(values):
+    """Decode the array written by encode_timings into offset, phases and parent."""
+    phases = dict(zip(PHASES, values[1:1 + len(PHASES)]))
+    parent = values[1 + len(PHASES)] if len(values) > 1 + len(PHASES) else None
+    return values[0], phases, parent
+
+
+def build_profile(logs, definition):
+    """
+    Summarize an execution's node timings.
+    
+    Returns per-node phase timings in milliseconds, phase totals, the
+    critical path through the workflow graph (the chain of dependent nodes
+    with the largest summed run time) and flame-graph folded stacks.
+    """
+    node_types = {node['id']: node.get('type', '') for node in definition.get('nodes', [])}
+    parents = {}
+    for edge in definition.get('edges', []):
+        parents.setdefault(edge['target'], []).append(edge['source'])
+    
+    nodes = []
+    for log in logs:
+        values = log.get_timings()
+        if not values:
+            continue
+        offset, phases, parent = decode_timings(values)
+        nodes.append({
+            'node_id': log.node_id,
+            'type': node_types.get(log.node_id, ''),
+            'status': log.status,
+            'parent': parent,
+            'start_ms': offset / 1000,
+            'phases_ms': {phase: value / 1000 for phase, value in phases.items()},
+            'run_ms': sum(value for phase, value in phases.items() if phase != 'queue') / 1000
+        })
+    
+    phase_totals = {phase: round(sum(node['phases_ms'][phase] for node in nodes), 3) for phase in PHASES}
+    return {
+        'nodes': nodes,
+        'phase_totals_ms': phase_totals,
+        'wall_ms': round(max((node['start_ms'] + node['run_ms'] for node in nodes), default=0), 3),
+        'critical_path': critical_path(nodes, parents),
+        'folded': folded_stacks(nodes)
+    }
+
+
+def critical_path(nodes, parents):
+    """Return the dependent chain of nodes with the largest total run time."""
+    by_id = {node['node_id']: node for node in nodes}
+    best = {}
+    
+    def longest(node_id):
+        # Memoized longest path ending at node_id: (total ms, [node ids])
+        if node_id not in best:
+            best[node_id] = (0, [])
+            candidates = [longest(parent) for parent in parents.get(node_id, []) if parent in by_id]
+            total, path = max(candidates, default=(0, []), key=lambda candidate: candidate[0])
+            best[node_id] = (total + by_id[node_id]['run_ms'], path + [node_id])
+        return best[node_id]
+    
+    total, path = max((longest(node_id) for node_id in by_id), default=(0, []), key=lambda candidate: candidate[0])
+    return {
+        'duration_ms': round(total, 3),
+        'nodes': [{'node_id': node_id, 'run_ms': by_id[node_id]['run_ms']} for node_id in path]
+    }
+
+
+def folded_stacks(nodes):
+    """
+    Render node timings as folded stacks ("frame;frame value" lines, in microseconds).
+    
+    The output can be fed to flamegraph.pl or speedscope. Nodes started inside
+    another node's handler are nested under it, and their time is taken out
+    of the parent's handler frame so nothing is counted twice.
+    """
+    by_id = {node['node_id']: node for node in nodes}
+    nested = {}
+    for node in nodes:
+        if node['parent'] in by_id:
+            nested[node['parent']] = nested.get(node['parent'], 0) + node['run_ms']
+    
+    def frames(node):
+        label = f"{node['node_id']} ({node['type']})" if node['type'] else node['node_id']
+        parent = by_id.get(node['parent'])
+        return (frames(parent) + ['handler'] if parent else []) + [label]
+    
+    lines = []
+    for node in nodes:
+        stack = ';'.join(frames(node))
+        for phase, value in node['phases_ms'].items():
+            if phase == 'handler':
+                value -= nested.get(node['node_id'], 0)
+            micros = int(round(value * 1000))
+            if micros > 0:
+                lines.append(f"{stack};{phase} {micros}")
+    return '\n'.join(lines)
@@ -0,0 +1,77 @@
+from src.services.blobs import encode_payload
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Node results are read-only; copy them before making changes")
+
+
+class FrozenDict(dict):
+    """A dict that can't be changed, so one node's result can be shared by all of its children."""
+    
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+    
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+    
+    def __deepcopy__(self, memo):
+        # Deep copies are how handlers get a version they can change
+        return thaw(self)
+
+
+class FrozenList(list):
+    """A list that can't be changed, used for lists inside node results."""
+    
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+    
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+    
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value):
+    """Return a read-only copy of a JSON-like value; already frozen parts are reused as they are."""
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(member)) for key, member in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(member) for member in value)
+    return value
+
+
+def thaw(value):
+    """Return a plain, changeable deep copy of a frozen value."""
+    if isinstance(value, dict):
+        return {key: thaw(member) for key, member in value.items()}
+    if isinstance(value, list):
+        return [thaw(member) for member in value]
+    return value
+
+
+class NodeResult:
+    """
+    An immutable envelope around a node's result.
+    
+    ``value`` is a read-only view handed to downstream handlers, and
+    ``encoded`` is the JSON (or blob reference) stored in execution logs.
+    It is encoded the first time it is needed and then reused for the
+    node's own log and for the input of every child.
+    """
+    
+    __slots__ = ('value', '_encoded')
+    
+    def __init__(self, value):
+        """Wrap a handler's result, taking a read-only copy of it."""
+        self.value = freeze(value)
+        self._encoded = None
+    
+    @property
+    def encoded(self):
+        """Return the stored JSON text, encoding it on first use."""
+        if self._encoded is None:
+            self._encoded = encode_payload(self.value)
+        return self._encoded
@@ -0,0 +1,448 @@
+from src.services.blobs import BLOB_KEY, LocalBlobStore, get_blob_store, referenced_digests, resolve
+from datetime import datetime, timedelta
+import fcntl
+import gzip
+import json
+import os
+import threading
+import time
+
+# Segments roll over to a new file past this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Executions that can no longer change
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Marker found in stored JSON text that holds blob references
+BLOB_KEY_TEXT = f'"{BLOB_KEY}"'
+
+# Log columns holding JSON text, copied into archive records without re-encoding
+_JSON_COLUMNS = ('input_data', 'output_data', 'timings')
+
+_compaction_thread = None
+_compaction_lock = threading.Lock()
+
+
+def _zstandard():
+    """Return the optional zstandard module, or None when it is not installed."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def get_archive_dir():
+    """Return the directory holding archive segments."""
+    return os.getenv('EXECUTION_ARCHIVE_DIR', os.path.join(os.getcwd(), 'archive'))
+
+
+def default_policy():
+    """Return (archive_after_days, purge_after_days) for workflows without their own policy."""
+    archive_after = os.getenv('LOG_ARCHIVE_AFTER_DAYS', '30')
+    purge_after = os.getenv('LOG_PURGE_AFTER_DAYS', '')
+    return (int(archive_after) if archive_after else None,
+            int(purge_after) if purge_after else None)
+
+
+def compress_frame(data, extension):
+    """Compress one execution's NDJSON records for a segment with the given extension."""
+    if extension == '.zst':
+        return _zstandard().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress_frame(data, segment):
+    """Decompress one execution's records read from a segment."""
+    if segment.endswith('.zst'):
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read archive segment {segment}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _archive_record(row):
+    """Render a log row as one NDJSON line, splicing its stored JSON columns in verbatim."""
+    fields = {
+        'id': row.id,
+        'execution_id': row.execution_id,
+        'node_id': row.node_id,
+        'started_at': row.started_at.isoformat() if row.started_at else None,
+        'finished_at': row.finished_at.isoformat() if row.finished_at else None,
+        'status': row.status,
+        'error_message': row.error_message
+    }
+    line = json.dumps(fields)[:-1]
+    for column in _JSON_COLUMNS:
+        line += f', "{column}": {getattr(row, column) or "null"}'
+    return line + '}\n'
+
+
+class SegmentWriter:
+    """
+    Appends compressed per-execution frames to archive segment files.
+    
+    Segments are written with zstd when zstandard is installed and gzip
+    otherwise, and roll over to a new file past max_bytes. Frames are
+    flushed and synced before ``sync`` returns, so index rows are only
+    committed for data that is on disk.
+    """
+    
+    def __init__(self, archive_dir, max_bytes=SEGMENT_MAX_BYTES):
+        """Prepare to write segments into archive_dir."""
+        self.archive_dir = archive_dir
+        self.max_bytes = max_bytes
+        self.extension = '.zst' if _zstandard() is not None else '.gz'
+        self.name = None
+        self._file = None
+        os.makedirs(archive_dir, exist_ok=True)
+    
+    def append(self, lines):
+        """Write one execution's records; return (segment name, byte offset, byte length)."""
+        frame = compress_frame(''.join(lines).encode(), self.extension)
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self._open_next()
+        offset = self._file.tell()
+        self._file.write(frame)
+        return self.name, offset, len(frame)
+    
+    def _open_next(self):
+        """Close the current segment and start a new one."""
+        self.close()
+        self.name = f"segment-{datetime.utcnow():%Y%m%d-%H%M%S}-{os.getpid()}-{time.monotonic_ns()}.ndjson{self.extension}"
+        self._file = open(os.path.join(self.archive_dir, self.name), 'ab')
+    
+    def sync(self):
+        """Make everything written so far durable."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        """Sync and close the current segment."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+class ArchivedExecutionLog:
+    """A read-only execution log restored from an archive record, mirroring ExecutionLog's interface."""
+    
+    def __init__(self, record):
+        """Wrap a decoded archive record."""
+        self.record = record
+        self.id = record['id']
+        self.execution_id = record['execution_id']
+        self.node_id = record['node_id']
+        self.status = record['status']
+        self.error_message = record['error_message']
+    
+    def get_input_data(self, resolve_blobs=True):
+        data = self.record.get('input_data') or {}
+        return resolve(data) if resolve_blobs else data
+    
+    def get_output_data(self, resolve_blobs=True):
+        data = self.record.get('output_data') or {}
+        return resolve(data) if resolve_blobs else data
+    
+    def get_timings(self):
+        return self.record.get('timings') or []
+    
+    def to_dict(self, resolve_blobs=True):
+        return {
+            'id': self.id,
+            'execution_id': self.execution_id,
+            'node_id': self.node_id,
+            'started_at': self.record['started_at'],
+            'finished_at': self.record['finished_at'],
+            'status': self.status,
+            'input_data': self.get_input_data(resolve_blobs),
+            'output_data': self.get_output_data(resolve_blobs),
+            'error_message': self.error_message,
+            'timings': self.get_timings(),
+            'archived': True
+        }
+    
+    def to_json(self, resolve_blobs=True):
+        return json.dumps(self.to_dict(resolve_blobs))
+
+
+def read_archived_logs(execution_id, archive_dir=None):
+    """Return an execution's archived logs in their original order, or [] if it has none or they were purged."""
+    from src.models.all_models import ExecutionArchive
+    
+    archive = ExecutionArchive.query.filter_by(execution_id=execution_id).first()
+    if archive is None or archive.purged_at is not None:
+        return []
+    
+    with open(os.path.join(archive_dir or get_archive_dir(), archive.segment), 'rb') as f:
+        f.seek(archive.byte_offset)
+        frame = f.read(archive.byte_length)
+    
+    return [ArchivedExecutionLog(json.loads(line)) for line in decompress_frame(frame, archive.segment).splitlines() if line]
+
+
+def load_execution_logs(execution_id):
+    """Return an execution's logs from the database, falling back to its archive."""
+    from src.models.all_models import ExecutionLog
+    
+    logs = ExecutionLog.query.filter_by(execution_id=execution_id).order_by(ExecutionLog.started_at).all()
+    return logs or read_archived_logs(execution_id)
+
+
+def _delete_logs(execution_ids, chunk_size):
+    """Delete the logs of archived executions in short transactions of at most chunk_size rows."""
+    from src.models.all_models import AIUsage, ExecutionLog, db
+    
+    deleted = 0
+    while True:
+        ids = [row.id for row in db.session.query(ExecutionLog.id).filter(
+            ExecutionLog.execution_id.in_(execution_ids)
+        ).limit(chunk_size)]
+        if not ids:
+            return deleted
+        
+        # Usage rows outlive the logs; they keep their execution and node IDs
+        AIUsage.query.filter(AIUsage.execution_log_id.in_(ids)).update({'execution_log_id': None}, synchronize_session=False)
+        ExecutionLog.query.filter(ExecutionLog.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+
+def _workflow_cutoffs(now, field):
+    """
+    Return ({workflow id: cutoff} for workflows with a policy, default cutoff) for one policy field.
+    
+    A cutoff of None means the step is disabled.
+    """
+    from src.models.all_models import RetentionPolicy
+    
+    default_days = dict(zip(('archive_after_days', 'purge_after_days'), default_policy()))[field]
+    cutoffs = {}
+    for policy in RetentionPolicy.query.all():
+        days = getattr(policy, field)
+        cutoffs[policy.workflow_id] = now - timedelta(days=days) if days is not None else None
+    return cutoffs, (now - timedelta(days=default_days) if default_days is not None else None)
+
+
+def _due_executions(model_filter, cutoffs, default_cutoff, limit):
+    """Return up to limit finished execution IDs past their workflow's cutoff that match model_filter."""
+    from src.models.all_models import Execution, db
+    
+    conditions = [
+        db.and_(Execution.workflow_id == workflow_id, Execution.finished_at < cutoff)
+        for workflow_id, cutoff in cutoffs.items() if cutoff is not None
+    ]
+    if default_cutoff is not None:
+        conditions.append(db.and_(Execution.workflow_id.notin_(list(cutoffs)) if cutoffs else db.true(),
+                                  Execution.finished_at < default_cutoff))
+    if not conditions:
+        return []
+    
+    return [row.id for row in db.session.query(Execution.id).filter(
+        Execution.status.in_(FINISHED_STATUSES), db.or_(*conditions), model_filter
+    ).order_by(Execution.id).limit(limit)]
+
+
+def archive_execution_logs(now=None, batch_size=100, delete_chunk_size=1000, archive_dir=None):
+    """
+    Move the logs of executions past their retention policy's archive age into archive segments.
+    
+    Each batch of executions is written to disk and synced, then indexed in
+    execution_archives in one commit, and only then are its logs deleted in
+    small chunks. A crash between those steps leaves logs in both places;
+    they are deleted on the next run. Returns (executions archived, logs deleted).
+    """
+    from src.models.all_models import Execution, ExecutionArchive, ExecutionLog, db
+    
+    now = now or datetime.utcnow()
+    cutoffs, default_cutoff = _workflow_cutoffs(now, 'archive_after_days')
+    
+    # Finish deletions interrupted by an earlier run
+    leftover = [row.execution_id for row in db.session.query(ExecutionArchive.execution_id).join(
+        ExecutionLog, ExecutionLog.execution_id == ExecutionArchive.execution_id
+    ).distinct()]
+    deleted = _delete_logs(leftover, delete_chunk_size) if leftover else 0
+    
+    writer = SegmentWriter(archive_dir or get_archive_dir())
+    archived = 0
+    try:
+        while True:
+            not_archived = ~db.session.query(ExecutionArchive.id).filter(
+                ExecutionArchive.execution_id == Execution.id
+            ).exists()
+            execution_ids = _due_executions(not_archived, cutoffs, default_cutoff, batch_size)
+            if not execution_ids:
+                break
+            
+            rows = ExecutionLog.query.filter(ExecutionLog.execution_id.in_(execution_ids)).order_by(
+                ExecutionLog.execution_id, ExecutionLog.started_at, ExecutionLog.id
+            ).all()
+            lines = {execution_id: [] for execution_id in execution_ids}
+            for row in rows:
+                lines[row.execution_id].append(_archive_record(row))
+            
+            index_rows = []
+            for execution_id in execution_ids:
+                segment, offset, length = writer.append(lines[execution_id])
+                index_rows.append(ExecutionArchive(execution_id=execution_id, segment=segment, byte_offset=offset,
+                                                   byte_length=length, log_count=len(lines[execution_id])))
+            writer.sync()
+            db.session.add_all(index_rows)
+            db.session.commit()
+            
+            # Release the loaded rows before deleting them in bulk
+            db.session.expunge_all()
+            deleted += _delete_logs(execution_ids, delete_chunk_size)
+            archived += len(execution_ids)
+    finally:
+        writer.close()
+    
+    return archived, deleted
+
+
+def purge_archived_logs(now=None, batch_size=1000, archive_dir=None):
+    """
+    Drop archived logs past their retention policy's purge age.
+    
+    Index rows are marked purged in batches (and kept, so the executions are
+    not archived again), and segment files no longer holding any live
+    execution are removed. Returns the number of executions purged.
+    """
+    from src.models.all_models import Execution, ExecutionArchive, db
+    
+    now = now or datetime.utcnow()
+    cutoffs, default_cutoff = _workflow_cutoffs(now, 'purge_after_days')
+    archive_dir = archive_dir or get_archive_dir()
+    purged = 0
+    segments = set()
+    
+    while True:
+        archived = db.session.query(ExecutionArchive.id).filter(
+            ExecutionArchive.execution_id == Execution.id, ExecutionArchive.purged_at.is_(None)
+        ).exists()
+        execution_ids = _due_executions(archived, cutoffs, default_cutoff, batch_size)
+        if not execution_ids:
+            break
+        
+        segments.update(row.segment for row in db.session.query(ExecutionArchive.segment).filter(
+            ExecutionArchive.execution_id.in_(execution_ids)
+        ).distinct())
+        ExecutionArchive.query.filter(ExecutionArchive.execution_id.in_(execution_ids)).update(
+            {'purged_at': now, 'byte_length': 0, 'log_count': 0}, synchronize_session=False)
+        db.session.commit()
+        purged += len(execution_ids)
+    
+    still_used = {row.segment for row in db.session.query(ExecutionArchive.segment).filter(
+        ExecutionArchive.segment.in_(segments), ExecutionArchive.purged_at.is_(None)
+    ).distinct()} if segments else set()
+    for segment in segments - still_used:
+        path = os.path.join(archive_dir, segment)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    return purged
+
+
+def blob_references(archive_dir=None):
+    """Return the digests of every blob referenced by execution logs or by archives not yet purged."""
+    from src.models.all_models import ExecutionArchive, ExecutionLog, db
+    
+    digests = set()
+    rows = db.session.query(ExecutionLog.input_data, ExecutionLog.output_data).filter(
+        db.or_(ExecutionLog.input_data.contains(BLOB_KEY_TEXT), ExecutionLog.output_data.contains(BLOB_KEY_TEXT))
+    ).yield_per(1000)
+    for input_data, output_data in rows:
+        digests |= referenced_digests(input_data)
+        digests |= referenced_digests(output_data)
+    
+    archive_dir = archive_dir or get_archive_dir()
+    frames = db.session.query(ExecutionArchive.segment, ExecutionArchive.byte_offset, ExecutionArchive.byte_length).filter(
+        ExecutionArchive.purged_at.is_(None)
+    ).order_by(ExecutionArchive.segment, ExecutionArchive.byte_offset).all()
+    segment_file = segment = None
+    try:
+        for name, offset, length in frames:
+            if name != segment:
+                if segment_file is not None:
+                    segment_file.close()
+                segment, segment_file = name, open(os.path.join(archive_dir, name), 'rb')
+            segment_file.seek(offset)
+            digests |= referenced_digests(decompress_frame(segment_file.read(length), name).decode())
+    finally:
+        if segment_file is not None:
+            segment_file.close()
+    return digests
+
+
+def sweep_unreferenced_blobs(archive_dir=None):
+    """
+    Delete stored blobs that no execution log or live archive references any more.
+    
+    References are only collected when some blob has gone untouched for the
+    store's grace period (BLOB_GC_GRACE_SECONDS), and only such blobs are
+    deleted, so payloads of executions still running are kept. Returns the
+    number of blobs deleted.
+    """
+    store = get_blob_store() or LocalBlobStore.from_environment()
+    references = []
+    
+    def is_referenced(digest):
+        if not references:
+            references.append(blob_references(archive_dir))
+        return digest in references[0]
+    
+    return store.sweep(is_referenced)
+
+
+def compact_execution_logs(now=None, archive_dir=None):
+    """
+    Run one retention pass: archive due logs, purge expired archives, then sweep unreferenced blobs.
+    
+    Only one process per archive directory runs a pass at a time; others
+    return None straight away. Returns {'archived', 'deleted_logs', 'purged', 'blobs_deleted'}.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+    
+    with open(os.path.join(archive_dir, '.compaction.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        
+        archived, deleted = archive_execution_logs(now=now, archive_dir=archive_dir)
+        purged = purge_archived_logs(now=now, archive_dir=archive_dir)
+        blobs_deleted = sweep_unreferenced_blobs(archive_dir=archive_dir)
+    
+    return {'archived': archived, 'deleted_logs': deleted, 'purged': purged, 'blobs_deleted': blobs_deleted}
+
+
+def start_compaction_thread(app, interval=None):
+    """Run compact_execution_logs every interval seconds in a daemon thread (LOG_COMPACTION_INTERVAL_SECONDS)."""
+    global _compaction_thread
+    if interval is None:
+        interval = float(os.getenv('LOG_COMPACTION_INTERVAL_SECONDS', '0'))
+    if interval <= 0:
+        return
+    
+    with _compaction_lock:
+        if _compaction_thread is not None:
+            return
+        
+        def compact_periodically():
+            from src.models.all_models import db
+            
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        compact_execution_logs()
+                    except Exception:
+                        app.logger.exception("Execution log compaction failed")
+                        db.session.rollback()
+        
+        _compaction_thread = threading.Thread(target=compact_periodically, name='log-compaction', daemon=True)
+        _compaction_thread.start()
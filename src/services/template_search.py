@@ -0,0 +1,220 @@
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from collections import Counter
+import math
+import os
+import re
+import threading
+import time
+
+_TERM_PATTERN = re.compile(r'\w+')
+
+# Relative weight of a term occurrence in each indexed field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'tags': 2.0,
+    'category': 2.0,
+    'description': 1.0
+}
+
+# Score multiplier for featured templates
+FEATURED_BOOST = 1.2
+
+_template_index = None
+_template_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Split text into lowercase search terms."""
+    return _TERM_PATTERN.findall((text or '').lower())
+
+
+def get_template_index():
+    """Return the process-wide template search index, subscribing it to template changes on first use."""
+    global _template_index
+    with _template_index_lock:
+        if _template_index is None:
+            _template_index = TemplateIndex(check_interval=float(os.getenv('TEMPLATE_INDEX_CHECK_SECONDS', '30')))
+            _template_index.listen()
+        return _template_index
+
+
+class TemplateIndexSnapshot:
+    """
+    An immutable inverted index over the workflow templates.
+    
+    Templates are kept as summaries without their definitions. Postings map
+    each term to the field-weighted frequency per template, and category,
+    tag and featured sets answer filters without scanning.
+    """
+    
+    def __init__(self, summaries, stamp):
+        """Build the postings and filter sets from template summaries."""
+        self.stamp = stamp
+        self.summaries = {summary['id']: summary for summary in summaries}
+        self.postings = {}
+        self.by_category = {}
+        self.by_tag = {}
+        self.featured = set()
+        
+        for summary in summaries:
+            template_id = summary['id']
+            weights = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = summary.get(field)
+                text = ' '.join(value) if isinstance(value, list) else value
+                for term in tokenize(text):
+                    weights[term] += weight
+            for term, weight in weights.items():
+                self.postings.setdefault(term, {})[template_id] = weight
+            
+            if summary.get('category'):
+                self.by_category.setdefault(summary['category'], set()).add(template_id)
+            for tag in summary.get('tags') or []:
+                self.by_tag.setdefault(tag, set()).add(template_id)
+            if summary.get('is_featured'):
+                self.featured.add(template_id)
+    
+    def search(self, query=None, category=None, tag=None, is_featured=None, limit=20, offset=0):
+        """
+        Return ranked template summaries matching a query and filters, with facet counts.
+        
+        Every query term must match. Results are ordered by TF-IDF score with
+        featured templates boosted, or by newest first without a query.
+        """
+        candidates = set(self.summaries)
+        if category:
+            candidates &= self.by_category.get(category, set())
+        if tag:
+            candidates &= self.by_tag.get(tag, set())
+        if is_featured is not None:
+            candidates = candidates & self.featured if is_featured else candidates - self.featured
+        
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores = {}
+        if terms:
+            total = len(self.summaries)
+            for term in sorted(terms, key=lambda t: len(self.postings.get(t, ()))):
+                postings = self.postings.get(term, {})
+                candidates &= postings.keys()
+                if not candidates:
+                    break
+                idf = math.log(1 + total / len(postings))
+                for template_id in candidates:
+                    scores[template_id] = scores.get(template_id, 0) + postings[template_id] * idf
+            
+            for template_id in candidates:
+                if template_id in self.featured:
+                    scores[template_id] *= FEATURED_BOOST
+            ranked = sorted(candidates, key=lambda template_id: (-scores[template_id], template_id))
+        else:
+            ranked = sorted(candidates, key=lambda template_id: (self.summaries[template_id]['created_at'] or '', template_id), reverse=True)
+        
+        results = []
+        page = ranked[offset:] if limit is None else ranked[offset:offset + limit]
+        for template_id in page:
+            summary = dict(self.summaries[template_id])
+            if terms:
+                summary['score'] = round(scores[template_id], 4)
+            results.append(summary)
+        
+        return {
+            'total': len(ranked),
+            'results': results,
+            'facets': self._facets(ranked)
+        }
+    
+    def _facets(self, template_ids):
+        """Count categories and tags across matching templates."""
+        categories = Counter()
+        tags = Counter()
+        for template_id in template_ids:
+            summary = self.summaries[template_id]
+            if summary.get('category'):
+                categories[summary['category']] += 1
+            tags.update(summary.get('tags') or [])
+        return {
+            'category': dict(categories.most_common()),
+            'tags': dict(tags.most_common())
+        }
+
+
+class TemplateIndex:
+    """
+    Keeps a search index over the workflow templates up to date.
+    
+    Commits that touch ``WorkflowTemplate`` in this process drop the index
+    immediately; changes made by other processes are picked up through a
+    version stamp (row count and latest ``updated_at``) checked at most
+    every ``check_interval`` seconds.
+    """
+    
+    def __init__(self, check_interval=30):
+        """Initialize an empty index."""
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+    
+    def listen(self):
+        """Invalidate the index whenever a session commits changes to templates."""
+        from src.models.all_models import WorkflowTemplate, db
+        
+        def mark_changed(mapper, connection, target):
+            session = db.inspect(target).session
+            if session is not None:
+                session.info['templates_changed'] = True
+        
+        def invalidate_on_commit(session):
+            if session.info.pop('templates_changed', False):
+                self.invalidate()
+        
+        def forget_on_rollback(session, previous_transaction):
+            session.info.pop('templates_changed', None)
+        
+        for mapper_event in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(WorkflowTemplate, mapper_event, mark_changed)
+        event.listen(Session, 'after_commit', invalidate_on_commit)
+        event.listen(Session, 'after_soft_rollback', forget_on_rollback)
+    
+    def invalidate(self):
+        """Drop the current snapshot so the next search rebuilds it."""
+        with self._lock:
+            self._snapshot = None
+    
+    def snapshot(self):
+        """Return the current snapshot, rebuilding it if it was invalidated or the stamp moved."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._checked_at < self.check_interval:
+                return snapshot
+            
+            stamp = self._version_stamp()
+            if snapshot is None or snapshot.stamp != stamp:
+                snapshot = self._build(stamp)
+                self._snapshot = snapshot
+            self._checked_at = now
+            return snapshot
+    
+    def search(self, query=None, category=None, tag=None, is_featured=None, limit=20, offset=0):
+        """Search the current snapshot."""
+        return self.snapshot().search(query, category, tag, is_featured, limit, offset)
+    
+    def _version_stamp(self):
+        """Return a value that changes whenever a template is added, updated or removed."""
+        from src.models.all_models import WorkflowTemplate, db
+        
+        count, updated_at = db.session.query(func.count(WorkflowTemplate.id), func.max(WorkflowTemplate.updated_at)).one()
+        return count, updated_at.isoformat() if updated_at else None
+    
+    def _build(self, stamp):
+        """Load template summaries, leaving definitions unread, and index them."""
+        from src.models.all_models import WorkflowTemplate, db
+        
+        templates = WorkflowTemplate.query.options(db.defer(WorkflowTemplate.definition)).all()
+        return TemplateIndexSnapshot([template.to_summary() for template in templates], stamp)
@@ -0,0 +1,202 @@
+from flask import Response, send_file
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+# Vite writes its content-hashed build output here, e.g. assets/index-DzRiNr0Z.js
+HASHED_ASSETS_DIR = 'assets/'
+
+# Where Vite writes its manifest when build.manifest is enabled (Vite 5+, then older versions)
+VITE_MANIFESTS = ('.vite/manifest.json', 'manifest.json')
+
+# Precompressed variants looked up next to each file, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Files worth precompressing
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.html', '.svg', '.json', '.txt', '.map', '.xml')
+
+# Hashed assets never change under the same name
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+INDEX_FILE = 'index.html'
+
+
+def _brotli():
+    """Return the optional brotli module, or None when it is not installed."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+class StaticAsset:
+    """A file in the static folder with its precompressed variants."""
+    
+    __slots__ = ('path', 'mimetype', 'etag', 'hashed', 'variants')
+    
+    def __init__(self, path, stat, hashed):
+        """Describe a file from its path and stat result."""
+        self.path = path
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        self.hashed = hashed
+        self.variants = {}
+
+
+class StaticAssets:
+    """
+    Serves the SPA's static folder from a manifest built once at start-up.
+    
+    Lookups hit an in-memory map instead of the file system. Hashed build
+    assets are sent with long-lived immutable cache headers, using a
+    precompressed .br or .gz file next to them when the client accepts it.
+    index.html, also the fallback for SPA deep links, is held in memory
+    (with a gzip copy) and validated by ETag.
+    """
+    
+    def __init__(self, static_folder):
+        """Scan the static folder."""
+        self.static_folder = static_folder
+        self._lock = threading.Lock()
+        self.refresh()
+    
+    def refresh(self):
+        """Rebuild the manifest and the in-memory index.html from disk."""
+        manifest = {}
+        variant_files = []
+        if self.static_folder and os.path.isdir(self.static_folder):
+            for directory, _, files in os.walk(self.static_folder):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                    if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                        variant_files.append(relative)
+                        continue
+                    manifest[relative] = StaticAsset(path, os.stat(path), False)
+        
+        # Only build output carries a content hash; files copied from public/ may be replaced in place
+        hashed = self._vite_manifest_files()
+        for relative, asset in manifest.items():
+            asset.hashed = relative.startswith(HASHED_ASSETS_DIR) or relative in hashed
+        
+        for relative in variant_files:
+            for encoding, suffix in ENCODINGS:
+                asset = manifest.get(relative[:-len(suffix)]) if relative.endswith(suffix) else None
+                if asset is not None:
+                    asset.variants[encoding] = os.path.join(self.static_folder, relative)
+        
+        index = None
+        if INDEX_FILE in manifest:
+            with open(manifest[INDEX_FILE].path, 'rb') as f:
+                body = f.read()
+            index = {
+                'body': body,
+                'gzip': gzip.compress(body, mtime=0),
+                'etag': hashlib.sha256(body).hexdigest()[:32]
+            }
+        
+        with self._lock:
+            self.manifest = manifest
+            self.index = index
+    
+    def _vite_manifest_files(self):
+        """Return the files listed in the Vite build manifest, or an empty set without one."""
+        for name in VITE_MANIFESTS:
+            path = os.path.join(self.static_folder or '', name)
+            if not os.path.isfile(path):
+                continue
+            with open(path) as f:
+                chunks = json.load(f)
+            files = set()
+            for chunk in chunks.values():
+                files.add(chunk.get('file'))
+                files.update(chunk.get('css', []))
+                files.update(chunk.get('assets', []))
+            files.discard(None)
+            return files
+        return set()
+    
+    def serve(self, path, request):
+        """Return the response for a path under the static folder or an SPA route."""
+        asset = self.manifest.get(path) if path else None
+        if asset is not None and path != INDEX_FILE:
+            return self._send_asset(asset, request)
+        
+        if self.index is None:
+            return "index.html not found", 404
+        return self._send_index(request)
+    
+    def _send_asset(self, asset, request):
+        """Send a file, preferring an accepted precompressed variant."""
+        encoding = self._choose_encoding(asset.variants, request)
+        response = send_file(
+            asset.variants[encoding] if encoding else asset.path,
+            mimetype=asset.mimetype,
+            etag=f"{asset.etag}-{encoding}" if encoding else asset.etag,
+            conditional=True,
+            max_age=IMMUTABLE_MAX_AGE if asset.hashed else 0
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        
+        if asset.hashed:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+    
+    def _send_index(self, request):
+        """Send the in-memory index.html, revalidated by ETag on every load."""
+        index = self.index
+        encoding = self._choose_encoding({'gzip': True}, request)
+        response = Response(index['gzip'] if encoding else index['body'], mimetype='text/html')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{index['etag']}-{encoding}" if encoding else index['etag'])
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    
+    @staticmethod
+    def _choose_encoding(variants, request):
+        """Pick the first available encoding the client accepts, or None."""
+        for encoding, _ in ENCODINGS:
+            if encoding in variants and request.accept_encodings[encoding]:
+                return encoding
+        return None
+
+
+def compress_static_folder(static_folder, min_size=1024):
+    """
+    Write .gz (and .br, when brotli is installed) files next to compressible assets.
+    
+    Returns the number of variant files written. Files smaller than min_size
+    are skipped since compression gains nothing on them.
+    """
+    brotli = _brotli()
+    written = 0
+    for directory, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                body = f.read()
+            if len(body) < min_size:
+                continue
+            
+            variants = [('.gz', gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(body)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(body):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+    return written
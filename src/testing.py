@@ -0,0 +1,21 @@
+from src.metrics import count_statements
+
+
+class StatementBudgetExceeded(AssertionError):
+    """Raised when a request runs more SQL statements than its budget allows."""
+
+
+def assert_statement_budget(client, method, path, budget, **kwargs):
+    """
+    Send a request through a Flask test client and fail if it ran more than budget SQL statements.
+    
+    Extra keyword arguments go to ``client.open`` (headers, json, ...). Returns
+    the response and the statement count so callers can check both.
+    """
+    with count_statements() as stats:
+        response = client.open(path, method=method, **kwargs)
+    
+    if stats.count > budget:
+        statements = '\n'.join(f"  {statement}" for statement in stats.statements)
+        raise StatementBudgetExceeded(f"{method} {path} ran {stats.count} SQL statements, budget is {budget}:\n{statements}")
+    return response, stats.count